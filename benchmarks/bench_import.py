@@ -0,0 +1,287 @@
+"""
+Throughput and memory benchmarks of the importers on synthetic packages.
+
+*_http benchmarks talk to the local fake Trunity server over HTTP
+and report its statistics: requests/sec, bytes uploaded, tail latency.
+
+Run with:
+    python -m pytest benchmarks/bench_import.py
+"""
+import contextlib
+import copy
+import io
+import os
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+
+import pytest
+
+from trunity_3_client import FilesClient
+
+from trunity_importer.media import MediaUploader
+from trunity_importer.multipart import StreamingFilesClient
+from trunity_importer.prefetch import DEFAULT_PREFETCH_BYTES
+from trunity_importer.qti import (
+    Importer as QtiImporter,
+    AsyncImporter as AsyncQtiImporter,
+)
+from trunity_importer.qti.parsers import (
+    ManifestParser,
+    QuestionnaireMetaInfoParser,
+    Question,
+)
+from trunity_importer.sda import (
+    Importer as SdaImporter,
+    AsyncImporter as AsyncSdaImporter,
+)
+from trunity_importer.sda.parser import Parser, StreamingParser
+from trunity_importer.sda.question_handler import QuestionHandler
+from trunity_importer.topic_mapping import TopicMapping
+
+from benchmarks.stub_api import StubSession, stub_sessions
+
+pytest.importorskip('pytest_benchmark')
+
+ROUNDS = 3
+
+
+def _quiet(func):
+    """
+    Importers report progress with print(). Swallow it.
+    """
+
+    def wrapper():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func()
+
+    return wrapper
+
+
+def _get_xml_file_name(zip_file: ZipFile) -> str:
+    for file_name in zip_file.namelist():
+        if file_name.startswith('XML_Export'):
+            return file_name
+
+
+def test_sda_parser(benchmark, sda_export, record_peak_memory):
+
+    @_quiet
+    def parse():
+        with ZipFile(sda_export) as zip_file:
+            xml = zip_file.read(_get_xml_file_name(zip_file))
+        return len(list(Parser(xml).get_questions()))
+
+    assert benchmark.pedantic(parse, rounds=ROUNDS) > 0
+    record_peak_memory(parse)
+
+
+@pytest.mark.parametrize('processes', [1, 2, 4])
+def test_sda_streaming_parser(benchmark, sda_export, record_peak_memory,
+                              processes):
+
+    @_quiet
+    def parse():
+        with ZipFile(sda_export) as zip_file:
+            xml_file_name = _get_xml_file_name(zip_file)
+            parser = StreamingParser(lambda: zip_file.open(xml_file_name),
+                                     processes=processes)
+            return len(list(parser.get_questions()))
+
+    assert benchmark.pedantic(parse, rounds=ROUNDS) > 0
+    record_peak_memory(parse)
+
+
+def test_qti_questions(benchmark, qti_package, record_peak_memory):
+
+    def parse():
+        count = 0
+
+        with ZipFile(qti_package) as zip_file:
+            with zip_file.open('imsmanifest.xml') as xml:
+                pool_files = ManifestParser.from_xml(
+                    xml).get_questionnaire_files()
+
+            for pool_file in pool_files:
+                with zip_file.open(pool_file) as xml:
+                    meta_info = QuestionnaireMetaInfoParser.from_xml(xml)
+
+                for file_name in meta_info.get_file_names():
+                    with zip_file.open('testitems/' + file_name) as xml:
+                        question = Question.from_xml(xml)
+                    question.parser.get_text()
+                    question.parser.get_answers()
+                    count += 1
+
+        return count
+
+    assert benchmark.pedantic(parse, rounds=ROUNDS) > 0
+    record_peak_memory(parse)
+
+
+def test_sda_question_handler(benchmark, sda_export, record_peak_memory):
+    zip_file = ZipFile(sda_export)
+    with contextlib.redirect_stdout(io.StringIO()):
+        questions = list(Parser(
+            zip_file.read(_get_xml_file_name(zip_file))).get_questions())
+
+    session = StubSession()
+    files_client = StreamingFilesClient(session)
+
+    @_quiet
+    def handle():
+        # every round gets its own uploader, so nothing is cached:
+        handler = QuestionHandler(
+            files_client, zip_file,
+            uploader=MediaUploader(files_client, zip_file, workers=4),
+        )
+        for question in copy.deepcopy(questions):
+            handler.handle(question)
+        return len(questions)
+
+    assert benchmark.pedantic(handle, rounds=ROUNDS) > 0
+    record_peak_memory(handle)
+    benchmark.extra_info['requests'] = dict(session.requests)
+
+
+@pytest.fixture(scope='module', params=[ZIP_STORED, ZIP_DEFLATED],
+                ids=['stored', 'deflated'])
+def large_media_zip(request, tmp_path_factory) -> str:
+    path = str(tmp_path_factory.mktemp('media') / 'media.zip')
+    size = int(os.environ.get('BENCH_LARGE_MEDIA_MB', 64)) * 1024 * 1024
+
+    with ZipFile(path, 'w', request.param) as zip_file:
+        with zip_file.open('media/large.mp3', 'w') as file_obj:
+            chunk = os.urandom(1024 * 1024)
+            for _ in range(size // len(chunk)):
+                file_obj.write(chunk)
+
+    return path
+
+
+@pytest.mark.parametrize('files_client_class',
+                         [FilesClient, StreamingFilesClient])
+def test_large_media_upload(benchmark, large_media_zip, record_peak_memory,
+                            files_client_class):
+    session = StubSession()
+    files_client = files_client_class(session)
+
+    def upload():
+        with ZipFile(large_media_zip) as zip_file:
+            MediaUploader(files_client, zip_file).upload('media/large.mp3')
+
+    benchmark.pedantic(upload, rounds=ROUNDS)
+    record_peak_memory(upload)
+    benchmark.extra_info['bytes_uploaded'] = session.bytes_uploaded
+
+
+@pytest.mark.parametrize('streaming', [False, True])
+@pytest.mark.parametrize('incremental', [False, True])
+def test_sda_full_import(benchmark, sda_export, record_peak_memory, streaming,
+                         incremental):
+    session = StubSession()
+
+    @_quiet
+    def perform_import():
+        with stub_sessions(session):
+            SdaImporter(
+                username='user', password='password', book_id=1,
+                path_to_zip=sda_export, streaming=streaming, workers=4,
+                incremental=incremental,
+            ).perform_import(topic_mapping=TopicMapping())
+
+    benchmark.pedantic(perform_import, rounds=ROUNDS)
+    record_peak_memory(perform_import)
+    benchmark.extra_info['requests_per_round'] = {
+        endpoint: count // (ROUNDS + 1)
+        for endpoint, count in session.requests.items()
+    }
+
+
+@pytest.mark.parametrize('parallel', [1, 4])
+def test_qti_full_import(benchmark, qti_package, record_peak_memory, parallel):
+    session = StubSession()
+
+    @_quiet
+    def perform_import():
+        with stub_sessions(session):
+            QtiImporter(
+                username='user', password='password', book_id=1,
+                path_to_zip=qti_package,
+            ).perform_import(parallel=parallel)
+
+    benchmark.pedantic(perform_import, rounds=ROUNDS)
+    record_peak_memory(perform_import)
+    benchmark.extra_info['requests_per_round'] = {
+        endpoint: count // (ROUNDS + 1)
+        for endpoint, count in session.requests.items()
+    }
+
+
+def _record_server_stats(benchmark, app):
+    stats = app.stats.to_dict()
+    benchmark.extra_info['requests_per_second'] = round(
+        stats['requests_per_second'], 1)
+    benchmark.extra_info['bytes_uploaded'] = stats['bytes_received']
+    benchmark.extra_info['latency_p99'] = stats['latency']['p99']
+    benchmark.extra_info['requests'] = stats['requests']
+
+
+@pytest.mark.parametrize('incremental', [False, True])
+@pytest.mark.parametrize('prefetch_bytes', [0, DEFAULT_PREFETCH_BYTES],
+                         ids=['no_prefetch', 'prefetch'])
+def test_sda_full_import_http(benchmark, sda_export, fake_trunity,
+                              incremental, prefetch_bytes):
+
+    @_quiet
+    def perform_import():
+        SdaImporter(
+            username='user', password='password', book_id=1,
+            path_to_zip=sda_export, streaming=True, workers=8,
+            incremental=incremental, prefetch_bytes=prefetch_bytes,
+        ).perform_import(topic_mapping=TopicMapping())
+
+    benchmark.pedantic(perform_import, rounds=1)
+    _record_server_stats(benchmark, fake_trunity)
+
+
+@pytest.mark.parametrize('prefetch_bytes', [0, DEFAULT_PREFETCH_BYTES],
+                         ids=['no_prefetch', 'prefetch'])
+def test_qti_full_import_http(benchmark, qti_package, fake_trunity,
+                              prefetch_bytes):
+
+    @_quiet
+    def perform_import():
+        QtiImporter(
+            username='user', password='password', book_id=1,
+            path_to_zip=qti_package, prefetch_bytes=prefetch_bytes,
+        ).perform_import(parallel=4)
+
+    benchmark.pedantic(perform_import, rounds=1)
+    _record_server_stats(benchmark, fake_trunity)
+
+
+def test_sda_async_import_http(benchmark, sda_export, fake_trunity):
+    pytest.importorskip('aiohttp')
+
+    @_quiet
+    def perform_import():
+        AsyncSdaImporter(
+            username='user', password='password', book_id=1,
+            path_to_zip=sda_export, streaming=True, concurrency=100,
+        ).perform_import(topic_mapping=TopicMapping())
+
+    benchmark.pedantic(perform_import, rounds=1)
+    _record_server_stats(benchmark, fake_trunity)
+
+
+def test_qti_async_import_http(benchmark, qti_package, fake_trunity):
+    pytest.importorskip('aiohttp')
+
+    @_quiet
+    def perform_import():
+        AsyncQtiImporter(
+            username='user', password='password', book_id=1,
+            path_to_zip=qti_package, concurrency=100,
+        ).perform_import(parallel=10)
+
+    benchmark.pedantic(perform_import, rounds=1)
+    _record_server_stats(benchmark, fake_trunity)
@@ -0,0 +1,56 @@
+"""
+Benchmarks for QTI item parsing.
+
+Run with:
+    python -m pytest benchmarks/bench_qti_parsers.py
+"""
+import os
+
+import pytest
+from bs4 import BeautifulSoup
+
+from trunity_importer.qti.parsers import Question, QuestionType
+
+pytest.importorskip('pytest_benchmark')
+
+DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+    'trunity_importer', 'qti', 'tests', 'data'
+)
+
+QUESTION_FILES = [
+    'multiple_choice.xml',
+    'multiple_answer.xml',
+    'essay.xml',
+    'short_answer.xml',
+]
+
+
+@pytest.fixture(scope='module', params=QUESTION_FILES)
+def question_xml(request) -> str:
+    with open(os.path.join(DATA_DIR, request.param)) as fo:
+        return fo.read()
+
+
+def test_classify_question(benchmark, question_xml):
+    soup = BeautifulSoup(question_xml, "xml")
+
+    question_type = benchmark(lambda: Question(soup).type)
+
+    assert question_type is not None
+
+
+def test_parse_question(benchmark, question_xml):
+
+    def parse():
+        question = Question.from_xml(question_xml)
+
+        # the importer goes to the parser several times per question:
+        text = question.parser.get_text()
+        if question.type in (QuestionType.MULTIPLE_CHOICE,
+                             QuestionType.MULTIPLE_ANSWER):
+            question.parser.get_answers()
+
+        return text
+
+    assert benchmark(parse)
@@ -0,0 +1,89 @@
+"""
+Fixtures for benchmarks.
+
+Size of generated packages is set with environment variables:
+    BENCH_SDA_ITEMS, BENCH_QTI_POOLS, BENCH_QTI_ITEMS_PER_POOL,
+    BENCH_IMAGES_PER_ITEM, BENCH_AUDIO_RATIO, BENCH_GRADES
+
+Fake Trunity server is tuned with:
+    BENCH_LATENCY, BENCH_ERROR_RATE
+"""
+import os
+import resource
+import tracemalloc
+
+import pytest
+from trunity_3_client.utils.url import API_ROOT
+
+from trunity_importer.fake_server import FakeTrunity, serve_in_thread
+from trunity_importer.utils import set_api_root
+
+from benchmarks.generators import make_sda_export, make_qti_package
+
+
+def _env(name: str, default, type_=int):
+    return type_(os.environ.get(name, default))
+
+
+@pytest.fixture(scope='session')
+def sda_export(tmp_path_factory) -> str:
+    return make_sda_export(
+        str(tmp_path_factory.mktemp('sda') / 'sda_export.zip'),
+        items=_env('BENCH_SDA_ITEMS', 300),
+        images_per_item=_env('BENCH_IMAGES_PER_ITEM', 1),
+        audio_ratio=_env('BENCH_AUDIO_RATIO', 0.2, float),
+        grades=_env('BENCH_GRADES', 3),
+    )
+
+
+@pytest.fixture(scope='session')
+def qti_package(tmp_path_factory) -> str:
+    return make_qti_package(
+        str(tmp_path_factory.mktemp('qti') / 'qti_package.zip'),
+        pools=_env('BENCH_QTI_POOLS', 10),
+        items_per_pool=_env('BENCH_QTI_ITEMS_PER_POOL', 10),
+        images_per_item=_env('BENCH_IMAGES_PER_ITEM', 1),
+        audio_ratio=_env('BENCH_AUDIO_RATIO', 0.2, float),
+    )
+
+
+@pytest.fixture
+def record_peak_memory(benchmark):
+    """
+    Run function once more under tracemalloc and save peak python heap
+    and peak RSS of the process to the benchmark's extra info.
+    """
+
+    def record(func):
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        benchmark.extra_info['peak_heap_kb'] = peak // 1024
+        benchmark.extra_info['peak_rss_kb'] = resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss
+
+    return record
+
+
+@pytest.fixture
+def fake_trunity():
+    """
+    Local fake Trunity API server all requests go to.
+    """
+    app = FakeTrunity(
+        latency=_env('BENCH_LATENCY', 0.005, float),
+        error_rate=_env('BENCH_ERROR_RATE', 0.0, float),
+        seed=0,
+    )
+    server, api_root = serve_in_thread(app)
+    set_api_root(api_root)
+
+    yield app
+
+    set_api_root(API_ROOT)
+    server.shutdown()
+    server.server_close()
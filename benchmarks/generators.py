@@ -0,0 +1,280 @@
+"""
+Generators of synthetic SDA exports and QTI packages for benchmarks.
+"""
+import json
+import os
+import random
+from zipfile import ZipFile, ZIP_DEFLATED
+
+GRADES = ['K', '1', '2', '3', '4', '5', '6', '7', '8']
+
+
+def _fake_media(size: int, seed: int) -> bytes:
+    """
+    Random (not compressible, like real gif/mp3) bytes.
+    """
+    return random.Random(seed).getrandbits(size * 8).to_bytes(size, 'little')
+
+
+def _sda_images(item_id: int, images_per_item: int, multiple_answer: bool):
+    image_ids = [item_id * 100 + num for num in range(images_per_item)]
+
+    if multiple_answer:
+        tags = [
+            '<img src="https://webcms.rpclearning.com/GetImagePreview.aspx'
+            '?ImageID={}"/>'.format(image_id) for image_id in image_ids
+        ]
+    else:
+        tags = ['<img src="images\\{}"/>'.format(image_id)
+                for image_id in image_ids]
+
+    return image_ids, ''.join(tags)
+
+
+def _sda_item(item_id: int, item_type: str, test_id: str, position: int,
+              images: str, audio_file: str) -> str:
+    text = '<p>Question {} text {}</p>'.format(item_id, images)
+    media = ''
+    if audio_file:
+        media = (
+            '<media_files><media_file id="{}" mime_type="audio/mpeg"/>'
+            '</media_files>'.format(audio_file)
+        )
+
+    body = ''
+    if item_type == 'MultipleChoice':
+        body = '<distractors>' + ''.join(
+            '<distractor is_correct="{correct}">'
+            '<rationale><![CDATA[<p>Feedback {num}</p>]]></rationale>'
+            '<display_text><![CDATA[<p>Answer {num}</p>]]></display_text>'
+            '</distractor>'.format(correct=num == 1, num=num)
+            for num in range(4)
+        ) + '</distractors>'
+
+    elif item_type == 'ConstructedResponse':
+        body = '<rubric_text><![CDATA[<p>Rubric {}</p>]]></rubric_text>'.format(
+            item_id)
+
+    elif item_type == 'TechnologyEnhanced':
+        text = json.dumps({
+            "type": "mcq",
+            "multiple_responses": True,
+            "stimulus": text,
+            "options": [
+                {"label": "<p>Answer {}</p>".format(num), "value": str(num)}
+                for num in range(4)
+            ],
+            "validation": {"valid_response": {"value": ["0", "2"]}},
+            "metadata": {
+                "distractor_rationale_response_level": [
+                    "Feedback {}".format(num) for num in range(4)
+                ]
+            },
+        })
+
+    return (
+        '<item id="{item_id}" type="{item_type}">'
+        '<display_text><![CDATA[{text}]]></display_text>'
+        '{body}'
+        '<test_usage><test_info test_id="{test_id}" item_position="{position}"/>'
+        '</test_usage>'
+        '{media}'
+        '</item>\n'
+    ).format(item_id=item_id, item_type=item_type, text=text, body=body,
+             test_id=test_id, position=position, media=media)
+
+
+def make_sda_export(path: str, items: int=100, images_per_item: int=1,
+                    audio_ratio: float=0.2, grades: int=3,
+                    items_per_test: int=20, media_size: int=2048,
+                    shuffle: bool=False, seed: int=0) -> str:
+    """
+    Write zip with XML_Export_0001.xml, images/ and media/ folders
+    the way SDA exports are packed.
+
+    Item types are cycled: MultipleChoice, ConstructedResponse,
+    TechnologyEnhanced (MultipleAnswer).
+
+    :param shuffle: put items in random order (item_position is kept).
+    """
+    rnd = random.Random(seed)
+    item_types = ['MultipleChoice', 'ConstructedResponse', 'TechnologyEnhanced']
+    tests_count = max(1, -(-items // items_per_test))
+
+    with ZipFile(path, 'w', ZIP_DEFLATED) as zip_file:
+        item_tags = []
+
+        for num in range(items):
+            item_id = 100000 + num
+            item_type = item_types[num % len(item_types)]
+            test_id = str(1000 + num // items_per_test)
+
+            image_ids, images = _sda_images(
+                item_id, images_per_item,
+                multiple_answer=item_type == 'TechnologyEnhanced',
+            )
+            for image_id in image_ids:
+                zip_file.writestr('images/{}.gif'.format(image_id),
+                                  _fake_media(media_size, image_id))
+
+            audio_file = None
+            if rnd.random() < audio_ratio:
+                audio_file = '{}.mp3'.format(item_id)
+                zip_file.writestr('media/' + audio_file,
+                                  _fake_media(media_size * 4, item_id))
+
+            item_tags.append(_sda_item(
+                item_id, item_type, test_id,
+                position=num % items_per_test + 1,
+                images=images, audio_file=audio_file,
+            ))
+
+        if shuffle:
+            rnd.shuffle(item_tags)
+
+        test_tags = [
+            '<test test_id="{test_id}" test_name="Test {num}" '
+            'activity_reference="SCIDIM_NA18E_OLA_G0{grade}U01L00_{num:04}"/>\n'
+            .format(test_id=1000 + num, num=num,
+                    grade=GRADES[num % max(1, min(grades, len(GRADES)))])
+            for num in range(tests_count)
+        ]
+
+        zip_file.writestr(
+            'XML_Export_0001.xml',
+            '<?xml version="1.0" encoding="utf-8"?>\n<object-bank>\n'
+            '<items>\n' + ''.join(item_tags) + '</items>\n'
+            '<tests>\n' + ''.join(test_tags) + '</tests>\n'
+            '</object-bank>\n'
+        )
+
+    return path
+
+
+_QTI_ITEM = """<?xml version="1.0" encoding="UTF-8"?>
+<assessmentItem xmlns="http://www.imsglobal.org/xsd/imsqti_v2p1" identifier="{identifier}" title="{identifier}">
+    <responseDeclaration baseType="identifier" cardinality="single" identifier="RESPONSE">
+        <correctResponse><value>A2</value></correctResponse>
+    </responseDeclaration>
+    <itemBody><div>{flash}Question <b>{identifier}</b> {images}</div>
+        <choiceInteraction responseIdentifier="RESPONSE" shuffle="false" maxChoices="1">
+            <simpleChoice identifier="A1">Answer 1</simpleChoice>
+            <simpleChoice identifier="A2">Answer 2</simpleChoice>
+            <simpleChoice identifier="A3">Answer 3</simpleChoice>
+        </choiceInteraction>
+    </itemBody>
+</assessmentItem>
+"""
+
+_QTI_FLASH = (
+    '<object><embed src="audio.swf?the_sound=/{audio_file}" '
+    'type="application/x-shockwave-flash"/></object>'
+)
+
+_QTI_TEST = """<?xml version="1.0" encoding="UTF-8"?>
+<assessmentTest xmlns="http://www.imsglobal.org/xsd/imsqti_v2p1" identifier="{identifier}" title="Pool {num}">
+    <testPart identifier="tp_{identifier}">
+        <assessmentSection identifier="as_{identifier}" title="Section {section}">
+{item_refs}
+        </assessmentSection>
+    </testPart>
+</assessmentTest>
+"""
+
+
+def make_qti_package(path: str, pools: int=10, items_per_pool: int=10,
+                     images_per_item: int=1, audio_ratio: float=0.2,
+                     pools_per_section: int=5, media_size: int=2048,
+                     seed: int=0) -> str:
+    """
+    Write QTI zip package: imsmanifest.xml, question pool files and
+    items in testitems/ folder with their images and mp3 files.
+    All items are MultipleChoice.
+    """
+    rnd = random.Random(seed)
+
+    with ZipFile(path, 'w', ZIP_DEFLATED) as zip_file:
+        resources = []
+
+        for pool_num in range(pools):
+            pool_identifier = 'POOL_{:04}'.format(pool_num)
+            item_refs = []
+
+            for item_num in range(items_per_pool):
+                identifier = '{}_{:03}'.format(pool_identifier, item_num)
+                seed_base = pool_num * 100000 + item_num * 100
+
+                images = []
+                for image_num in range(images_per_item):
+                    image_name = 'images/{}_{}.gif'.format(identifier, image_num)
+                    zip_file.writestr('testitems/' + image_name,
+                                      _fake_media(media_size, seed_base + image_num))
+                    images.append('<img src="{}"/>'.format(image_name))
+
+                flash = ''
+                if rnd.random() < audio_ratio:
+                    audio_file = identifier + '.mp3'
+                    zip_file.writestr('testitems/' + audio_file,
+                                      _fake_media(media_size * 4, seed_base))
+                    flash = _QTI_FLASH.format(audio_file=audio_file)
+
+                zip_file.writestr(
+                    'testitems/{}.xml'.format(identifier),
+                    _QTI_ITEM.format(identifier=identifier, flash=flash,
+                                     images=''.join(images)),
+                )
+                item_refs.append(
+                    '<assessmentItemRef identifier="res_{0}" href="{0}.xml"/>'
+                    .format(identifier)
+                )
+
+            pool_file = 'testitems/{}.xml'.format(pool_identifier)
+            zip_file.writestr(pool_file, _QTI_TEST.format(
+                identifier=pool_identifier, num=pool_num,
+                section=pool_num // pools_per_section,
+                item_refs='\n'.join(item_refs),
+            ))
+            resources.append(
+                '<resource identifier="res_{0}" type="imsqti_test_xmlv2p1" '
+                'href="{1}"><dependency identifierref="res_{0}_000"/>'
+                '</resource>'.format(pool_identifier, pool_file)
+            )
+
+        zip_file.writestr(
+            'imsmanifest.xml',
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<manifest xmlns="http://www.imsglobal.org/xsd/imscp_v1p1">'
+            '<organizations/><resources>' + '\n'.join(resources) +
+            '</resources></manifest>\n'
+        )
+
+    return path
+
+
+if __name__ == '__main__':
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(
+        description="Generate synthetic packages for load tests.")
+    arg_parser.add_argument('kind', choices=['sda', 'qti'])
+    arg_parser.add_argument('path')
+    arg_parser.add_argument('--items', type=int, default=1000,
+                            help="SDA items / QTI items per pool.")
+    arg_parser.add_argument('--pools', type=int, default=10,
+                            help="QTI question pools.")
+    arg_parser.add_argument('--images-per-item', type=int, default=1)
+    arg_parser.add_argument('--audio-ratio', type=float, default=0.2)
+    arg_parser.add_argument('--grades', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    if args.kind == 'sda':
+        make_sda_export(args.path, items=args.items,
+                        images_per_item=args.images_per_item,
+                        audio_ratio=args.audio_ratio, grades=args.grades)
+    else:
+        make_qti_package(args.path, pools=args.pools,
+                         items_per_pool=args.items,
+                         images_per_item=args.images_per_item,
+                         audio_ratio=args.audio_ratio)
+
+    print("{} written ({} bytes)".format(args.path, os.path.getsize(args.path)))
@@ -0,0 +1,96 @@
+"""
+In-process stand-in for the Trunity API sessions, so benchmarks measure
+the importers themselves and not the network.
+"""
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from unittest import mock
+
+from trunity_3_client.utils.url import API_ROOT
+
+from trunity_importer.session import SessionManager
+
+
+class StubResponse(object):
+
+    def __init__(self, data: dict):
+        self.status_code = 200
+        self._data = data
+
+    def json(self) -> dict:
+        return self._data
+
+    def raise_for_status(self):
+        pass
+
+
+class StubSession(object):
+    """
+    Answer every POST like Trunity does and count requests and bytes.
+    """
+
+    def __init__(self, latency: float=0.0):
+        self.latency = latency
+        self.requests = Counter()  # key: endpoint, value: number of requests
+        self.bytes_uploaded = 0
+
+        self._lock = threading.Lock()
+        self._last_id = 0
+
+    def _next_id(self) -> int:
+        with self._lock:
+            self._last_id += 1
+            return self._last_id
+
+    def post(self, url: str, data=None, files=None, json=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+
+        endpoint = url[len(API_ROOT):].split('/')[0]
+        uploaded = sum(len(file_obj.read()) for file_obj in (files or {}).values())
+        if data is not None and not isinstance(data, dict):
+            # streamed body (see StreamingFilesClient):
+            uploaded += sum(len(chunk) for chunk in data)
+
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.bytes_uploaded += uploaded
+
+        object_id = self._next_id()
+
+        if endpoint == 'remote_files':
+            return StubResponse({'file_url': 'https://cdn.stub/{}'.format(object_id)})
+        elif endpoint == 'topics':
+            return StubResponse({'topic_id': object_id})
+        elif endpoint == 'contents':
+            return StubResponse({'content_id': object_id})
+        elif endpoint == 'questions':
+            return StubResponse({'question_id': object_id})
+
+        raise ValueError("Unknown endpoint: {}".format(url))
+
+
+class StubSessionManager(object):
+
+    def __init__(self, session: StubSession):
+        self._session = session
+
+    def session(self, content_type: str=None) -> StubSession:
+        return self._session
+
+    def ensure_pool_size(self, pool_size: int):
+        pass
+
+
+@contextmanager
+def stub_sessions(session: StubSession):
+    """
+    Make importers use `session` instead of real Trunity sessions.
+    """
+    manager = StubSessionManager(session)
+
+    with mock.patch.object(SessionManager, 'for_creds',
+                           lambda *args, **kwargs: manager):
+        yield session
@@ -11,6 +11,12 @@ setup(
         'beautifulsoup4',
         'trunity-3-client<0.7',
       ],
+    extras_require={
+        'yaml': ['PyYAML'],
+        'async': ['aiohttp'],
+        'json': ['orjson'],
+        'benchmark': ['pytest', 'pytest-benchmark'],
+    },
     url='https://github.com/v-hunt/trunity-importer',
     license='MIT',
     author='hunting',
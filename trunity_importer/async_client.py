@@ -0,0 +1,416 @@
+"""
+asyncio transport for Trunity API (needs aiohttp: pip install trunity_importer[async]).
+
+All requests of an import go through one aiohttp session, so media
+uploads, topics, question pools and questions share one connection
+pool. Thousands of requests may be in flight at the same time, the pool
+limit says how many of them are on the wire.
+"""
+import asyncio
+import contextlib
+import os
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, Iterable
+from zipfile import ZipFile
+
+try:
+    import aiohttp
+except ImportError:  # optional dependency
+    aiohttp = None
+
+from trunity_3_client import ContentType, ResourceType
+from trunity_3_client.builders import Questionnaire
+from trunity_3_client.clients import auth
+from trunity_3_client.clients.endpoints import (
+    contents,
+    questions,
+    remote_files,
+    topics,
+)
+from trunity_3_client.utils.url import Url
+
+from trunity_importer.journal import Journal
+from trunity_importer.metrics import metrics
+from trunity_importer.multipart import (
+    SPOOL_MAX_SIZE,
+    MultipartFile,
+    SpooledMember,
+    hash_member,
+    open_member,
+)
+from trunity_importer.upload_cache import UploadCache
+from trunity_importer.utils import TRANSIENT_STATUS_CODES
+
+
+class _RecordedResponse(object):
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return defaultdict(lambda: None)
+
+
+class _RecordingSession(object):
+    """
+    Session-like object that keeps the request instead of sending it.
+    Lets trunity_3_client build question payloads for us.
+    """
+
+    def __init__(self):
+        self.url = None
+        self.json = None
+
+    def post(self, url, data=None, json=None, **kwargs):
+        self.url = url
+        self.json = json
+        return _RecordedResponse()
+
+
+def _question_request(questionnaire_id: str, question: dict):
+    """
+    Url and json of the request that creates the question.
+
+    :param question: question of Questionnaire builder, with 'type' key.
+    """
+    question = dict(question)
+    qst_type = question.pop('type')
+
+    recorder = _RecordingSession()
+    client = questions.QuestionsClient(recorder)
+    getattr(client, 'create_' + qst_type)(questionnaire_id, **question)
+
+    return recorder.url, recorder.json
+
+
+class AsyncClient(object):
+    """
+    Trunity API client for asyncio. Use it as async context manager:
+
+        async with AsyncClient(username, password, limit=100) as client:
+            url = await client.upload_file('images/1.gif', data)
+
+    Transient HTTP errors are retried with exponential backoff.
+    Expired auth token is renewed once per failed request, requests that
+    fail with the same token wait for one renewal.
+    """
+
+    def __init__(self, username: str, password: str, limit: int=100,
+                 retries: int=3, backoff: float=0.5, timeout: float=300):
+        if aiohttp is None:
+            raise ImportError(
+                "aiohttp is required for async import: "
+                "pip install trunity_importer[async]")
+
+        self._username = username
+        self._password = password
+        self._limit = limit
+        self._retries = retries
+        self._backoff = backoff
+        self._timeout = timeout
+
+        self._session = None
+        self._auth_token = None
+        self._auth_lock = None
+
+    async def __aenter__(self):
+        self._auth_lock = asyncio.Lock()
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self._limit),
+            timeout=aiohttp.ClientTimeout(total=self._timeout),
+        )
+        try:
+            await self._authenticate()
+        except Exception:
+            await self._session.close()
+            raise
+
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self._session.close()
+
+    @staticmethod
+    def _auth_url() -> str:
+        # read at call time, API root may be changed by set_api_root:
+        url = Url(auth.API_ROOT)
+        url.tail = 'authorization'
+        return url.list
+
+    async def _authenticate(self):
+        response = await self._request(self._auth_url(), lambda: {
+            'login': self._username,
+            'password': self._password,
+        }, authorize=False)
+        self._auth_token = response['auth_token']
+
+    async def _renew_token(self, expired_token: str):
+        async with self._auth_lock:
+            # other request sent with this token may have renewed it:
+            if self._auth_token == expired_token:
+                await self._authenticate()
+
+    async def _request(self, url: str, make_data: Callable=None,
+                       json: dict=None, authorize: bool=True,
+                       extra_headers: dict=None) -> dict:
+        """
+        POST request with retries. Return decoded json response.
+
+        :param make_data: returns form data of the request. Form data
+            can't be sent twice by aiohttp, so it's made for every attempt.
+        """
+        attempt = 0
+        token_renewed = False
+
+        while True:
+            headers = dict(extra_headers or {}, Accept='application/json')
+            token = self._auth_token
+            if authorize:
+                headers['Authorization'] = token
+
+            data = make_data() if make_data is not None else None
+
+            try:
+                async with self._session.post(url, data=data, json=json,
+                                              headers=headers) as response:
+                    if (response.status == 401 and authorize
+                            and not token_renewed):
+                        token_renewed = True
+                        await self._renew_token(token)
+                        continue
+
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+
+            except Exception as error:
+                if attempt >= self._retries or not self._is_transient(error):
+                    raise
+
+            await asyncio.sleep(self._backoff * 2 ** attempt)
+            attempt += 1
+
+    @staticmethod
+    def _is_transient(error: Exception) -> bool:
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status in TRANSIENT_STATUS_CODES
+
+        return isinstance(error, (aiohttp.ClientConnectionError,
+                                  asyncio.TimeoutError))
+
+    @staticmethod
+    def _form(fields: dict) -> dict:
+        # requests skips None values of form data, so do we:
+        return {key: str(value) for key, value in fields.items()
+                if value is not None}
+
+    async def upload_file(self, name: str, data: bytes) -> str:
+        """
+        Upload file to Trunity and return its CDN url.
+        """
+        def make_data():
+            form = aiohttp.FormData()
+            # file name is used by Trunity for extension white list:
+            form.add_field('remote_file[file]', data,
+                           filename=os.path.basename(name))
+            return form
+
+        response = await self._request(
+            remote_files.FilesListClient._url, make_data)
+        return response['file_url']
+
+    async def upload_member(self, zip_file: ZipFile, name: str,
+                            spooled: SpooledMember=None) -> str:
+        """
+        Upload zip member to Trunity in chunks and return its CDN url.
+        The member is never read into memory as a whole.
+
+        :param spooled: copy of the member to send instead of the member
+            (see multipart.hash_member).
+        """
+        boundary = uuid.uuid4().hex
+        headers = MultipartFile(None, zip_file.getinfo(name).file_size,
+                                file_name=name, boundary=boundary).headers
+
+        def open_file():
+            if spooled is None:
+                return open_member(zip_file, name)
+
+            # the copy is rewound for every attempt and closed by its owner:
+            spooled.seek(0)
+            return contextlib.nullcontext(spooled)
+
+        async def stream_body():
+            loop = asyncio.get_running_loop()
+
+            with open_file() as file_obj:
+                chunks = iter(MultipartFile(
+                    file_obj, file_obj.size, file_name=name,
+                    boundary=boundary))
+
+                # members are read (and decompressed) out of the event loop:
+                while True:
+                    chunk = await loop.run_in_executor(None, next, chunks, None)
+                    if chunk is None:
+                        break
+                    yield chunk
+
+        response = await self._request(
+            remote_files.FilesListClient._url, stream_body,
+            extra_headers=headers)
+        return response['file_url']
+
+    async def create_topic(self, site_id: int, name: str,
+                           topic_id: int=None) -> int:
+        response = await self._request(
+            topics.TopicsListClient._url, lambda: self._form({
+                'topic[name]': name,
+                'site_id': site_id,
+                'topic_id': topic_id,
+            }))
+        return response['topic_id']
+
+    async def create_qst_pool(self, site_id: int, content_title: str,
+                              topic_id: int=None) -> str:
+        with metrics.timer('pool_create'):
+            response = await self._request(
+                contents.ContentsListClient._url, lambda: self._form({
+                    'content_type': ContentType.QUESTIONNAIRE,
+                    'content[title]': content_title,
+                    'site_id': site_id,
+                    'topic_id': topic_id,
+                    'content[resource_type]': ResourceType.QUESTION_POOL,
+                }))
+        return response['content_id']
+
+    async def create_question(self, questionnaire_id: str,
+                              question: dict) -> str:
+        """
+        :param question: question of Questionnaire builder.
+        """
+        url, json = _question_request(questionnaire_id, question)
+        response = await self._request(url, json=json)
+        return response['question_id']
+
+
+class AsyncMediaUploader(object):
+    """
+    MediaUploader for asyncio: uploads zip members with AsyncClient.
+    Uses the same upload cache and journal records as MediaUploader.
+    """
+
+    def __init__(self, client: AsyncClient, zip_file: ZipFile,
+                 cache: UploadCache=None, journal: Journal=None,
+                 spool_max_size: int=SPOOL_MAX_SIZE):
+        self._client = client
+        self._zip_file = zip_file
+        self._spool_max_size = spool_max_size
+        self._cache = cache if cache is not None else UploadCache()
+        self._journal = journal if journal is not None else Journal()
+
+        self._tasks = {}  # key: member name, value: Task
+        self._uploads_in_progress = {}  # key: content hash, value: Task
+
+    async def upload(self, name: str) -> str:
+        """
+        Upload zip member and return its CDN url.
+        Every member is uploaded once per run.
+        """
+        task = self._tasks.get(name)
+
+        # failed uploads are scheduled again:
+        if task is None or (task.done() and task.exception()):
+            task = self._tasks[name] = asyncio.ensure_future(
+                self._upload(name))
+
+        return await asyncio.shield(task)
+
+    async def _upload(self, name: str) -> str:
+        cdn_file_url = self._journal.get(Journal.MEDIA, name)
+        if cdn_file_url is not None:
+            return cdn_file_url
+
+        with metrics.timer('media_read',
+                           size=self._zip_file.getinfo(name).file_size):
+            digest, spooled = await asyncio.get_running_loop(
+            ).run_in_executor(None, self._hash_member, name)
+        cdn_file_url = self._cache.get(digest)
+
+        # the same content may be uploading right now under another name:
+        task = self._uploads_in_progress.get(digest)
+
+        if cdn_file_url is None and task is None:
+            task = self._uploads_in_progress[digest] = \
+                asyncio.ensure_future(self._upload_member(name, spooled))
+            task.add_done_callback(
+                lambda _: self._uploads_in_progress.pop(digest, None))
+
+        elif spooled is not None:
+            spooled.close()
+
+        if cdn_file_url is None:
+            cdn_file_url = await asyncio.shield(task)
+            self._cache.set(digest, cdn_file_url)
+
+        self._journal.add(Journal.MEDIA, name, cdn_file_url)
+        return cdn_file_url
+
+    def _hash_member(self, name: str):
+        with open_member(self._zip_file, name) as file_obj:
+            return hash_member(file_obj, self._spool_max_size)
+
+    async def _upload_member(self, name: str,
+                             spooled: SpooledMember=None) -> str:
+        # the task owns the copy, a shielded task outlives its `_upload`:
+        try:
+            with metrics.timer('upload',
+                               size=self._zip_file.getinfo(name).file_size):
+                return await self._client.upload_member(
+                    self._zip_file, name, spooled)
+
+        finally:
+            if spooled is not None:
+                spooled.close()
+
+    async def upload_many(self, names: Iterable[str]) -> Dict[str, str]:
+        """
+        Upload zip members concurrently.
+        Return dict with member names as keys and CDN urls as values.
+        """
+        names = list(dict.fromkeys(names))
+        cdn_file_urls = await asyncio.gather(
+            *(self.upload(name) for name in names))
+        return dict(zip(names, cdn_file_urls))
+
+
+class AsyncQuestionnaire(Questionnaire):
+    """
+    Questionnaire builder uploaded with AsyncClient.
+    Like JournaledQuestionnaire, records uploaded questions in the
+    journal and skips questions uploaded by the previous run.
+    """
+
+    def __init__(self, journal: Journal, key: str):
+        super(AsyncQuestionnaire, self).__init__(session=None)
+        self._journal = journal
+        self._key = key
+
+    def __len__(self):
+        return len(self._questions)
+
+    async def upload_async(self, client: AsyncClient, questionnaire_id: str):
+        with metrics.timer('questionnaire_upload'):
+            await self._upload_async(client, questionnaire_id)
+
+    async def _upload_async(self, client: AsyncClient, questionnaire_id: str):
+        # questions are created one by one to keep their order:
+        for number, question in enumerate(self._questions):
+            question_key = '{}:{}'.format(self._key, number)
+
+            if self._journal.is_done(Journal.QUESTION, question_key):
+                continue
+
+            await client.create_question(questionnaire_id, question)
+            self._journal.add(Journal.QUESTION, question_key)
+
+        self._journal.add(Journal.QUESTIONNAIRE, self._key)
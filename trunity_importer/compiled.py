@@ -0,0 +1,411 @@
+"""
+Compiled imports: reading of the package split from uploading.
+
+The compilers (sda.compiler and qti.compiler) parse and validate the
+package once and write an artifact: JSON lines with question pools
+ready for Trunity. Media files in the questions are replaced with
+placeholders made of their content hashes.
+
+Pusher reads the artifact record by record, uploads media from the zip,
+puts their CDN urls in place of the placeholders and uploads question
+pools. The push can be retried and resumed with a journal, the XML is
+never read again.
+
+Records of the artifact (gzipped if its name ends with .gz):
+
+    {"record": "header", "format": ..., "version": 1, "source": "sda"}
+    {"record": "media", "hash": ..., "name": "images/1.gif", "size": 123}
+    {"record": "pool", "key": ..., "title": ..., "questions": [...], ...}
+    {"record": "end", "pools": 10, "questions": 200}
+
+Every media record goes before the first pool that refers to it.
+"""
+import gzip
+import html
+import io
+import json
+import re
+from typing import Dict, IO, Iterator, List, Union
+from zipfile import ZipFile
+
+from trunity_3_client.builders import Questionnaire
+from trunity_3_client.clients.endpoints import TopicsClient
+
+from trunity_importer.dry_run import (
+    DryRunPlan,
+    DryRunUploader,
+    RecordingSessionManager,
+)
+from trunity_importer.journal import Journal, JournaledQuestionnaire
+from trunity_importer.media import MediaUploader
+from trunity_importer.metrics import metrics
+from trunity_importer.multipart import StreamingFilesClient, iter_member
+from trunity_importer.session import SessionManager, DEFAULT_POOL_SIZE
+from trunity_importer.topic_mapping import TopicMapping
+from trunity_importer.upload_cache import UploadCache, chunks_content_hash
+from trunity_importer.utils import create_qst_pool
+
+FORMAT = 'trunity-importer-artifact'
+VERSION = 1
+
+PLACEHOLDER_PREFIX = 'trunity-media:'
+_PLACEHOLDER_RE = re.compile(re.escape(PLACEHOLDER_PREFIX) + r'([0-9a-f]{64})')
+
+# records are written compact, with their fields in this order:
+_MEDIA_PREFIX = '{"record":"media"'
+_POOL_PREFIX = '{"record":"pool","key":'
+_END_PREFIX = '{"record":"end"'
+
+_decoder = json.JSONDecoder()
+
+
+class ArtifactError(ValueError):
+    """
+    Raise when the artifact is broken, incomplete or of unknown version.
+    """
+    pass
+
+
+def media_placeholder(digest: str) -> str:
+    return PLACEHOLDER_PREFIX + digest
+
+
+def _open(path: str, mode: str) -> IO[str]:
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+
+    return open(path, mode, encoding='utf-8')
+
+
+class QuestionCollector(Questionnaire):
+    """
+    Questionnaire that is never uploaded: questions are taken as dicts
+    to be written to the artifact.
+    """
+
+    def __init__(self):
+        super(QuestionCollector, self).__init__(session=None)
+
+    @property
+    def questions(self) -> List[dict]:
+        return self._questions
+
+    def __len__(self):
+        return len(self._questions)
+
+
+class ArtifactWriter(object):
+    """
+    Write compiled question pools. Use it as context manager:
+    the artifact is complete only when it's closed without errors.
+    """
+
+    def __init__(self, path: str, source: str, zip_file: ZipFile):
+        """
+        :param source: "sda" or "qti".
+        :param zip_file: the package, media are hashed from it.
+        """
+        self._zip_file = zip_file
+        self._file = _open(path, 'w')
+        self._digests = {}  # key: member name, value: content hash
+        self._written_digests = set()
+        self.pools = 0
+        self.questions = 0
+
+        self._write(record='header', format=FORMAT, version=VERSION,
+                    source=source)
+
+    def _write(self, **record):
+        self._file.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+    def add_media(self, name: str) -> str:
+        """
+        Hash zip member and write its record (once per content).
+        Return placeholder to put in questions instead of its url.
+        """
+        digest = self._digests.get(name)
+
+        if digest is None:
+            size = self._zip_file.getinfo(name).file_size
+            with metrics.timer('media_read', size=size):
+                digest = self._digests[name] = chunks_content_hash(
+                    iter_member(self._zip_file, name))
+
+            if digest not in self._written_digests:
+                self._written_digests.add(digest)
+                self._write(record='media', hash=digest, name=name, size=size)
+
+        return media_placeholder(digest)
+
+    def write_pool(self, key: str, title: str, questions: List[dict],
+                   **fields):
+        """
+        :param key: unique key of the pool for the journal.
+        :param fields: what the pusher needs to choose the topic.
+        """
+        self._write(record='pool', key=key, title=title,
+                    questions=questions, **fields)
+        self.pools += 1
+        self.questions += len(questions)
+
+    def close(self):
+        self._write(record='end', pools=self.pools, questions=self.questions)
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # no end record, the pusher won't take it:
+            self._file.close()
+
+
+class ArtifactReader(object):
+    """
+    Read compiled question pools line by line.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+
+        try:
+            with _open(path, 'r') as file_obj:
+                header = self._decode(file_obj.readline())
+        except (UnicodeDecodeError, OSError):
+            # binary file or bad gzip:
+            header = {}
+
+        if not isinstance(header, dict) \
+                or header.get('record') != 'header' \
+                or header.get('format') != FORMAT:
+            raise ArtifactError("{} isn't a compiled import".format(path))
+        if header.get('version') != VERSION:
+            raise ArtifactError("Version {} of compiled import isn't "
+                                "supported".format(header.get('version')))
+
+        self.source = header['source']
+        self.summary = self._read_end()
+
+    def _decode(self, line: str) -> dict:
+        try:
+            return json.loads(line)
+        except ValueError:
+            raise ArtifactError("{} is broken".format(self._path))
+
+    def _read_end(self) -> dict:
+        """
+        The last record. Compilation is checked to be over before
+        anything is pushed.
+        """
+        if self._path.endswith('.gz'):
+            line = ''
+            with _open(self._path, 'r') as file_obj:
+                for line in file_obj:
+                    pass
+
+        else:
+            with open(self._path, 'rb') as file_obj:
+                file_obj.seek(0, io.SEEK_END)
+                size = file_obj.tell()
+                file_obj.seek(max(0, size - 4096))
+                line = file_obj.read().decode('utf-8', 'replace') \
+                    .rstrip('\n').rsplit('\n', 1)[-1]
+
+        if not line.startswith(_END_PREFIX):
+            raise ArtifactError("{} is incomplete: compilation wasn't "
+                                "finished".format(self._path))
+
+        return self._decode(line)
+
+    def __iter__(self) -> Iterator[str]:
+        """
+        Raw lines of media and pool records. Pool lines have
+        placeholders in them (see `resolve_placeholders`).
+        """
+        with _open(self._path, 'r') as file_obj:
+            file_obj.readline()  # header
+
+            for line in file_obj:
+                if line.startswith(_END_PREFIX):
+                    break
+                yield line
+
+
+def find_placeholders(line: str) -> List[str]:
+    """
+    Content hashes of media the line refers to, without duplicates.
+    """
+    return list(dict.fromkeys(_PLACEHOLDER_RE.findall(line)))
+
+
+def resolve_placeholders(line: str, urls: Dict[str, str]) -> str:
+    """
+    Put urls (key: content hash) in place of placeholders
+    of JSON line. Placeholders are html attribute values, so urls are
+    escaped the same way importers write them.
+    """
+    return _PLACEHOLDER_RE.sub(
+        # url goes inside of JSON string:
+        lambda match: json.dumps(html.escape(urls[match.group(1)]))[1:-1],
+        line,
+    )
+
+
+class CompiledMediaUploader(MediaUploader):
+    """
+    MediaUploader that takes content hashes from the artifact,
+    so media are read only to be sent.
+    """
+
+    def __init__(self, *args, digests: Dict[str, str], **kwargs):
+        """
+        :param digests: key: member name, value: content hash.
+        """
+        super(CompiledMediaUploader, self).__init__(*args, **kwargs)
+        self._digests = digests
+
+    def _upload(self, name: str) -> str:
+        return self._upload_content(name, self._digests[name])
+
+
+class Pusher(object):
+    """
+    Upload compiled question pools to Trunity.
+
+    Keys of the journal are the same as importers use, so a push may
+    resume an import and the other way round.
+    """
+
+    def __init__(self, username: str, password: str, book_id: int,
+                 artifact_path: str, path_to_zip: str, workers: int=4,
+                 upload_cache_path: str=None, journal_path: str=None,
+                 resume: bool=False, pool_size: int=DEFAULT_POOL_SIZE,
+                 dry_run: bool=False):
+        """
+        :param path_to_zip: the package the artifact is compiled from,
+            media are taken from it.
+        :param dry_run: send nothing, only count requests (see `get_plan`).
+        """
+        self._book_id = book_id
+        self._reader = ArtifactReader(artifact_path)
+        self._zip_file = ZipFile(path_to_zip)
+        self._journal = Journal(journal_path, resume=resume,
+                                read_only=dry_run)
+        self._workers = workers
+
+        if dry_run:
+            self._session_manager = RecordingSessionManager()
+        else:
+            self._session_manager = SessionManager.for_creds(
+                username, password, pool_size=max(pool_size, workers))
+        self.t3_session = self._session_manager.session()
+        # we need json content type for uploading questionnaires:
+        self.t3_json_session = self._session_manager.session(
+            'application/json')
+        self._topic_client = TopicsClient(self.t3_session)
+
+        self._digests = {}  # key: member name, value: content hash
+        self._names = {}  # key: content hash, value: member name
+
+        files_client = StreamingFilesClient(self.t3_session)
+        if dry_run:
+            self._uploader = DryRunUploader(
+                files_client, self._zip_file, journal=self._journal)
+        else:
+            self._uploader = CompiledMediaUploader(
+                files_client, self._zip_file, workers=workers,
+                cache=UploadCache(upload_cache_path),
+                journal=self._journal,
+                digests=self._digests,
+            )
+
+    @property
+    def source(self) -> str:
+        return self._reader.source
+
+    def get_plan(self) -> DryRunPlan:
+        """
+        Requests sent by `perform_push` in dry run.
+        """
+        return DryRunPlan(self._session_manager.recorder,
+                          media_workers=self._workers)
+
+    def _get_topic_id(self, pool: dict, topic_id: Union[None, int],
+                      topic_mapping: Union[None, TopicMapping]):
+        """
+        Topic of the pool: SDA pools go where topic mapping says (or the
+        user), QTI pools go to topics of their sections.
+        """
+        if 'section' in pool:
+            section = pool['section']
+            return self._journal.get_or_create(
+                Journal.TOPIC, section,
+                lambda: self._topic_client.list.post(
+                    self._book_id, section, topic_id),
+            )
+
+        if topic_mapping is not None:
+            return topic_mapping.get_topic_id(pool['test_id'],
+                                              pool['test_title'])
+
+        pool_topic_id = input(
+            "\nEnter the topic id you want the QP be attached to. "
+            "Leave blank for the root topic\n"
+            "The title of QP: {}\n".format(pool['title'])
+        ).strip()
+        return pool_topic_id or None
+
+    def _push_pool(self, line: str, topic_id: Union[None, int],
+                   topic_mapping: Union[None, TopicMapping]):
+        names = [self._names[digest] for digest in find_placeholders(line)]
+        cdn_file_urls = self._uploader.upload_many(names)
+
+        pool = json.loads(resolve_placeholders(line, {
+            self._digests[name]: url for name, url in cdn_file_urls.items()
+        }))
+
+        questionnaire = JournaledQuestionnaire(
+            self.t3_json_session, self._journal, key=pool['key'])
+        questionnaire.extend(pool['questions'])
+
+        # question pool may be created by previous run:
+        questionnaire_id = self._journal.get(Journal.POOL, pool['key'])
+        if questionnaire_id is None:
+            questionnaire_id = create_qst_pool(
+                self.t3_session, self._book_id,
+                content_title=pool['title'],
+                topic_id=self._get_topic_id(pool, topic_id, topic_mapping),
+            )
+            self._journal.add(Journal.POOL, pool['key'], questionnaire_id)
+
+        questionnaire.upload(questionnaire_id)
+        print("Question pool pushed: {} ({} questions)".format(
+            pool['title'], len(questionnaire)))
+
+    def perform_push(self, topic_id: int=None,
+                     topic_mapping: TopicMapping=None):
+        """
+        :param topic_id: QTI sections are created in this topic.
+            Root of the book if None.
+        :param topic_mapping: topics for SDA pools. When it's None,
+            the user is asked for topic id of every question pool.
+        """
+        for line in self._reader:
+            if line.startswith(_MEDIA_PREFIX):
+                media = json.loads(line)
+                self._digests[media['name']] = media['hash']
+                self._names[media['hash']] = media['name']
+                continue
+
+            # pools pushed by previous run are not decoded at all:
+            key, _ = _decoder.raw_decode(line, len(_POOL_PREFIX))
+            if self._journal.is_done(Journal.QUESTIONNAIRE, key):
+                print("Question pool is pushed already: {}".format(key))
+                continue
+
+            self._push_pool(line, topic_id, topic_mapping)
+
+        self._uploader.close()
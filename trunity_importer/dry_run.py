@@ -0,0 +1,247 @@
+"""
+Dry run: the whole import (parsing, validation, media) without
+talking to Trunity.
+
+Importers get a RecordingSession instead of Trunity sessions. It answers
+every request like Trunity does and counts requests and bytes by
+endpoint, so the plan of the import and an estimate of its time can be
+printed at the end.
+"""
+import json
+import threading
+from collections import Counter
+from typing import Dict
+from urllib.parse import urlencode, urlparse
+
+from trunity_3_client.clients import auth
+
+from trunity_importer.media import MediaUploader
+from trunity_importer.multipart import get_size
+
+# seconds per request, when nothing is measured:
+DEFAULT_LATENCY = 0.2
+# bytes per second:
+DEFAULT_BANDWIDTH = 10 * 2 ** 20
+
+# key: endpoint, value: id field of the response
+_ID_FIELDS = {
+    'remote_files': 'file_url',
+    'topics': 'topic_id',
+    'contents': 'content_id',
+    'questions': 'question_id',
+}
+
+
+class RecordingResponse(object):
+
+    def __init__(self, data: dict):
+        self.status_code = 200
+        self._data = data
+
+    def json(self) -> dict:
+        return self._data
+
+    def raise_for_status(self):
+        pass
+
+
+def _get_endpoint(url: str) -> str:
+    """
+    "questions/essay" for questions, "contents", "topics" and so on
+    for the rest.
+    """
+    path = urlparse(str(url)).path
+    root = urlparse(auth.API_ROOT).path.rstrip('/')
+    if path.startswith(root):
+        path = path[len(root):]
+
+    parts = path.strip('/').split('/')
+    if parts[0] == 'questions':
+        return '/'.join(parts[:2])
+    return parts[0]
+
+
+def _get_body_size(data=None, files=None, json_data=None) -> int:
+    size = 0
+
+    if json_data is not None:
+        size += len(json.dumps(json_data))
+
+    if isinstance(data, dict):
+        size += len(urlencode(
+            {key: value for key, value in data.items() if value is not None}))
+    elif data is not None:
+        # streamed body (see StreamingFilesClient) is never read here:
+        size += len(data)
+
+    for file_obj in (files or {}).values():
+        size += get_size(file_obj) or 0
+
+    return size
+
+
+class RecordingSession(object):
+    """
+    Answer every POST like Trunity does and count requests and bytes.
+    Nothing is sent anywhere.
+    """
+
+    def __init__(self):
+        self.headers = {}
+        self.requests = Counter()  # key: endpoint, value: number of requests
+        self.bytes_sent = Counter()  # key: endpoint, value: body bytes
+
+        self._lock = threading.Lock()
+        self._last_id = 0
+
+    def post(self, url: str, data=None, json=None, files=None, **kwargs):
+        endpoint = _get_endpoint(url)
+        size = _get_body_size(data, files, json)
+
+        with self._lock:
+            self._last_id += 1
+            object_id = self._last_id
+
+            self.requests[endpoint] += 1
+            self.bytes_sent[endpoint] += size
+
+        if endpoint == 'remote_files':
+            value = 'https://cdn.dry-run/{}'.format(object_id)
+        else:
+            value = str(object_id)
+
+        return RecordingResponse({_ID_FIELDS[endpoint.split('/')[0]]: value})
+
+
+class RecordingSessionManager(object):
+    """
+    SessionManager with one RecordingSession for all content types.
+    """
+
+    def __init__(self, session: RecordingSession=None):
+        self.recorder = session if session is not None else RecordingSession()
+
+    def session(self, content_type: str=None) -> RecordingSession:
+        return self.recorder
+
+    def ensure_pool_size(self, pool_size: int):
+        pass
+
+
+class DryRunUploader(MediaUploader):
+    """
+    MediaUploader that never reads members: files with the same CRC-32
+    and size are taken for the same content.
+    """
+
+    def _upload(self, name: str) -> str:
+        info = self._zip_file.getinfo(name)
+        return self._upload_content(
+            name, '{:08x}:{}'.format(info.CRC, info.file_size))
+
+
+def latency_from_metrics(path: str) -> float:
+    """
+    Mean time of one request measured by previous import
+    (JSON written by --metrics-file).
+    """
+    with open(path) as file_obj:
+        stages = json.load(file_obj)['stages']
+
+    # creation of a pool is one small request, uploads carry bytes:
+    for name in ['pool_create', 'upload']:
+        if stages.get(name, {}).get('count'):
+            return stages[name]['seconds'] / stages[name]['count']
+
+    raise ValueError("No requests are recorded in {}".format(path))
+
+
+class DryRunPlan(object):
+    """
+    Requests the import is going to send.
+    """
+
+    def __init__(self, session: RecordingSession, media_workers: int=1,
+                 parallel: int=1):
+        """
+        :param media_workers: number of media files uploaded at once.
+        :param parallel: number of question pools imported at once.
+        """
+        self.requests = dict(session.requests)
+        self.bytes_sent = dict(session.bytes_sent)
+        self.media_workers = media_workers
+        self.parallel = parallel
+
+    def _count(self, prefix: str) -> int:
+        return sum(count for endpoint, count in self.requests.items()
+                   if endpoint.split('/')[0] == prefix)
+
+    @property
+    def pools(self) -> int:
+        return self._count('contents')
+
+    @property
+    def topics(self) -> int:
+        return self._count('topics')
+
+    @property
+    def uploads(self) -> int:
+        return self._count('remote_files')
+
+    @property
+    def upload_bytes(self) -> int:
+        return self.bytes_sent.get('remote_files', 0)
+
+    @property
+    def questions(self) -> Dict[str, int]:
+        """
+        key: question type, value: number of questions.
+        """
+        return {endpoint.split('/', 1)[1]: count
+                for endpoint, count in sorted(self.requests.items())
+                if endpoint.startswith('questions/')}
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.bytes_sent.values())
+
+    def estimate_seconds(self, latency: float=DEFAULT_LATENCY,
+                         bandwidth: float=DEFAULT_BANDWIDTH) -> float:
+        """
+        Time of the import if every request takes `latency` plus time
+        of sending its body with `bandwidth`.
+        """
+        media = (self.uploads * latency + self.upload_bytes / bandwidth) \
+            / self.media_workers
+
+        other_requests = sum(self.requests.values()) - self.uploads
+        other_bytes = self.total_bytes - self.upload_bytes
+        pools = (other_requests * latency + other_bytes / bandwidth) \
+            / self.parallel
+
+        return media + pools
+
+    def print(self, latency: float=DEFAULT_LATENCY,
+              bandwidth: float=DEFAULT_BANDWIDTH):
+        print('\n')
+        print("\033[1;36m" + "=" * 50)
+        print(" " * 15 + "<<<< Import plan >>>>")
+        print("=" * 50 + "\033[0m")
+        print()
+
+        print("Question pools: {}".format(self.pools))
+        print("Topics: {}".format(self.topics))
+        print("Questions: {}".format(sum(self.questions.values())))
+        for question_type, count in self.questions.items():
+            print("    {}: {}".format(question_type, count))
+        print("Media uploads: {} ({} bytes)".format(
+            self.uploads, self.upload_bytes))
+        print("Requests: {} ({} bytes)".format(
+            sum(self.requests.values()), self.total_bytes))
+        print()
+
+        seconds = self.estimate_seconds(latency, bandwidth)
+        print("Estimated time: {:.0f} min {:.0f} s "
+              "({:.0f} ms per request, {:.1f} MB/s)".format(
+                  seconds // 60, seconds % 60, latency * 1000,
+                  bandwidth / 2 ** 20))
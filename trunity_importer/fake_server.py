@@ -0,0 +1,282 @@
+"""
+Local fake Trunity 3 API for load testing the importers.
+
+It answers the endpoints the importers use (authorization, remote_files,
+topics, contents and questions) with configurable latency and error
+injection, and counts requests, uploaded bytes and response latency.
+
+Run it:
+
+    python -m trunity_importer.fake_server --port 8765 --latency 0.05
+
+and point the importer to it:
+
+    T3_API_ROOT=http://127.0.0.1:8765/api/v3/ trunity-importer sda ...
+
+Statistics are served as JSON on GET /_stats.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from socketserver import ThreadingMixIn
+from typing import Tuple
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
+
+API_PREFIX = '/api/v3/'
+
+# endpoint -> name of the id field in the response:
+ID_FIELDS = {
+    'topics': 'topic_id',
+    'contents': 'content_id',
+    'questions': 'question_id',
+}
+
+STATUS_REASONS = {
+    200: 'OK',
+    401: 'Unauthorized',
+    404: 'Not Found',
+    503: 'Service Unavailable',
+}
+
+
+class Stats(object):
+    """
+    Request counters and latencies of the fake server.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = {}  # key: endpoint, value: count
+            self.statuses = {}  # key: HTTP status, value: count
+            self.bytes_received = 0
+            self.latencies = []
+            self._started = None
+            self._finished = None
+
+    def record(self, endpoint: str, status: int, bytes_received: int,
+               started: float, finished: float):
+        with self._lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            self.bytes_received += bytes_received
+            self.latencies.append(finished - started)
+
+            if self._started is None:
+                self._started = started
+            self._finished = finished
+
+    @staticmethod
+    def _percentile(values: list, percent: float) -> float:
+        if not values:
+            return 0.0
+        index = min(len(values) - 1, int(round(percent / 100 * (len(values) - 1))))
+        return values[index]
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            total = len(latencies)
+            elapsed = (self._finished - self._started) if total else 0.0
+
+            return {
+                'requests': dict(self.requests),
+                'statuses': {str(k): v for k, v in self.statuses.items()},
+                'total_requests': total,
+                'bytes_received': self.bytes_received,
+                'requests_per_second': total / elapsed if elapsed else 0.0,
+                'latency': {
+                    'p50': self._percentile(latencies, 50),
+                    'p95': self._percentile(latencies, 95),
+                    'p99': self._percentile(latencies, 99),
+                    'max': latencies[-1] if latencies else 0.0,
+                },
+            }
+
+
+class FakeTrunity(object):
+    """
+    WSGI application that imitates Trunity 3 API.
+    """
+
+    def __init__(self, latency: float=0.0, jitter: float=0.0,
+                 error_rate: float=0.0, error_status: int=503,
+                 token_ttl: float=None, seed: int=None):
+        """
+        :param latency: seconds every API request takes.
+        :param jitter: random extra latency, up to `jitter` seconds.
+        :param error_rate: share of API requests answered with `error_status`.
+        :param token_ttl: seconds auth tokens live. Forever if None.
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.token_ttl = token_ttl
+
+        self.stats = Stats()
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._tokens = {}  # key: token, value: issue time
+
+    def _next_id(self) -> int:
+        with self._lock:
+            self._last_id += 1
+            return self._last_id
+
+    def _token_is_valid(self, token: str) -> bool:
+        with self._lock:
+            issued = self._tokens.get(token)
+
+        if issued is None:
+            return False
+
+        return self.token_ttl is None or time.time() - issued < self.token_ttl
+
+    def _issue_token(self) -> str:
+        token = 'fake-token-{}'.format(self._next_id())
+        with self._lock:
+            self._tokens[token] = time.time()
+        return token
+
+    @staticmethod
+    def _read_body(environ) -> int:
+        """
+        Read (and drop) request body. Return its size.
+        """
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        stream = environ['wsgi.input']
+        left = length
+
+        while left > 0:
+            chunk = stream.read(min(left, 64 * 1024))
+            if not chunk:
+                break
+            left -= len(chunk)
+
+        return length - left
+
+    def _handle_api(self, endpoint: str, environ) -> Tuple[int, dict]:
+        resource = endpoint.split('/')[0]
+
+        if resource == 'authorization':
+            return 200, {'auth_token': self._issue_token()}
+
+        if not self._token_is_valid(environ.get('HTTP_AUTHORIZATION', '')):
+            return 401, {'error': 'Unauthorized'}
+
+        if self.error_rate and self._random.random() < self.error_rate:
+            return self.error_status, {'error': 'Injected error'}
+
+        if resource == 'remote_files':
+            file_id = self._next_id()
+            return 200, {
+                'file_url': 'http://{}/files/{}'.format(
+                    environ.get('HTTP_HOST', 'localhost'), file_id)
+            }
+
+        if resource in ID_FIELDS:
+            return 200, {ID_FIELDS[resource]: self._next_id()}
+
+        return 404, {'error': 'Not found'}
+
+    def __call__(self, environ, start_response):
+        started = time.time()
+        path = environ.get('PATH_INFO', '')
+        bytes_received = self._read_body(environ)
+
+        if path == '/_stats':
+            status, data = 200, self.stats.to_dict()
+
+        elif path.startswith(API_PREFIX):
+            delay = self.latency + self._random.random() * self.jitter
+            if delay:
+                time.sleep(delay)
+
+            endpoint = path[len(API_PREFIX):].strip('/')
+            status, data = self._handle_api(endpoint, environ)
+            self.stats.record(
+                endpoint.split('/')[0], status, bytes_received,
+                started, time.time(),
+            )
+
+        else:
+            status, data = 404, {'error': 'Not found'}
+
+        body = json.dumps(data).encode()
+        start_response(
+            '{} {}'.format(status, STATUS_REASONS.get(status, 'Error')),
+            [('Content-Type', 'application/json'),
+             ('Content-Length', str(len(body)))],
+        )
+        return [body]
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_in_thread(app: FakeTrunity, host: str='127.0.0.1', port: int=0):
+    """
+    Start the server in a daemon thread.
+    Return server instance and API root url for it.
+    Call server.shutdown() to stop it.
+    """
+    server = make_server(host, port, app, server_class=ThreadingWSGIServer,
+                         handler_class=QuietRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    api_root = 'http://{}:{}{}'.format(host, server.server_port, API_PREFIX)
+    return server, api_root
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=8765)
+    arg_parser.add_argument('--latency', type=float, default=0.0,
+                            help="Seconds every request takes.")
+    arg_parser.add_argument('--jitter', type=float, default=0.0,
+                            help="Random extra latency up to this value.")
+    arg_parser.add_argument('--error-rate', type=float, default=0.0,
+                            help="Share of requests that fail, 0..1.")
+    arg_parser.add_argument('--error-status', type=int, default=503)
+    arg_parser.add_argument('--token-ttl', type=float, default=None,
+                            help="Seconds auth tokens live.")
+    args = arg_parser.parse_args()
+
+    app = FakeTrunity(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        token_ttl=args.token_ttl,
+    )
+    server = make_server(args.host, args.port, app,
+                         server_class=ThreadingWSGIServer,
+                         handler_class=QuietRequestHandler)
+
+    print("Fake Trunity API: http://{}:{}{}".format(
+        args.host, server.server_port, API_PREFIX))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(app.stats.to_dict(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
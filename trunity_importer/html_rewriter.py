@@ -0,0 +1,179 @@
+"""
+Replacement of image src in html fragments of questions.
+
+BeautifulSoup builds a whole tree for every fragment and serializes it
+back with <html><body> around it. Here <img> start tags are found in one
+pass over the fragment and only their src and style attributes are
+changed, the rest of the markup is kept as it is. Fragments without
+images are not scanned at all.
+"""
+import html
+import re
+from collections import namedtuple
+from typing import Dict, Iterator, List, Tuple
+
+# <img> start tags; comments, CDATA sections and scripts are matched
+# to be skipped, like BeautifulSoup does with images in them:
+_TAG_RE = re.compile(
+    r'<!--.*?-->'
+    r'|<!\[CDATA\[.*?\]\]>'
+    r'|<(script|style)\b.*?</\1\s*>'
+    r'|(?P<img><img(?=[\s/>])(?:[^>"\']|"[^"]*"|\'[^\']*\')*>)',
+    re.IGNORECASE | re.DOTALL,
+)
+
+_ATTR_RE = re.compile(
+    r'([^\s"\'>/=]+)'
+    r'(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'=<>`]+)))?'
+)
+
+_HAS_IMG_RE = re.compile(r'<img', re.IGNORECASE)
+
+
+def has_images(fragment: str) -> bool:
+    """
+    Cheap check: False means there are surely no images in the fragment.
+    """
+    return bool(fragment) and _HAS_IMG_RE.search(fragment) is not None
+
+
+# value is unescaped, start and end are the span of the whole attribute
+# in the tag:
+Attribute = namedtuple('Attribute', ['name', 'value', 'start', 'end'])
+
+# start and end are the span of the tag in the fragment,
+# attributes are Attribute-s by lower case names:
+Image = namedtuple('Image', ['start', 'end', 'src', 'attributes'])
+
+
+def _parse_attributes(tag: str) -> Dict[str, Attribute]:
+    attributes = {}
+    # skip "<img", stop before ">" or "/>":
+    end = len(tag) - (2 if tag.endswith('/>') else 1)
+
+    for match in _ATTR_RE.finditer(tag, 4, end):
+        name = match.group(1).lower()
+        value = next((group for group in match.groups()[1:]
+                      if group is not None), '')
+
+        # the first one wins, like in browsers:
+        attributes.setdefault(name, Attribute(
+            name, html.unescape(value), match.start(), match.end()))
+
+    return attributes
+
+
+def iter_images(fragment: str) -> Iterator[Image]:
+    """
+    <img> tags with src attribute, in the order of the fragment.
+    """
+    if not has_images(fragment):
+        return
+
+    for match in _TAG_RE.finditer(fragment):
+        if match.group('img') is None:
+            continue
+
+        attributes = _parse_attributes(match.group('img'))
+        if 'src' in attributes:
+            yield Image(match.start(), match.end(),
+                        attributes['src'].value, attributes)
+
+
+def _format_attribute(name: str, value: str) -> str:
+    return '{}="{}"'.format(name, html.escape(value))
+
+
+def _rewrite_tag(tag: str, image: Image,
+                 new_attributes: Dict[str, str]) -> str:
+    """
+    Put new values of attributes into the tag, add missing ones after
+    the last attribute.
+    """
+    replacements = []  # (start, end, text)
+    added = []
+
+    for name, value in new_attributes.items():
+        attribute = image.attributes.get(name)
+        if attribute is None:
+            added.append(' ' + _format_attribute(name, value))
+        else:
+            replacements.append((attribute.start, attribute.end,
+                                 _format_attribute(name, value)))
+
+    # images always have src, so there is the last attribute:
+    last_end = max(attribute.end for attribute in image.attributes.values())
+    replacements.append((last_end, last_end, ''.join(added)))
+
+    return _splice(tag, replacements)
+
+
+def _splice(text: str, replacements: List[Tuple[int, int, str]]) -> str:
+    parts = []
+    position = 0
+
+    for start, end, new_text in sorted(replacements):
+        parts.append(text[position:start])
+        parts.append(new_text)
+        position = end
+
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+class ImageRewriter(object):
+    """
+    Images of several html fragments (question text, answers, rubrics...)
+    handled in one batch: find all their src first, then put new src
+    of all of them at once.
+    """
+
+    def __init__(self, fragments: List[str]):
+        self._fragments = list(fragments)
+        # key: fragment number, value: its images
+        self._images = {}
+
+        for num, fragment in enumerate(self._fragments):
+            images = list(iter_images(fragment))
+            if images:
+                self._images[num] = images
+
+    @property
+    def fragments(self) -> List[str]:
+        return list(self._fragments)
+
+    @property
+    def srcs(self) -> List[str]:
+        """
+        src of every image, fragment by fragment.
+        """
+        return [image.src for num in sorted(self._images)
+                for image in self._images[num]]
+
+    def __bool__(self):
+        return bool(self._images)
+
+    def rewrite(self, srcs: List[str], style: str=None) -> List[str]:
+        """
+        Fragments with new `srcs` of images (in the order of `self.srcs`).
+        Style of images is replaced with `style` if it's given.
+        """
+        srcs = iter(srcs)
+        fragments = list(self._fragments)
+
+        for num in sorted(self._images):
+            fragment = fragments[num]
+            replacements = []
+
+            for image in self._images[num]:
+                new_attributes = {'src': next(srcs)}
+                if style is not None:
+                    new_attributes['style'] = style
+
+                tag = fragment[image.start:image.end]
+                replacements.append((image.start, image.end,
+                                     _rewrite_tag(tag, image, new_attributes)))
+
+            fragments[num] = _splice(fragment, replacements)
+
+        return fragments
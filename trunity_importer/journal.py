@@ -0,0 +1,158 @@
+"""
+Durable journal of import progress. Lets us resume interrupted imports
+without uploading everything again and creating duplicate question pools.
+"""
+import json
+import os
+import threading
+from typing import Callable, List
+
+from requests import Session
+from trunity_3_client.builders import Questionnaire
+
+from trunity_importer.metrics import metrics
+
+
+class Journal(object):
+    """
+    Append-only JSON lines file with finished steps of the import.
+
+    Every record looks like {"kind": ..., "key": ..., "value": ...} and
+    is written to disk right after the step is done.
+
+    When `path` is None, the journal lives in memory only.
+    """
+    MEDIA = 'media'  # key: zip member name, value: CDN url
+    TOPIC = 'topic'  # key: topic title, value: topic id
+    POOL = 'pool'  # key: test_id or questionnaire file, value: content id
+    QUESTION = 'question'  # key: "<pool key>:<question number>"
+    QUESTIONNAIRE = 'questionnaire'  # key: pool key, question pool is uploaded
+
+    def __init__(self, path: str=None, resume: bool=False,
+                 read_only: bool=False):
+        """
+        :param path: journal file.
+        :param resume: load records from existing journal file.
+            Otherwise the file is truncated.
+        :param read_only: never write the file (dry run). New records
+            are kept in memory.
+        """
+        self._records = {}  # key: (kind, key), value: value
+        self._lock = threading.Lock()
+
+        self._file = None
+        if path:
+            is_complete = True
+            if resume and os.path.exists(path):
+                is_complete = self._load(path)
+
+            if read_only:
+                return
+
+            self._file = open(path, 'a' if resume else 'w')
+
+            if not is_complete:
+                # don't glue the next record to the cut line:
+                self._file.write('\n')
+
+    def _load(self, path: str) -> bool:
+        """
+        Load records. Return False if the last line is incomplete.
+        """
+        line = '\n'
+
+        with open(path) as fo:
+            for line in fo:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last line may be cut if the process was killed
+                    continue
+
+                self._records[(record['kind'], record['key'])] = \
+                    record.get('value')
+
+        return line.endswith('\n')
+
+    def get(self, kind: str, key: str, default=None):
+        with self._lock:
+            return self._records.get((kind, key), default)
+
+    def is_done(self, kind: str, key: str) -> bool:
+        with self._lock:
+            return (kind, key) in self._records
+
+    def get_or_create(self, kind: str, key: str, create: Callable):
+        """
+        Return value of the finished step. If the step isn't in the journal
+        yet, do it by calling `create` and record its result.
+        """
+        value = self.get(kind, key)
+
+        if value is None:
+            value = create()
+            self.add(kind, key, value)
+
+        return value
+
+    def add(self, kind: str, key: str, value=None):
+        with self._lock:
+            self._records[(kind, key)] = value
+
+            if self._file is not None:
+                self._file.write(json.dumps(
+                    {"kind": kind, "key": key, "value": value}) + '\n')
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class JournaledQuestionnaire(Questionnaire):
+    """
+    Questionnaire that records every uploaded question in the journal
+    and skips questions that were uploaded by the previous run.
+    """
+
+    def __init__(self, session: Session, journal: Journal, key: str):
+        super(JournaledQuestionnaire, self).__init__(session)
+        self._journal = journal
+        self._key = key
+
+    def __len__(self):
+        return len(self._questions)
+
+    def extend(self, questions: List[dict]):
+        """
+        Add questions built before, dicts like `add_*` methods make
+        (see trunity_importer.compiled).
+        """
+        self._questions.extend(dict(question) for question in questions)
+
+    def upload(self, questionnaire_id: str):
+        with metrics.timer('questionnaire_upload'):
+            self._upload(questionnaire_id)
+
+    def _upload(self, questionnaire_id: str):
+        print('Start uploading Questionnaire: ', end='')
+
+        for number, question in enumerate(self._questions):
+            question_key = '{}:{}'.format(self._key, number)
+
+            if self._journal.is_done(Journal.QUESTION, question_key):
+                print('. ', end='')
+                continue
+
+            question = dict(question)
+            qst_type = question.pop('type')
+            attr_name = 'create_' + qst_type
+            getattr(self._client, attr_name)(questionnaire_id, **question)
+
+            self._journal.add(Journal.QUESTION, question_key)
+            print('+ ', end='')
+
+        self._journal.add(Journal.QUESTIONNAIRE, self._key)
+        print('\t\t Done!')
@@ -0,0 +1,208 @@
+"""
+Uploading media files (images, mp3) from zip archives to Trunity.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Iterable, Dict
+from zipfile import ZipFile
+
+from requests import HTTPError
+from trunity_3_client import FilesClient
+
+from trunity_importer.journal import Journal
+from trunity_importer.metrics import metrics
+from trunity_importer.multipart import (
+    SPOOL_MAX_SIZE,
+    SpooledMember,
+    hash_member,
+    open_member,
+)
+from trunity_importer.prefetch import MediaPrefetcher
+from trunity_importer.upload_cache import UploadCache
+from trunity_importer.utils import call_with_retries
+
+
+class MediaUploader(object):
+    """
+    Upload zip members to Trunity with a bounded pool of worker threads.
+
+    Transient HTTP errors are retried with exponential backoff.
+    Files with the same content are uploaded only once (see UploadCache).
+    Members bigger than `spool_max_size` are never read into memory as
+    a whole: use StreamingFilesClient to send them in chunks. Compressed
+    members are decompressed once, the copy made while they're hashed is
+    sent (see multipart.hash_member). With `prefetcher`, members of the
+    upcoming questions (see `prefetch`) are decompressed ahead.
+    Members uploaded by previous run are taken from the journal.
+    """
+
+    def __init__(self, files_client: FilesClient, zip_file: ZipFile,
+                 workers: int=1, retries: int=3, backoff: float=0.5,
+                 cache: UploadCache=None, journal: Journal=None,
+                 prefetcher: MediaPrefetcher=None,
+                 spool_max_size: int=SPOOL_MAX_SIZE):
+        self._files_client = files_client
+        self._zip_file = zip_file
+        self._retries = retries
+        self._backoff = backoff
+        self._cache = cache if cache is not None else UploadCache()
+        self._journal = journal if journal is not None else Journal()
+        self._prefetcher = prefetcher
+        self._spool_max_size = spool_max_size
+
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+        self._lock = threading.Lock()
+        self._futures = {}  # key: member name, value: Future
+        self._uploads_in_progress = {}  # key: content hash, value: Future
+
+    def _open(self, name: str):
+        if self._prefetcher is not None:
+            return self._prefetcher.open(name)
+
+        return open_member(self._zip_file, name)
+
+    def _post(self, name: str, spooled: SpooledMember=None) -> str:
+        try:
+            return self._post_once(name, spooled)
+
+        except HTTPError as error:
+            if error.response is None or error.response.status_code != 401:
+                raise
+
+            # the token is renewed already, but the streamed body can't
+            # be sent again by the session (see SessionManager):
+            return self._post_once(name, spooled)
+
+    def _post_once(self, name: str, spooled: SpooledMember=None) -> str:
+        if spooled is not None:
+            # the copy is rewound for every attempt:
+            spooled.seek(0)
+            return self._post_file(name, spooled)
+
+        # the member is opened for every attempt and closed right after it:
+        with self._open(name) as file_obj:
+            return self._post_file(name, file_obj)
+
+    def _post_file(self, name: str, file_obj) -> str:
+        with metrics.timer('upload', size=file_obj.size):
+            # file name is used by Trunity for extension white list:
+            file_obj.name = os.path.basename(name)
+            return self._files_client.list.post(file_obj=file_obj)
+
+    def _upload_content(self, name: str, digest: str,
+                        spooled: SpooledMember=None) -> str:
+        """
+        :param spooled: copy of the member to send instead of the member.
+        """
+        cdn_file_url = self._cache.get(digest)
+
+        if cdn_file_url is None:
+            cdn_file_url = call_with_retries(
+                lambda: self._post(name, spooled),
+                retries=self._retries,
+                backoff=self._backoff,
+            )
+            self._cache.set(digest, cdn_file_url)
+
+        return cdn_file_url
+
+    def prefetch(self, names: Iterable[str]):
+        """
+        Read ahead members that are going to be uploaded soon.
+        Does nothing without prefetcher.
+        """
+        if self._prefetcher is None:
+            return
+
+        self._prefetcher.prefetch(
+            name for name in names
+            if name not in self._futures
+            and not self._journal.is_done(Journal.MEDIA, name)
+        )
+
+    def upload(self, name: str) -> str:
+        """
+        Upload zip member and return its CDN url.
+        """
+        try:
+            return self._journal.get_or_create(
+                Journal.MEDIA, name, lambda: self._upload(name))
+
+        finally:
+            if self._prefetcher is not None:
+                self._prefetcher.release(name)
+
+    def _upload(self, name: str) -> str:
+        with self._open(name) as file_obj, \
+                metrics.timer('media_read', size=file_obj.size):
+            digest, spooled = hash_member(file_obj, self._spool_max_size)
+
+        try:
+            return self._upload_hashed(name, digest, spooled)
+
+        finally:
+            if spooled is not None:
+                spooled.close()
+
+    def _upload_hashed(self, name: str, digest: str,
+                     spooled: SpooledMember=None) -> str:
+        # the same content may be uploading right now under another name:
+        with self._lock:
+            future = self._uploads_in_progress.get(digest)
+            is_owner = future is None
+            if is_owner:
+                future = self._uploads_in_progress[digest] = Future()
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            cdn_file_url = self._upload_content(name, digest, spooled)
+
+        except Exception as error:
+            future.set_exception(error)
+            raise
+
+        else:
+            future.set_result(cdn_file_url)
+            return cdn_file_url
+
+        finally:
+            with self._lock:
+                del self._uploads_in_progress[digest]
+
+    def submit(self, name: str) -> Future:
+        """
+        Schedule upload of zip member. Future result is CDN url.
+        Every member is uploaded once per run.
+        """
+        with self._lock:
+            future = self._futures.get(name)
+
+            # failed uploads are scheduled again:
+            if future is None or (future.done() and future.exception()):
+                future = self._futures[name] = self._executor.submit(
+                    self.upload, name)
+
+        return future
+
+    def upload_many(self, names: Iterable[str]) -> Dict[str, str]:
+        """
+        Upload zip members in parallel.
+        Return dict with member names as keys and CDN urls as values.
+        """
+        futures = {}
+
+        for name in names:
+            if name not in futures:
+                futures[name] = self.submit(name)
+
+        return {name: future.result() for name, future in futures.items()}
+
+    def close(self):
+        self._executor.shutdown()
+
+        if self._prefetcher is not None:
+            self._prefetcher.close()
@@ -0,0 +1,240 @@
+"""
+Counters, bytes and latency histograms of import stages.
+
+Stages are named by the code that records them:
+
+    xml_read               reading of SDA xml and indexing of its tests
+    parse                  parsing of one question (item) of the package
+    validate               validation of one question
+    html_parse             scan of SDA question html for images (see
+                           html_rewriter, no html parser involved)
+    html_rewrite           putting CDN urls into question html: splicing of
+                           img tags for SDA, BeautifulSoup for QTI
+    media_read             reading (and decompressing) of one media file
+    upload                 upload of one media file to Trunity
+    pool_create            creation of one question pool
+    questionnaire_upload   upload of all questions of one question pool
+
+Use the module-level `metrics` object:
+
+    with metrics.timer('parse', size=len(xml)):
+        ...
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict
+
+# upper bounds of histogram buckets, seconds:
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+           10.0)
+
+PROMETHEUS_PREFIX = 'trunity_importer'
+
+
+class Metric(object):
+    """
+    Statistics of one stage.
+    """
+    __slots__ = ('count', 'errors', 'bytes', 'seconds', 'max_seconds',
+                 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)  # the last one is +Inf
+
+    def observe(self, seconds: float, size: int=0, error: bool=False):
+        self.count += 1
+        self.errors += error
+        self.bytes += size
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+        for num, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[num] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def merge(self, data: dict):
+        self.count += data['count']
+        self.errors += data['errors']
+        self.bytes += data['bytes']
+        self.seconds += data['seconds']
+        self.max_seconds = max(self.max_seconds, data['max_seconds'])
+        self.buckets = [mine + theirs for mine, theirs
+                        in zip(self.buckets, data['buckets'])]
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'bytes': self.bytes,
+            'seconds': self.seconds,
+            'max_seconds': self.max_seconds,
+            'buckets': list(self.buckets),
+        }
+
+
+class Metrics(object):
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}  # key: stage name, value: Metric
+
+    def observe(self, name: str, seconds: float, size: int=0,
+                error: bool=False):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Metric()
+
+            metric.observe(seconds, size, error)
+
+    @contextmanager
+    def timer(self, name: str, size: int=0):
+        """
+        Record time of the block. Failed blocks are counted as errors.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.observe(name, time.perf_counter() - started, size, error=True)
+            raise
+        else:
+            self.observe(name, time.perf_counter() - started, size)
+
+    def to_dict(self) -> Dict[str, dict]:
+        with self._lock:
+            return {name: metric.to_dict()
+                    for name, metric in sorted(self._metrics.items())}
+
+    def pop_all(self) -> Dict[str, dict]:
+        """
+        Take all metrics away (to send them from worker process).
+        """
+        with self._lock:
+            metrics, self._metrics = self._metrics, {}
+
+        return {name: metric.to_dict() for name, metric in metrics.items()}
+
+    def merge(self, metrics: Dict[str, dict]):
+        """
+        Add metrics of another process (see `pop_all`).
+        """
+        with self._lock:
+            for name, data in metrics.items():
+                self._metrics.setdefault(name, Metric()).merge(data)
+
+    def clear(self):
+        with self._lock:
+            self._metrics = {}
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'buckets': list(BUCKETS),
+            'stages': self.to_dict(),
+        }, indent=2)
+
+    def to_prometheus(self) -> str:
+        """
+        Metrics in Prometheus text exposition format
+        (for node_exporter textfile collector, for instance).
+        """
+        prefix = PROMETHEUS_PREFIX
+        lines = [
+            '# HELP {}_stage_seconds Time spent in import stage.'.format(prefix),
+            '# TYPE {}_stage_seconds histogram'.format(prefix),
+        ]
+        stages = self.to_dict()
+
+        for name, data in stages.items():
+            cumulative = 0
+            bounds = [repr(bound) for bound in BUCKETS] + ['+Inf']
+
+            for bound, count in zip(bounds, data['buckets']):
+                cumulative += count
+                lines.append('{}_stage_seconds_bucket{{stage="{}",le="{}"}} {}'
+                             .format(prefix, name, bound, cumulative))
+
+            lines.append('{}_stage_seconds_sum{{stage="{}"}} {}'.format(
+                prefix, name, repr(data['seconds'])))
+            lines.append('{}_stage_seconds_count{{stage="{}"}} {}'.format(
+                prefix, name, data['count']))
+
+        for metric, field, help_text in [
+            ('stage_errors_total', 'errors', 'Failed calls of import stage.'),
+            ('stage_bytes_total', 'bytes', 'Bytes handled by import stage.'),
+        ]:
+            lines.append('# HELP {}_{} {}'.format(prefix, metric, help_text))
+            lines.append('# TYPE {}_{} counter'.format(prefix, metric))
+            for name, data in stages.items():
+                lines.append('{}_{}{{stage="{}"}} {}'.format(
+                    prefix, metric, name, data[field]))
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str):
+        """
+        Write metrics to JSON file if `path` ends with .json,
+        to Prometheus textfile otherwise.
+        """
+        content = self.to_json() if path.endswith('.json') \
+            else self.to_prometheus()
+
+        with open(path, 'w') as file_obj:
+            file_obj.write(content)
+
+    @staticmethod
+    def _format_bytes(size: int) -> str:
+        for unit in ['B', 'KB', 'MB']:
+            if size < 1024:
+                return '{:.0f} {}'.format(size, unit)
+            size /= 1024
+
+        return '{:.1f} GB'.format(size)
+
+    def print(self):
+        print('\n')
+        print("\033[1;36m" + "=" * 78)
+        print(" " * 30 + "<<<< Metrics >>>>")
+        print("=" * 78 + "\033[0m")
+        print()
+
+        stages = self.to_dict()
+        if not stages:
+            print(">>> Nothing is recorded!")
+            return
+
+        rows = [
+            ('stage', 'count', 'errors', 'total, s', 'mean, ms', 'max, ms',
+             'bytes'),
+        ]
+        for name, data in stages.items():
+            rows.append((
+                name,
+                str(data['count']),
+                str(data['errors']),
+                '{:.2f}'.format(data['seconds']),
+                '{:.1f}'.format(data['seconds'] / data['count'] * 1000),
+                '{:.1f}'.format(data['max_seconds'] * 1000),
+                self._format_bytes(data['bytes']) if data['bytes'] else '-',
+            ))
+
+        widths = [max(len(row[column]) for row in rows)
+                  for column in range(len(rows[0]))]
+        for row in rows:
+            print('  '.join(
+                [row[0].ljust(widths[0])] +
+                [cell.rjust(width) for cell, width in zip(row[1:], widths[1:])]
+            ))
+
+
+metrics = Metrics()
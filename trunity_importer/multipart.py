@@ -0,0 +1,345 @@
+"""
+Streaming upload of zip members to Trunity.
+
+FilesClient hands the file to requests, which builds the whole multipart
+body in memory. StreamingFilesClient sends the body in fixed-size chunks
+with known Content-Length, so memory doesn't grow with the size of media
+files.
+
+Stored (not compressed) members are read straight from a memory-mapped
+view of the archive, compressed ones are decompressed chunk by chunk.
+Compressed members are spooled while they're hashed (see hash_member),
+so they're decompressed once even if they're sent after that.
+"""
+import mmap
+import os
+import struct
+import tempfile
+import uuid
+import zlib
+from typing import BinaryIO, Dict, Iterable, Iterator, Tuple, Union
+from zipfile import BadZipFile, ZipExtFile, ZipFile, ZipInfo, ZIP_STORED
+
+from trunity_3_client import FilesClient
+from trunity_3_client.clients.endpoints import remote_files
+
+from trunity_importer.upload_cache import chunks_content_hash
+
+CHUNK_SIZE = 64 * 1024
+
+# bigger spooled members go to a temporary file:
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+FILE_FIELD = 'remote_file[file]'
+
+# local file header: signature, versions, flags... file name length, extra length
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+
+class MappedMember(object):
+    """
+    Read-only file object of a stored zip member backed by mmap.
+
+    Unlike ZipFile.open() it doesn't share the file position of the
+    archive, so many threads read members without locking.
+    CRC is checked when the member is read to the end.
+    """
+
+    def __init__(self, fileno: int, info: ZipInfo, data_offset: int):
+        start = data_offset - data_offset % mmap.ALLOCATIONGRANULARITY
+
+        self.name = info.filename
+        self.size = info.file_size
+
+        self._info = info
+        self._mmap = None
+        self._view = None
+        self._position = 0
+        self._crc = 0
+
+        if info.file_size:
+            self._mmap = mmap.mmap(
+                fileno, data_offset - start + info.file_size,
+                access=mmap.ACCESS_READ, offset=start,
+            )
+            self._view = memoryview(self._mmap)[
+                data_offset - start:data_offset - start + info.file_size]
+
+    def read(self, size: int=-1) -> bytes:
+        end = self._info.file_size
+        if size is not None and size >= 0:
+            end = min(end, self._position + size)
+
+        if self._view is None or end <= self._position:
+            return b''
+
+        data = self._view[self._position:end].tobytes()
+        self._position = end
+
+        self._crc = zlib.crc32(data, self._crc)
+        if end == self._info.file_size and self._crc != self._info.CRC:
+            raise BadZipFile(
+                "Bad CRC-32 for file {!r}".format(self._info.filename))
+
+        return data
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self):
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _get_fileno(zip_file: ZipFile):
+    try:
+        return zip_file.fp.fileno()
+    except (AttributeError, OSError, ValueError):
+        # archive in memory (BytesIO) or closed
+        return None
+
+
+def _get_data_offset(fileno: int, info: ZipInfo) -> int:
+    """
+    Offset of member data in the archive.
+    Length of extra field may differ in local and central headers,
+    so the local one is read.
+    """
+    header = os.pread(fileno, _LOCAL_HEADER.size, info.header_offset)
+    if len(header) != _LOCAL_HEADER.size:
+        raise BadZipFile("Truncated file header")
+
+    fields = _LOCAL_HEADER.unpack(header)
+    if fields[0] != _LOCAL_HEADER_SIGNATURE:
+        raise BadZipFile("Bad magic number for file header")
+
+    file_name_length, extra_length = fields[-2:]
+    return (info.header_offset + _LOCAL_HEADER.size
+            + file_name_length + extra_length)
+
+
+def open_member(zip_file: ZipFile, name: str) -> BinaryIO:
+    """
+    Open zip member for reading. Use it as context manager.
+
+    Stored members of archives on disk are memory-mapped, the others
+    are opened with ZipFile.open(). Either way the file object has
+    `name` and `size` (uncompressed) attributes.
+    """
+    info = zip_file.getinfo(name)
+    fileno = _get_fileno(zip_file)
+
+    is_mappable = (
+        info.compress_type == ZIP_STORED
+        and not info.flag_bits & 0x1  # encrypted
+        and fileno is not None
+        and hasattr(os, 'pread')
+    )
+    if is_mappable:
+        return MappedMember(fileno, info, _get_data_offset(fileno, info))
+
+    file_obj = zip_file.open(info)
+    file_obj.size = info.file_size
+    return file_obj
+
+
+def iter_chunks(file_obj: BinaryIO,
+                chunk_size: int=CHUNK_SIZE) -> Iterator[bytes]:
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def iter_member(zip_file: ZipFile, name: str,
+                chunk_size: int=CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Content of zip member in chunks. The member is closed when
+    iteration is over (or the iterator is closed).
+    """
+    with open_member(zip_file, name) as file_obj:
+        yield from iter_chunks(file_obj, chunk_size)
+
+
+class SpooledMember(object):
+    """
+    Copy of a zip member written while the member is read, in memory up
+    to `max_size` bytes and in a temporary file otherwise. Has `name` and
+    `size` like the file objects of open_member. Rewind it with seek(0)
+    to read it again.
+    """
+
+    def __init__(self, name: str, size: int, max_size: int=SPOOL_MAX_SIZE):
+        self.name = name
+        self.size = size
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_size)
+
+    def spool(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        Write the chunks to the copy and pass them on.
+        """
+        for chunk in chunks:
+            self._file.write(chunk)
+            yield chunk
+
+    def read(self, size: int=-1) -> bytes:
+        return self._file.read(size)
+
+    def seek(self, offset: int) -> int:
+        return self._file.seek(offset)
+
+    def tell(self) -> int:
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def hash_member(file_obj: BinaryIO, spool_max_size: int=SPOOL_MAX_SIZE
+                ) -> Tuple[str, Union[SpooledMember, None]]:
+    """
+    Content hash of the opened member (see upload_cache) and its copy
+    to send, so the member isn't decompressed twice. Memory-mapped and
+    prefetched members are cheap to read again, they aren't copied
+    (the copy is None).
+    """
+    chunks = iter_chunks(file_obj)
+    if not isinstance(file_obj, ZipExtFile):
+        return chunks_content_hash(chunks), None
+
+    spooled = SpooledMember(file_obj.name, file_obj.size, spool_max_size)
+    try:
+        return chunks_content_hash(spooled.spool(chunks)), spooled
+
+    except Exception:
+        spooled.close()
+        raise
+
+
+def get_size(file_obj: BinaryIO) -> Union[int, None]:
+    size = getattr(file_obj, 'size', None)
+    if size is not None:
+        return size - file_obj.tell() if hasattr(file_obj, 'tell') else size
+
+    try:
+        return os.fstat(file_obj.fileno()).st_size - file_obj.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+class MultipartFile(object):
+    """
+    multipart/form-data body with one file in it.
+
+    It's iterable and has length, so requests sends it as it is, chunk by
+    chunk, with Content-Length header. The file is read once, from its
+    current position: make a new body to send the file again.
+    """
+
+    def __init__(self, file_obj: BinaryIO, size: int, field: str=FILE_FIELD,
+                 file_name: str=None, boundary: str=None,
+                 chunk_size: int=CHUNK_SIZE):
+        """
+        :param file_name: name of file_obj by default.
+        :param boundary: random by default.
+        """
+        self._file_obj = file_obj
+        self._size = size
+        self._chunk_size = chunk_size
+
+        self.boundary = boundary or uuid.uuid4().hex
+
+        # file name is used by Trunity for extension white list:
+        file_name = os.path.basename(
+            file_name or getattr(file_obj, 'name', None) or 'file')
+        self._head = (
+            '--{boundary}\r\n'
+            'Content-Disposition: form-data; name="{field}"; '
+            'filename="{file_name}"\r\n'
+            'Content-Type: application/octet-stream\r\n\r\n'
+        ).format(
+            boundary=self.boundary,
+            field=field,
+            file_name=file_name.replace('"', '%22'),
+        ).encode()
+        self._tail = '\r\n--{}--\r\n'.format(self.boundary).encode()
+
+    @property
+    def content_type(self) -> str:
+        return 'multipart/form-data; boundary={}'.format(self.boundary)
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
+            'Content-Type': self.content_type,
+            'Content-Length': str(len(self)),
+        }
+
+    def __len__(self):
+        return len(self._head) + self._size + len(self._tail)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._head
+
+        sent = 0
+        for chunk in iter_chunks(self._file_obj, self._chunk_size):
+            sent += len(chunk)
+            yield chunk
+
+        # Content-Length is sent already, it's too late to fix it:
+        if sent != self._size:
+            raise IOError("File size changed: {} bytes expected, {} read"
+                          .format(self._size, sent))
+
+        yield self._tail
+
+
+class StreamingFilesListClient(remote_files.FilesListClient):
+    """
+    FilesListClient that streams files of known size instead of
+    building the whole request in memory.
+    """
+
+    def post(self, remote_file_url: str=None, file_path=None,
+             file_obj=None) -> str:
+        if file_path and not remote_file_url:
+            with open(file_path, 'rb') as file_object:
+                return self.post(file_obj=file_object)
+
+        size = get_size(file_obj) if file_obj and not remote_file_url \
+            else None
+        if size is None:
+            return super(StreamingFilesListClient, self).post(
+                remote_file_url, file_path, file_obj)
+
+        body = MultipartFile(file_obj, size)
+        response = self._session.post(self._url, data=body,
+                                      headers=body.headers)
+        response.raise_for_status()
+        return response.json()['file_url']
+
+
+class StreamingFilesClient(FilesClient):
+
+    def __init__(self, session):
+        super(StreamingFilesClient, self).__init__(session)
+        self.list = StreamingFilesListClient(session)
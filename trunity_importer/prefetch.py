@@ -0,0 +1,152 @@
+"""
+Reading media files of upcoming questions ahead of their upload.
+"""
+import io
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Iterable
+from zipfile import ZipFile
+
+from trunity_importer.multipart import open_member
+
+DEFAULT_PREFETCH_BYTES = 64 * 1024 * 1024
+
+
+class PrefetchedMember(io.BytesIO):
+    """
+    Zip member read into memory. Has `name` and `size` like the file
+    objects of multipart.open_member.
+    """
+
+    def __init__(self, name: str, data: bytes):
+        super(PrefetchedMember, self).__init__(data)
+        self.name = name
+        self.size = len(data)
+
+
+class MediaPrefetcher(object):
+    """
+    Decompress zip members that are going to be uploaded soon on worker
+    threads (zlib releases the GIL), so uploads never wait for inflate.
+
+    Members are read in the order they were asked for and kept in memory
+    until they are released. Total size of them is bounded by `max_bytes`,
+    next members are read as the uploaded ones are released. Members
+    bigger than `max_member_size` are never prefetched: they are streamed
+    straight from the zip when they are opened.
+    """
+
+    def __init__(self, zip_file: ZipFile, workers: int=2,
+                 max_bytes: int=DEFAULT_PREFETCH_BYTES,
+                 max_member_size: int=None):
+        """
+        :param max_member_size: a quarter of `max_bytes` by default.
+        """
+        self._zip_file = zip_file
+        self._max_bytes = max_bytes
+        self._max_member_size = max_member_size if max_member_size is not None \
+            else max_bytes // 4
+
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+        self._lock = threading.Lock()
+        self._queue = deque()  # names waiting for the memory
+        self._queued = set()
+        self._members = {}  # key: name, value: (Future, size)
+        self._reserved = 0
+
+    @property
+    def reserved(self) -> int:
+        """
+        Bytes of members being read or kept in memory.
+        """
+        return self._reserved
+
+    def _get_size(self, name: str):
+        try:
+            return self._zip_file.getinfo(name).file_size
+        except KeyError:
+            # the uploader reports missing files
+            return None
+
+    def prefetch(self, names: Iterable[str]):
+        """
+        Ask to read these members ahead.
+        """
+        with self._lock:
+            for name in names:
+                if name in self._members or name in self._queued:
+                    continue
+
+                size = self._get_size(name)
+                if size is None or size > self._max_member_size:
+                    continue
+
+                self._queue.append((name, size))
+                self._queued.add(name)
+
+            self._start_reading()
+
+    def _start_reading(self):
+        while self._queue:
+            name, size = self._queue[0]
+            if self._reserved + size > self._max_bytes:
+                break
+
+            self._queue.popleft()
+            self._queued.discard(name)
+
+            self._reserved += size
+            self._members[name] = (
+                self._executor.submit(self._read, name), size)
+
+    def _read(self, name: str) -> bytes:
+        with open_member(self._zip_file, name) as file_obj:
+            return file_obj.read()
+
+    def open(self, name: str) -> BinaryIO:
+        """
+        Open the member: from memory if it's prefetched, from the zip
+        otherwise. Use it as context manager.
+        """
+        with self._lock:
+            future, _ = self._members.get(name, (None, None))
+
+            if future is None and name in self._queued:
+                # it's needed right now, no sense to read it in advance:
+                self._queue = deque(
+                    (queued_name, size) for queued_name, size in self._queue
+                    if queued_name != name)
+                self._queued.discard(name)
+
+        # failed reads are done again, to report the error:
+        if future is not None and future.exception() is None:
+            return PrefetchedMember(name, future.result())
+
+        return open_member(self._zip_file, name)
+
+    def release(self, name: str):
+        """
+        Forget the member (it's uploaded) and free its memory.
+        """
+        with self._lock:
+            future, size = self._members.pop(name, (None, 0))
+            if future is None:
+                return
+
+            # data of the running read is dropped when it's over:
+            future.cancel()
+            self._reserved -= size
+            self._start_reading()
+
+    def close(self):
+        with self._lock:
+            self._queue.clear()
+            self._queued.clear()
+            for future, _ in self._members.values():
+                future.cancel()
+            self._members.clear()
+            self._reserved = 0
+
+        self._executor.shutdown()
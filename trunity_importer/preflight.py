@@ -0,0 +1,159 @@
+"""
+Check of media files before the import.
+
+Importers collect every media file their questions refer to and check
+them against the zip before anything is sent to Trunity, so a package
+with missing files fails at once instead of in the middle of the import.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable, List
+from zipfile import ZipFile
+
+# number of unused members printed, the rest are only counted:
+MAX_PRINTED_UNUSED = 20
+
+
+class PreflightError(ValueError):
+    """
+    Raise when media files referred to by questions are not in the zip.
+    """
+
+    def __init__(self, report: 'MediaReport'):
+        super(PreflightError, self).__init__(
+            "{} media file(s) referred to by questions are not in the "
+            "package: {}".format(len(report.missing),
+                                 ', '.join(report.missing)))
+        self.report = report
+
+
+class ZipIndex(object):
+    """
+    Members of zip file by name and by case-folded name.
+    Directories are not indexed.
+    """
+
+    def __init__(self, zip_file: ZipFile):
+        self._sizes = {}  # key: member name, value: uncompressed size
+        self._folded = {}  # key: casefolded name, value: member names
+
+        for info in zip_file.infolist():
+            if info.is_dir():
+                continue
+
+            self._sizes[info.filename] = info.file_size
+            self._folded.setdefault(info.filename.casefold(), []).append(
+                info.filename)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._sizes)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._sizes
+
+    def get_size(self, name: str) -> int:
+        return self._sizes[name]
+
+    def find_ignoring_case(self, name: str) -> List[str]:
+        """
+        Members whose names differ from `name` in case only.
+        """
+        return [member for member in self._folded.get(name.casefold(), [])
+                if member != name]
+
+
+def _is_media(name: str) -> bool:
+    # the rest of the package is xml: export, manifest, items...
+    return not name.lower().endswith('.xml')
+
+
+class MediaReport(object):
+    """
+    Result of `check_media`.
+    """
+
+    def __init__(self, references: Dict[str, int],
+                 missing: Dict[str, List[str]], unused: List[str],
+                 total_bytes: int):
+        """
+        :param references: key: member name, value: number of references.
+        :param missing: key: member name, value: members with the same name
+            in other case (Trunity and zip are case-sensitive, so they don't
+            count).
+        """
+        self.references = references
+        self.missing = missing
+        self.unused = unused
+        self.total_bytes = total_bytes
+
+    @property
+    def ok(self) -> bool:
+        return not self.missing
+
+    def check(self):
+        """
+        Raise PreflightError if some media files are missing.
+        """
+        if not self.ok:
+            raise PreflightError(self)
+
+    def print(self):
+        print('\n')
+        print("\033[1;36m" + "=" * 50)
+        print(" " * 14 + "<<<< Media check >>>>")
+        print("=" * 50 + "\033[0m")
+        print()
+
+        print("Media files referred to: {}".format(len(self.references)))
+        print("Bytes to upload: {}".format(self.total_bytes))
+
+        if self.missing:
+            print()
+            print("\033[1;31mMissing files: {}\033[0m".format(
+                len(self.missing)))
+            for name, other_case in self.missing.items():
+                hint = " (found as {})".format(', '.join(other_case)) \
+                    if other_case else ""
+                print("    {}{}".format(name, hint))
+
+        if self.unused:
+            print()
+            print("Files nobody refers to: {}".format(len(self.unused)))
+            for name in self.unused[:MAX_PRINTED_UNUSED]:
+                print("    {}".format(name))
+            if len(self.unused) > MAX_PRINTED_UNUSED:
+                print("    ...")
+
+        print()
+
+
+def check_media(zip_file: ZipFile, references: Iterable[str],
+                index: ZipIndex=None,
+                package_references: Iterable[str]=None) -> MediaReport:
+    """
+    Check zip members the questions refer to. Nothing is sent anywhere.
+
+    :param references: member names, with duplicates.
+    :param package_references: members the whole package refers to,
+        when only a part of it is imported. They aren't reported unused.
+        The same as `references` if None.
+    """
+    if index is None:
+        index = ZipIndex(zip_file)
+
+    counts = OrderedDict()
+    for name in references:
+        counts[name] = counts.get(name, 0) + 1
+
+    missing = OrderedDict(
+        (name, index.find_ignoring_case(name))
+        for name in counts if name not in index
+    )
+    used = counts if package_references is None \
+        else set(package_references).union(counts)
+    unused = [name for name in index.names
+              if name not in used and _is_media(name)]
+    total_bytes = sum(index.get_size(name) for name in counts
+                      if name in index)
+
+    return MediaReport(counts, missing, unused, total_bytes)
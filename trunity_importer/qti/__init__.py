@@ -1 +1,2 @@
-from .importer import QuestionType, Question, Importer
\ No newline at end of file
+from .importer import QuestionType, Question, Importer
+from .async_importer import AsyncImporter
\ No newline at end of file
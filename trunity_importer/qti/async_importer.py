@@ -0,0 +1,133 @@
+import asyncio
+
+from trunity_importer.async_client import (
+    AsyncClient,
+    AsyncMediaUploader,
+    AsyncQuestionnaire,
+)
+from trunity_importer.journal import Journal
+from trunity_importer.qti.importer import BaseImporter
+from trunity_importer.qti.parsers import QuestionnaireMetaInfoParser
+from trunity_importer.upload_cache import UploadCache
+
+
+class AsyncImporter(BaseImporter):
+    """
+    Import question pools from QTI XML file to Trunity on asyncio.
+
+    All requests go through one connection pool. Media files of a pool
+    are uploaded concurrently, questions are created one by one to keep
+    their order.
+    """
+
+    def __init__(self, username: str, password: str, book_id: int,
+                 path_to_zip: str, concurrency: int=100,
+                 upload_cache_path: str=None, journal_path: str=None,
+                 resume: bool=False, preflight: bool=True):
+        """
+        :param concurrency: max number of open connections to Trunity.
+        """
+        super(AsyncImporter, self).__init__(
+            book_id, path_to_zip, journal_path=journal_path, resume=resume,
+            preflight=preflight)
+        self._username = username
+        self._password = password
+        self._concurrency = concurrency
+        self._upload_cache_path = upload_cache_path
+
+        # key: topic_title, value: Task with topic_id
+        self._topic_tasks = {}
+
+    async def _create_topic(self, client: AsyncClient, topic: str,
+                            parent_topic_id: int) -> int:
+        topic_id = self._journal.get(Journal.TOPIC, topic)
+
+        if topic_id is None:
+            topic_id = await client.create_topic(
+                self._book_id, topic, parent_topic_id)
+            self._journal.add(Journal.TOPIC, topic, topic_id)
+            print("Topic created: {}".format(topic))
+
+        return topic_id
+
+    async def _get_or_create_topic(self, client: AsyncClient, topic: str,
+                                   parent_topic_id: int) -> int:
+        # pools of the same section wait for the one topic:
+        if topic not in self._topic_tasks:
+            self._topic_tasks[topic] = asyncio.ensure_future(
+                self._create_topic(client, topic, parent_topic_id))
+
+        return await asyncio.shield(self._topic_tasks[topic])
+
+    async def _import_questionnaire_file(self, client: AsyncClient,
+                                         uploader: AsyncMediaUploader,
+                                         questionnaire_file: str,
+                                         topic_id: int) -> str:
+        key = questionnaire_file
+
+        with self._zip_file.open(questionnaire_file) as meta_xml:
+            meta_info = QuestionnaireMetaInfoParser.from_xml(meta_xml)
+
+        section_topic_id = await self._get_or_create_topic(
+            client, meta_info.get_section_title(), topic_id)
+
+        questions = self._read_questions(meta_info)
+        cdn_file_urls = await uploader.upload_many(
+            name for question in questions
+            for name in self._get_media(question._soup)
+        )
+
+        questionnaire = AsyncQuestionnaire(self._journal, key=key)
+        for question in questions:
+            question._soup = self._apply_media(question._soup, cdn_file_urls)
+            self._add_question(questionnaire, question)
+
+        title = meta_info.get_questionnaire_title()
+
+        # question pool may be created by previous run:
+        questionnaire_id = self._journal.get(Journal.POOL, key)
+        if questionnaire_id is None:
+            questionnaire_id = await client.create_qst_pool(
+                self._book_id, title, section_topic_id)
+            self._journal.add(Journal.POOL, key, questionnaire_id)
+
+        await questionnaire.upload_async(client, questionnaire_id)
+        return title
+
+    async def perform_import_async(self, topic_id=None, parallel: int=10):
+        questionnaire_files = self._get_pending_questionnaire_files()
+        total = len(questionnaire_files)
+        semaphore = asyncio.Semaphore(parallel)
+
+        if self._preflight:
+            self.check_media(questionnaire_files)
+
+        async with AsyncClient(self._username, self._password,
+                               limit=self._concurrency) as client:
+            uploader = AsyncMediaUploader(
+                client, self._zip_file,
+                cache=UploadCache(self._upload_cache_path),
+                journal=self._journal,
+            )
+
+            async def import_file(questionnaire_file: str):
+                async with semaphore:
+                    title = await self._import_questionnaire_file(
+                        client, uploader, questionnaire_file, topic_id)
+                return questionnaire_file, title
+
+            tasks = [import_file(questionnaire_file)
+                     for questionnaire_file in questionnaire_files]
+
+            for num, task in enumerate(asyncio.as_completed(tasks), start=1):
+                questionnaire_file, title = await task
+                print("[{}/{}] Question pool imported: {} ({})".format(
+                    num, total, title, questionnaire_file))
+
+    def perform_import(self, topic_id=None, parallel: int=10):
+        """
+        :param topic_id: topic to import into. Root of the book if None.
+        :param parallel: number of question pools parsed and imported
+            at the same time. Bounds the memory taken by parsed pools.
+        """
+        asyncio.run(self.perform_import_async(topic_id, parallel))
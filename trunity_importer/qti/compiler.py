@@ -0,0 +1,51 @@
+from trunity_importer.compiled import ArtifactWriter, QuestionCollector
+from trunity_importer.metrics import metrics
+from trunity_importer.qti.importer import BaseImporter
+from trunity_importer.qti.parsers import QuestionnaireMetaInfoParser
+
+
+class Compiler(BaseImporter):
+    """
+    Compile QTI question pools to an artifact
+    (see trunity_importer.compiled) that is pushed to Trunity later.
+    """
+
+    def __init__(self, path_to_zip: str, preflight: bool=True):
+        super(Compiler, self).__init__(None, path_to_zip, preflight=preflight)
+
+    def compile(self, output_path: str) -> ArtifactWriter:
+        """
+        :param output_path: JSON lines file, gzipped if it ends with .gz.
+        """
+        questionnaire_files = self._get_questionnaire_files()
+
+        if self._preflight:
+            self.check_media(questionnaire_files)
+
+        with ArtifactWriter(output_path, 'qti', self._zip_file) as writer:
+            for questionnaire_file in questionnaire_files:
+                with self._zip_file.open(questionnaire_file) as meta_xml:
+                    meta_info = QuestionnaireMetaInfoParser.from_xml(meta_xml)
+
+                collector = QuestionCollector()
+
+                for question in self._read_questions(meta_info):
+                    placeholders = {
+                        name: writer.add_media(name)
+                        for name in self._get_media(question._soup)
+                    }
+
+                    with metrics.timer('html_rewrite'):
+                        question._soup = self._apply_media(
+                            question._soup, placeholders)
+                    self._add_question(collector, question)
+
+                # the importer creates empty pools too:
+                writer.write_pool(
+                    key=questionnaire_file,
+                    title=meta_info.get_questionnaire_title(),
+                    questions=collector.questions,
+                    section=meta_info.get_section_title(),
+                )
+
+        return writer
@@ -1,10 +1,11 @@
+import html
+import re
+import threading
+from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from zipfile import ZipFile
 
-from trunity_3_client.clients.auth import initialize_session_from_creds
-from trunity_3_client.clients.endpoints import (
-    TopicsClient,
-    FilesClient,
-)
+from trunity_3_client.clients.endpoints import TopicsClient
 from trunity_3_client.builders import Questionnaire
 
 
@@ -16,134 +17,380 @@ from trunity_importer.qti.parsers import (
 )
 from bs4 import BeautifulSoup
 
+from trunity_importer.dry_run import (
+    DryRunPlan,
+    DryRunUploader,
+    RecordingSessionManager,
+)
+from trunity_importer.html_rewriter import iter_images
+from trunity_importer.journal import Journal, JournaledQuestionnaire
+from trunity_importer.media import MediaUploader
+from trunity_importer.metrics import metrics
+from trunity_importer.multipart import StreamingFilesClient
+from trunity_importer.preflight import MediaReport, check_media
+from trunity_importer.prefetch import DEFAULT_PREFETCH_BYTES, MediaPrefetcher
+from trunity_importer.session import SessionManager, DEFAULT_POOL_SIZE
+from trunity_importer.upload_cache import UploadCache
 from trunity_importer.utils import create_qst_pool
 from trunity_importer.qti.handlers import AdobeFlashHandler
 
 
-class Importer(object):
+PLAYER_TEMPLATE = """ 
+        <p>
+            <audio controls>
+              <source src="{mp3_source}" type="audio/mpeg">
+                Your browser does not support the audio element.
+            </audio>
+        </p>
+        """
+
+# src of <embed> of the first flash object, see AdobeFlashHandler:
+_FLASH_SRC_RE = re.compile(
+    r'<object\b.*?<embed\b(?:[^>"\']|"[^"]*"|\'[^\']*\')*?'
+    r'\ssrc\s*=\s*(?:"([^"]*)"|\'([^\']*)\')',
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+class BaseImporter(object):
     """
-    Import question pools from QTI XML file to Trunity.
+    Parts of QTI import that don't depend on the transport:
+    reading the package, media of questions, progress journal.
     """
 
-    def __init__(self, username: str, password: str, book_id: int,
-                 path_to_zip: str):
+    def __init__(self, book_id: int, path_to_zip: str,
+                 journal_path: str=None, resume: bool=False,
+                 preflight: bool=True, dry_run: bool=False):
+        """
+        :param preflight: check media files of all questions before
+            the import (see `check_media`).
+        :param dry_run: the journal is read, but never written.
+        """
 
         self._book_id = book_id
         self._zip_file = ZipFile(path_to_zip)
-        self.t3_session = initialize_session_from_creds(username, password)
+        self._journal = Journal(journal_path, resume=resume,
+                                read_only=dry_run)
+        self._preflight = preflight
 
         # key: topic_title, value: topic_id
         self._topics = {}
-        self._cur_topic_id = None
-
-        self._topic_client = TopicsClient(self.t3_session)
-        self._files_client = FilesClient(self.t3_session)
-
-        # we need json content type for uploading questionnaires:
-        self.t3_json_session = initialize_session_from_creds(
-            username, password, content_type='application/json')
 
-    def _upload_images(self, question_soup: BeautifulSoup):
+    @staticmethod
+    def _get_media(soup: BeautifulSoup) -> List[str]:
         """
-        Upload all images to Trunity and replace src attributes with new urls.
+        Zip members (flash audio and images) the question refers to.
         """
-        for img in question_soup.find_all("img"):
-            file_obj = self._zip_file.open('testitems/' + img['src'])
-            cdn_file_url = self._files_client.list.post(file_obj=file_obj)
-            img['src'] = cdn_file_url
+        names = []
 
-        return question_soup
+        audio_file_name = AdobeFlashHandler(soup).audio_file_name
+        if audio_file_name:
+            names.append('testitems/' + audio_file_name)
 
-    def _upload_mp3_file(self, name: str) -> str:
-        print("Uploading mp3 for question...", end='')
+        names.extend('testitems/' + img['src'] for img in soup.find_all("img"))
+        return names
 
-        src = 'testitems/' + name
-        file_obj = self._zip_file.open(src)
-        cdn_file = self._files_client.list.post(file_obj=file_obj)
+    @staticmethod
+    def _get_raw_media(xml: str) -> List[str]:
+        """
+        The same as `_get_media`, found in the item xml without parsing it.
+        """
+        names = []
 
-        print("\t\t Success!")
-        return cdn_file
+        match = _FLASH_SRC_RE.search(xml)
+        if match:
+            src = html.unescape(match.group(1) or match.group(2) or '')
+            audio_file_name = src.split('=/')[-1]
+            if audio_file_name:
+                names.append('testitems/' + audio_file_name)
 
-    def handle_flash_audio(self, soup):
-        handler = AdobeFlashHandler(soup)
+        names.extend('testitems/' + image.src for image in iter_images(xml))
+        return names
 
-        player_template = """ 
-        <p>
-            <audio controls>
-              <source src="{mp3_source}" type="audio/mpeg">
-                Your browser does not support the audio element.
-            </audio>
-        </p>
+    @staticmethod
+    def _apply_media(soup: BeautifulSoup,
+                     cdn_file_urls: Dict[str, str]) -> BeautifulSoup:
+        """
+        Replace flash audio with html5 player and image sources
+        with their CDN urls.
         """
+        handler = AdobeFlashHandler(soup)
 
         if handler.audio_file_name:
-            cdn_mp3 = self._upload_mp3_file(handler.audio_file_name)
-            player_template = player_template.format(mp3_source=cdn_mp3)
-            handler.replace_flash_tag(markup=player_template)
+            cdn_mp3 = cdn_file_urls['testitems/' + handler.audio_file_name]
+            handler.replace_flash_tag(
+                markup=PLAYER_TEMPLATE.format(mp3_source=cdn_mp3))
             soup = handler.soup
 
+        for img in soup.find_all("img"):
+            img['src'] = cdn_file_urls['testitems/' + img['src']]
+
         return soup
 
-    def _import_question_pool(self, questionnaire_meta_xml: str, topic_id: int):
-        questionnaire = Questionnaire(self.t3_json_session)
+    def _get_questionnaire_files(self) -> List[str]:
+        with self._zip_file.open('imsmanifest.xml') as manifest_xml:
+            return ManifestParser.from_xml(
+                manifest_xml).get_questionnaire_files()
 
-        meta_info = QuestionnaireMetaInfoParser.from_xml(questionnaire_meta_xml)
-        topic = meta_info.get_section_title()  # TODO: implement creating topics
+    def _get_pending_questionnaire_files(self) -> List[str]:
+        """
+        Question pool files not uploaded by previous run.
+        """
+        return [
+            questionnaire_file
+            for questionnaire_file in self._get_questionnaire_files()
+            if not self._journal.is_done(Journal.QUESTIONNAIRE,
+                                         questionnaire_file)
+        ]
+
+    def _get_pool_media(self, questionnaire_file: str) -> List[str]:
+        """
+        Zip members referred to by questions of the question pool.
+        """
+        with self._zip_file.open(questionnaire_file) as meta_xml:
+            meta_info = QuestionnaireMetaInfoParser.from_xml(meta_xml)
+
+        names = []
+        for xml_file in meta_info.get_file_names():
+            xml = self._zip_file.read('testitems/' + xml_file)
+            names.extend(self._get_raw_media(xml.decode('utf-8', 'replace')))
+
+        return names
+
+    def check_media(self, questionnaire_files: List[str]=None
+                    ) -> MediaReport:
+        """
+        Make sure all media files of the questions are in the zip before
+        anything is sent to Trunity. Raise PreflightError otherwise.
+
+        Question xml is only searched for media here, it's parsed
+        by the import.
+
+        :param questionnaire_files: all question pools if None.
+        """
+        all_files = self._get_questionnaire_files()
+        if questionnaire_files is None:
+            questionnaire_files = all_files
+
+        # pools that aren't imported now are read for the unused files only:
+        media = {questionnaire_file: self._get_pool_media(questionnaire_file)
+                 for questionnaire_file in all_files}
+        report = check_media(
+            self._zip_file,
+            (name for questionnaire_file in questionnaire_files
+             for name in media[questionnaire_file]),
+            package_references=(name for names in media.values()
+                                for name in names),
+        )
+        report.print()
+        report.check()
+        return report
 
-        if topic not in self._topics:
-            print("Creating new topic: {}".format(topic), end='')
-            self._cur_topic_id = self._topic_client.list.post(self._book_id, topic, topic_id)
-            self._topics[topic] = self._cur_topic_id
-            print('\t\t Done!')
+    def _read_questions(self, meta_info: QuestionnaireMetaInfoParser
+                        ) -> List[Question]:
+        questions = []
 
         # xml files with questions for questionnaire:
-        question_xml_files = meta_info.get_file_names()
+        for xml_file in meta_info.get_file_names():
+            name = 'testitems/' + xml_file
 
-        for xml_file in question_xml_files:  # TODO: extract it
-            xml = self._zip_file.open('testitems/' + xml_file)
-            question = Question.from_xml(xml)
-            question._soup = self.handle_flash_audio(question._soup)
-            question._soup = self._upload_images(question._soup)
+            with self._zip_file.open(name) as xml, metrics.timer(
+                    'parse', size=self._zip_file.getinfo(name).file_size):
+                questions.append(Question.from_xml(xml))
 
-            if question.type == QuestionType.MULTIPLE_CHOICE:
+        return questions
 
-                questionnaire.add_multiple_choice(
-                    text=question.parser.get_text(),
-                    answers=question.parser.get_answers(),
-                )
+    @staticmethod
+    def _add_question(questionnaire: Questionnaire, question: Question):
+        if question.type == QuestionType.MULTIPLE_CHOICE:
 
-            elif question.type == QuestionType.MULTIPLE_ANSWER:
+            questionnaire.add_multiple_choice(
+                text=question.parser.get_text(),
+                answers=question.parser.get_answers(),
+            )
 
-                questionnaire.add_multiple_answer(
-                    text=question.parser.get_text(),
-                    answers=question.parser.get_answers(),
-                )
+        elif question.type == QuestionType.MULTIPLE_ANSWER:
+
+            questionnaire.add_multiple_answer(
+                text=question.parser.get_text(),
+                answers=question.parser.get_answers(),
+            )
+
+        elif question.type == QuestionType.ESSAY:
 
-            elif question.type == QuestionType.ESSAY:
+            questionnaire.add_essay(
+                text=question.parser.get_text(),
+                correct_answer=question.parser.get_correct_answer(),
+                score=1,
+            )
 
-                questionnaire.add_essay(
-                    text=question.parser.get_text(),
-                    correct_answer=question.parser.get_correct_answer(),
-                    score=1,
+
+class Importer(BaseImporter):
+    """
+    Import question pools from QTI XML file to Trunity.
+    """
+
+    def __init__(self, username: str, password: str, book_id: int,
+                 path_to_zip: str, workers: int=4,
+                 upload_cache_path: str=None,
+                 journal_path: str=None, resume: bool=False,
+                 pool_size: int=DEFAULT_POOL_SIZE,
+                 prefetch_bytes: int=DEFAULT_PREFETCH_BYTES,
+                 preflight: bool=True, dry_run: bool=False):
+        """
+        :param workers: number of parallel media uploads, shared by
+            all question pools imported at the same time.
+        :param pool_size: number of kept-alive connections to Trunity.
+            It's never less than `workers` or `parallel` of perform_import.
+        :param prefetch_bytes: memory for media files read ahead of their
+            upload. 0 means media are read only when they are uploaded.
+        :param dry_run: do everything but send requests to Trunity,
+            they are only counted (see `get_plan`).
+        """
+        super(Importer, self).__init__(
+            book_id, path_to_zip, journal_path=journal_path, resume=resume,
+            preflight=preflight, dry_run=dry_run)
+        if dry_run:
+            self._session_manager = RecordingSessionManager()
+        else:
+            self._session_manager = SessionManager.for_creds(
+                username, password, pool_size=max(pool_size, workers))
+        self.t3_session = self._session_manager.session()
+        self._workers = workers
+        self._parallel = 1
+
+        self._topics_lock = threading.Lock()
+
+        self._topic_client = TopicsClient(self.t3_session)
+        self._files_client = StreamingFilesClient(self.t3_session)
+        if dry_run:
+            # media are never read, the upload cache is left alone:
+            self._uploader = DryRunUploader(
+                self._files_client, self._zip_file, journal=self._journal)
+        else:
+            self._uploader = MediaUploader(
+                self._files_client, self._zip_file, workers=workers,
+                cache=UploadCache(upload_cache_path),
+                journal=self._journal,
+                prefetcher=MediaPrefetcher(
+                    self._zip_file, max_bytes=prefetch_bytes,
+                ) if prefetch_bytes else None,
+            )
+
+        # we need json content type for uploading questionnaires:
+        self.t3_json_session = self._session_manager.session(
+            'application/json')
+
+    def get_plan(self) -> DryRunPlan:
+        """
+        Requests sent by `perform_import` in dry run.
+        """
+        return DryRunPlan(self._session_manager.recorder,
+                          media_workers=self._workers,
+                          parallel=self._parallel)
+
+    def _handle_media(self, soup: BeautifulSoup) -> BeautifulSoup:
+        """
+        Upload media files of the question and replace them with CDN urls.
+        """
+        cdn_file_urls = self._uploader.upload_many(self._get_media(soup))
+
+        with metrics.timer('html_rewrite'):
+            return self._apply_media(soup, cdn_file_urls)
+
+    def _get_or_create_topic(self, topic: str, parent_topic_id: int) -> int:
+        """
+        Return id of the topic with `topic` title. Create it if it doesn't
+        exist yet. Safe to call from several threads.
+        """
+        with self._topics_lock:
+            if topic not in self._topics:
+                self._topics[topic] = self._journal.get_or_create(
+                    Journal.TOPIC, topic,
+                    lambda: self._create_topic(topic, parent_topic_id),
                 )
 
-            xml.close()
+            return self._topics[topic]
 
-        questionnaire_id = create_qst_pool(
-            self.t3_session, self._book_id,
-            content_title=meta_info.get_questionnaire_title(),
-            topic_id=self._cur_topic_id,
+    def _create_topic(self, topic: str, parent_topic_id: int) -> int:
+        print("Creating new topic: {}".format(topic), end='')
+        topic_id = self._topic_client.list.post(
+            self._book_id, topic, parent_topic_id)
+        print('\t\t Done!')
+
+        return topic_id
+
+    def _import_question_pool(self, questionnaire_meta_xml: str, topic_id: int,
+                              key: str):
+        """
+        :param key: unique key of the question pool for the journal.
+        """
+        questionnaire = JournaledQuestionnaire(
+            self.t3_json_session, self._journal, key=key)
+
+        meta_info = QuestionnaireMetaInfoParser.from_xml(questionnaire_meta_xml)
+        topic = meta_info.get_section_title()
+        section_topic_id = self._get_or_create_topic(topic, topic_id)
+
+        questions = self._read_questions(meta_info)
+        # media of the whole pool are read ahead of their upload:
+        self._uploader.prefetch(
+            name for question in questions
+            for name in self._get_media(question._soup)
+        )
+
+        for question in questions:
+            question._soup = self._handle_media(question._soup)
+            self._add_question(questionnaire, question)
+
+        title = meta_info.get_questionnaire_title()
+        # question pool may be created by previous run:
+        questionnaire_id = self._journal.get_or_create(
+            Journal.POOL, key,
+            lambda: create_qst_pool(
+                self.t3_session, self._book_id,
+                content_title=title,
+                topic_id=section_topic_id,
+            )
         )
         questionnaire.upload(questionnaire_id)
 
-    def perform_import(self, topic_id=None):
+        return title
 
-        questionnaire_files = ManifestParser.from_xml(
-            self._zip_file.open('imsmanifest.xml')
-        ).get_questionnaire_files()
+    def _import_questionnaire_file(self, questionnaire_file: str,
+                                   topic_id: int) -> str:
+        with self._zip_file.open(questionnaire_file) as questionnaire_meta_xml:
+            return self._import_question_pool(
+                questionnaire_meta_xml, topic_id, key=questionnaire_file)
 
-        for questionnaire_file in questionnaire_files:
-            questionnaire_meta_xml = self._zip_file.open(questionnaire_file)
-            self._import_question_pool(questionnaire_meta_xml, topic_id)
-            questionnaire_meta_xml.close()
+    def perform_import(self, topic_id=None, parallel: int=1):
+        """
+        :param topic_id: topic to import into. Root of the book if None.
+        :param parallel: number of question pools imported at the same time.
+        """
+        # question pools uploaded by previous run are not parsed again:
+        questionnaire_files = self._get_pending_questionnaire_files()
+
+        if self._preflight:
+            self.check_media(questionnaire_files)
+
+        self._parallel = parallel
+        self._session_manager.ensure_pool_size(parallel)
+
+        total = len(questionnaire_files)
+
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            futures = {
+                executor.submit(
+                    self._import_questionnaire_file,
+                    questionnaire_file,
+                    topic_id,
+                ): questionnaire_file
+                for questionnaire_file in questionnaire_files
+            }
+
+            for num, future in enumerate(as_completed(futures), start=1):
+                title = future.result()
+                print("[{}/{}] Question pool imported: {} ({})".format(
+                    num, total, title, futures[future]))
 
@@ -148,12 +148,19 @@ class Question(object):
     Main parser class for xml questions.
     """
 
+    # tags that define question type:
+    _INTERACTION_TAGS = frozenset([
+        'extendedTextInteraction',
+        'simpleChoice',
+        'textEntryInteraction',
+    ])
+
     def __init__(self, soup: BeautifulSoup):
         self._soup = soup
-        self._question_type = self._get_question_type()
-
         self._parser = None
 
+        self._question_type = self._get_question_type()
+
     @classmethod
     def from_xml(cls, xml: str):
         soup = BeautifulSoup(xml, "xml")
@@ -165,57 +172,43 @@ class Question(object):
 
     @property
     def parser(self):
-        if not self._parser:
-            return self._get_question_parser_instance()
-
-        else:
-            return self._parser
-
-    def __check_essay_type(self) -> bool:
-        is_essay = False
-
-        if self._soup.find("extendedTextInteraction"):
-            is_essay = True
-
-        return is_essay
+        if self._parser is None:
+            self._parser = self._get_question_parser_instance()
 
-    def __check_multiple_choice_type(self) -> bool:
-        is_multiple_choice = False
+        return self._parser
 
-        if self._soup.find("simpleChoice") and \
-                self._soup.responseDeclaration['cardinality'] == 'single':
-            is_multiple_choice = True
-
-        return is_multiple_choice
-
-    def __check_multiple_answer_type(self) -> bool:
-        is_multiple_answer = False
-
-        if self._soup.find("simpleChoice") and \
-                self._soup.responseDeclaration['cardinality'] == 'multiple':
-            is_multiple_answer = True
+    def _find_interactions(self) -> set:
+        """
+        Names of interaction tags found in the question.
+        The tree is walked only once.
+        """
+        found = set()
 
-        return is_multiple_answer
+        for element in self._soup.descendants:
+            if element.name in self._INTERACTION_TAGS:
+                found.add(element.name)
 
-    def __check_short_answer(self) -> bool:
-        is_short_answer = False
+                # essay has the highest priority, no need to look further:
+                if element.name == 'extendedTextInteraction':
+                    break
 
-        if self._soup.find("textEntryInteraction"):
-            is_short_answer = True
-        return is_short_answer
+        return found
 
     def _get_question_type(self) -> str:
+        interactions = self._find_interactions()
 
-        if self.__check_essay_type():
+        if 'extendedTextInteraction' in interactions:
             return QuestionType.ESSAY
 
-        elif self.__check_multiple_choice_type():
+        elif 'simpleChoice' in interactions and \
+                self._soup.responseDeclaration['cardinality'] == 'single':
             return QuestionType.MULTIPLE_CHOICE
 
-        elif self.__check_multiple_answer_type():
+        elif 'simpleChoice' in interactions and \
+                self._soup.responseDeclaration['cardinality'] == 'multiple':
             return QuestionType.MULTIPLE_ANSWER
 
-        elif self.__check_short_answer():
+        elif 'textEntryInteraction' in interactions:
             return QuestionType.SHORT_ANSWER
 
         else:
@@ -0,0 +1,126 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from unittest import TestCase, mock
+
+from trunity_3_client.utils.url import API_ROOT
+
+from benchmarks.generators import make_qti_package
+from trunity_importer.fake_server import FakeTrunity, serve_in_thread
+from trunity_importer.journal import Journal
+from trunity_importer.qti import Importer
+from trunity_importer.qti.parsers import Question
+from trunity_importer.qti.tests.test_parser import DATA_DIR
+from trunity_importer.utils import set_api_root
+
+POOLS = 8
+
+
+class ImporterTestCase(TestCase):
+
+    def setUp(self):
+        self.app = FakeTrunity()
+        self.server, api_root = serve_in_thread(self.app)
+        set_api_root(api_root)
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.zip_path = make_qti_package(
+            os.path.join(self.tmp_dir, 'qti.zip'), pools=POOLS,
+            items_per_pool=2, images_per_item=2, audio_ratio=0,
+            pools_per_section=4,
+        )
+
+    def tearDown(self):
+        set_api_root(API_ROOT)
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def get_importer(self, **kwargs) -> Importer:
+        # sessions are shared by creds, tokens of other servers are no good:
+        return Importer(self.id(), 'password', book_id=1,
+                        path_to_zip=self.zip_path, **kwargs)
+
+    def test_parallel_import(self):
+        importer = self.get_importer()
+        importer.perform_import(parallel=4)
+
+        requests = self.app.stats.to_dict()['requests']
+        # pools of the same section don't create its topic twice:
+        self.assertEqual(requests['topics'], 2)
+        self.assertEqual(requests['contents'], POOLS)
+        self.assertEqual(requests['questions'], POOLS * 2)
+        self.assertEqual(requests['remote_files'], POOLS * 2 * 2)
+
+        self.assertEqual(len(set(importer._topics.values())), 2)
+        for pool_num in range(POOLS):
+            self.assertTrue(importer._journal.is_done(
+                Journal.QUESTIONNAIRE,
+                'testitems/POOL_{:04}.xml'.format(pool_num)))
+
+    def test_media_uploads_are_parallel(self):
+        self.app.latency = 0.05
+        importer = self.get_importer(workers=4)
+
+        lock = threading.Lock()
+        uploads = {'running': 0, 'max_running': 0}
+        post = importer._files_client.list.post
+
+        def counting_post(*args, **kwargs):
+            with lock:
+                uploads['running'] += 1
+                uploads['max_running'] = max(uploads['max_running'],
+                                             uploads['running'])
+            try:
+                return post(*args, **kwargs)
+            finally:
+                with lock:
+                    uploads['running'] -= 1
+
+        importer._files_client.list.post = counting_post
+        importer.perform_import(parallel=2)
+
+        # media of the pools being imported are uploaded at the same time:
+        self.assertGreater(uploads['max_running'], 2)
+
+    def test_resume(self):
+        journal_path = os.path.join(self.tmp_dir, 'journal.jsonl')
+        self.get_importer(journal_path=journal_path).perform_import(parallel=4)
+        self.app.stats.reset()
+
+        importer = self.get_importer(journal_path=journal_path, resume=True)
+        importer.perform_import(parallel=4)
+        importer._journal.close()
+
+        # everything is imported already (and the session is logged in):
+        self.assertEqual(self.app.stats.to_dict()['total_requests'], 0)
+
+        # finished pools are neither parsed nor recorded again:
+        with open(journal_path) as file_obj:
+            kinds = [json.loads(line)['kind'] for line in file_obj]
+        self.assertEqual(kinds.count(Journal.QUESTIONNAIRE), POOLS)
+
+    def test_media_are_found_without_parsing(self):
+        with open(os.path.join(DATA_DIR,
+                               'question_with_flash_object.xml')) as fo:
+            xml = fo.read()
+
+        self.assertListEqual(
+            Importer._get_raw_media(xml),
+            Importer._get_media(Question.from_xml(xml)._soup),
+        )
+
+    def test_preflight_of_some_pools(self):
+        importer = self.get_importer()
+        questionnaire_files = importer._get_questionnaire_files()
+
+        # media are found in raw xml, questions aren't parsed:
+        with mock.patch.object(importer, '_read_questions',
+                               side_effect=AssertionError):
+            report = importer.check_media(questionnaire_files[:1])
+
+        self.assertEqual(len(report.references), 2 * 2)
+        # media of the other pools are used, though not imported now:
+        self.assertListEqual(report.unused, [])
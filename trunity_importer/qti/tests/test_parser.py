@@ -373,3 +373,12 @@ class QuestionTestCase(TestCase):
             isinstance(question.parser, ShortAnswerParser),
             "Must be ShortAnswerParser instance!"
         )
+
+    def test_parser_is_memoized(self):
+        question = Question.from_xml(self.multiple_choice_xml)
+
+        self.assertIs(
+            question.parser,
+            question.parser,
+            "Parser must be created only once!"
+        )
@@ -2,4 +2,5 @@
 For Science Dimensions Assessments
 """
 from trunity_importer.sda.importer import Importer
+from trunity_importer.sda.async_importer import AsyncImporter
 from trunity_importer.sda.question_containers import QuestionType
\ No newline at end of file
@@ -0,0 +1,144 @@
+import asyncio
+from typing import Union
+
+from trunity_importer.async_client import (
+    AsyncClient,
+    AsyncMediaUploader,
+    AsyncQuestionnaire,
+)
+from trunity_importer.journal import Journal
+from trunity_importer.sda.importer import BaseImporter
+from trunity_importer.sda.question_containers import Question
+from trunity_importer.sda.question_handler import QuestionHandler
+from trunity_importer.topic_mapping import TopicMapping
+from trunity_importer.upload_cache import UploadCache
+from trunity_importer.sda.validators.post_validators import validate
+from trunity_importer.sda.warnings import warnings
+
+
+class AsyncImporter(BaseImporter):
+    """
+    Import Science Dimensions Assessments to Trunity on asyncio.
+
+    Media files of all questions are uploaded concurrently through one
+    connection pool, question pools are created concurrently as well.
+    Questions of every pool are created one by one to keep their order.
+    """
+
+    def __init__(self, username: str, password: str, book_id: int,
+                 path_to_zip: str, streaming: bool=False,
+                 concurrency: int=100, upload_cache_path: str=None,
+                 journal_path: str=None, resume: bool=False,
+                 parse_processes: int=1, preflight: bool=True):
+        """
+        :param concurrency: max number of open connections to Trunity.
+        """
+        super(AsyncImporter, self).__init__(
+            book_id, path_to_zip, streaming=streaming,
+            journal_path=journal_path, resume=resume,
+            parse_processes=parse_processes, preflight=preflight,
+        )
+        self._username = username
+        self._password = password
+        self._concurrency = concurrency
+        self._upload_cache_path = upload_cache_path
+
+        # media are uploaded by AsyncMediaUploader, the handler
+        # only finds and replaces them:
+        self._question_handler = QuestionHandler(
+            files_client=None, zip_file=self._zip_file)
+
+    async def _handle(self, uploader: AsyncMediaUploader,
+                      question: Question) -> Question:
+        plan = self._question_handler.plan_media(question)
+        cdn_file_urls = await uploader.upload_many(plan.media)
+        return self._question_handler.apply_media(plan, cdn_file_urls)
+
+    async def _upload_questionnaire(self, client: AsyncClient, test_id: str,
+                                    questionnaire: AsyncQuestionnaire,
+                                    topic_id: Union[None, int]):
+        title = self._get_title(test_id)
+
+        # question pool may be created by previous run:
+        questionnaire_id = self._journal.get(Journal.POOL, test_id)
+        if questionnaire_id is None:
+            questionnaire_id = await client.create_qst_pool(
+                self._book_id, title, topic_id)
+            self._journal.add(Journal.POOL, test_id, questionnaire_id)
+
+        await questionnaire.upload_async(client, questionnaire_id)
+        print("Question pool uploaded: {} ({} questions)".format(
+            title, len(questionnaire)))
+
+    async def perform_import_async(self, grade: Union[None, str]=None,
+                                   topic_mapping: TopicMapping=None):
+        test_ids = self._get_test_ids(grade)
+
+        if self._preflight:
+            self.check_media(test_ids)
+
+        async with AsyncClient(self._username, self._password,
+                               limit=self._concurrency) as client:
+            uploader = AsyncMediaUploader(
+                client, self._zip_file,
+                cache=UploadCache(self._upload_cache_path),
+                journal=self._journal,
+            )
+
+            loop = asyncio.get_running_loop()
+            tests = self._parser.get_tests(test_ids)
+
+            tasks = {}  # key: test_id, value: list of tasks
+            while True:
+                # the export is parsed out of the event loop, media of
+                # parsed tests are uploaded meanwhile:
+                test = await loop.run_in_executor(None, next, tests, None)
+                if test is None:
+                    break
+
+                # questions of every test come in item_position order:
+                test_id, questions = test
+                for question in questions:
+                    if validate(question):
+                        tasks.setdefault(test_id, []).append(
+                            asyncio.ensure_future(
+                                self._handle(uploader, question)))
+
+            print("Uploading media for {} questions...".format(
+                sum(len(test_tasks) for test_tasks in tasks.values())), end='')
+            await asyncio.gather(*(
+                task for test_tasks in tasks.values() for task in test_tasks))
+            print("\t\t Success!")
+
+            questionnaires = {}  # key: test_id, value: AsyncQuestionnaire
+            for test_id, test_tasks in tasks.items():
+                questionnaires[test_id] = AsyncQuestionnaire(
+                    self._journal, key=test_id)
+
+                for task in test_tasks:
+                    self._add_question(questionnaires[test_id], task.result())
+
+            # topics are chosen before uploading, input() would block it:
+            topic_ids = {
+                test_id: self._get_topic_id(
+                    test_id, self._get_title(test_id), topic_mapping)
+                for test_id in questionnaires
+                if not self._journal.is_done(Journal.POOL, test_id)
+            }
+
+            await asyncio.gather(*(
+                self._upload_questionnaire(
+                    client, test_id, questionnaire, topic_ids.get(test_id))
+                for test_id, questionnaire in questionnaires.items()
+            ))
+
+        warnings.print()
+
+    def perform_import(self, grade: Union[None, str]=None,
+                       topic_mapping: TopicMapping=None):
+        """
+        :param grade: import only questions of this grade. All if None.
+        :param topic_mapping: topics for question pools. When it's None,
+            the user is asked for topic id of every question pool.
+        """
+        asyncio.run(self.perform_import_async(grade, topic_mapping))
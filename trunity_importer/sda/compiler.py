@@ -0,0 +1,64 @@
+from typing import Union
+
+from trunity_importer.compiled import ArtifactWriter, QuestionCollector
+from trunity_importer.sda.importer import BaseImporter
+from trunity_importer.sda.question_handler import QuestionHandler
+from trunity_importer.sda.validators.post_validators import validate
+from trunity_importer.sda.warnings import warnings
+
+
+class Compiler(BaseImporter):
+    """
+    Compile Science Dimensions Assessments to an artifact
+    (see trunity_importer.compiled) that is pushed to Trunity later.
+    """
+
+    def __init__(self, path_to_zip: str, streaming: bool=False,
+                 parse_processes: int=1, preflight: bool=True):
+        super(Compiler, self).__init__(
+            None, path_to_zip, streaming=streaming,
+            parse_processes=parse_processes, preflight=preflight,
+        )
+        # media are only planned here, never uploaded:
+        self._question_handler = QuestionHandler(
+            files_client=None, zip_file=self._zip_file)
+
+    def compile(self, output_path: str,
+                grade: Union[None, str]=None) -> ArtifactWriter:
+        """
+        :param output_path: JSON lines file, gzipped if it ends with .gz.
+        :param grade: compile only questions of this grade. All if None.
+        """
+        test_ids = self._get_test_ids(grade)
+
+        if self._preflight:
+            self.check_media(test_ids)
+
+        with ArtifactWriter(output_path, 'sda', self._zip_file) as writer:
+            for test_id, questions in self._parser.get_tests(test_ids):
+                collector = QuestionCollector()
+
+                for question in questions:
+                    if not validate(question):
+                        continue
+
+                    plan = self._question_handler.plan_media(question)
+                    placeholders = {name: writer.add_media(name)
+                                    for name in plan.media}
+                    self._add_question(
+                        collector,
+                        self._question_handler.apply_media(plan, placeholders),
+                    )
+
+                if collector:
+                    writer.write_pool(
+                        key=test_id,
+                        title=self._get_title(test_id),
+                        questions=collector.questions,
+                        # topic mapping needs the raw title:
+                        test_id=test_id,
+                        test_title=self._parser.questionnaire_titles[test_id],
+                    )
+
+        warnings.print()
+        return writer
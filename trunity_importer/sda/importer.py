@@ -1,50 +1,71 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from zipfile import ZipFile
-from typing import Union
+from typing import List, Set, Union
 
-from trunity_3_client.clients.auth import initialize_session_from_creds
-from trunity_3_client.clients.endpoints import (
-    TopicsClient,
-    FilesClient,
-)
+from trunity_3_client.clients.endpoints import TopicsClient
 from trunity_3_client.builders import Questionnaire
 
 
-from trunity_importer.sda.parser import Parser
-from trunity_importer.sda.question_containers import QuestionType
+from trunity_importer.dry_run import (
+    DryRunPlan,
+    DryRunUploader,
+    RecordingSessionManager,
+)
+from trunity_importer.journal import Journal, JournaledQuestionnaire
+from trunity_importer.media import MediaUploader
+from trunity_importer.multipart import StreamingFilesClient
+from trunity_importer.preflight import MediaReport, check_media
+from trunity_importer.prefetch import DEFAULT_PREFETCH_BYTES, MediaPrefetcher
+from trunity_importer.sda.parser import Parser, StreamingParser
+from trunity_importer.sda.question_containers import Question, QuestionType
 from trunity_importer.sda.question_handler import QuestionHandler
+from trunity_importer.session import SessionManager, DEFAULT_POOL_SIZE
+from trunity_importer.topic_mapping import TopicMapping
+from trunity_importer.upload_cache import UploadCache
 from trunity_importer.utils import create_qst_pool
 from trunity_importer.sda.validators.post_validators import validate
 from trunity_importer.sda.warnings import warnings
 
 
-class Importer(object):
+class BaseImporter(object):
     """
-    Import Science Dimensions Assessments to Trunity.
+    Parts of SDA import that don't depend on the transport:
+    reading the export, topics of question pools, progress journal.
     """
 
-    def __init__(self, username: str, password: str, book_id: int,
-                 path_to_zip: str):
+    def __init__(self, book_id: int, path_to_zip: str, streaming: bool=False,
+                 journal_path: str=None, resume: bool=False,
+                 parse_processes: int=1, preflight: bool=True,
+                 dry_run: bool=False):
+        """
+        :param parse_processes: number of processes that parse items.
+            More than 1 means streaming parse.
+        :param preflight: check media files of all questions before
+            the import (see `check_media`).
+        :param dry_run: the journal is read, but never written.
+        """
 
         self._book_id = book_id
         self._zip_file = ZipFile(path_to_zip)
-        self.t3_session = initialize_session_from_creds(username, password)
+        self._journal = Journal(journal_path, resume=resume,
+                                read_only=dry_run)
+        self._preflight = preflight
 
-        self._topic_client = TopicsClient(self.t3_session)
-
-        # we need json content type for uploading questionnaires:
-        self.t3_json_session = initialize_session_from_creds(
-            username, password, content_type='application/json')
+        xml_file_name = self._get_xml_file_name()
 
-        self._question_handler = QuestionHandler(
-            files_client=FilesClient(self.t3_session),
-            zip_file=self._zip_file
-        )
+        if streaming or parse_processes > 1:
+            # items are read straight from the zip, one by one:
+            self._parser = StreamingParser(
+                lambda: self._zip_file.open(xml_file_name),
+                processes=parse_processes,
+            )
 
-        xml_file_name = self._get_xml_file_name()
-        with self._zip_file.open(xml_file_name) as file_obj:
-            xml = file_obj.read()
+        else:
+            with self._zip_file.open(xml_file_name) as file_obj:
+                xml = file_obj.read()
 
-        self._parser = Parser(xml)
+            self._parser = Parser(xml)
 
     @property
     def grades_available(self):
@@ -58,82 +79,261 @@ class Importer(object):
             if file_name.startswith('XML_Export') and file_name.endswith('.xml'):
                 return file_name
 
-    def perform_import(self, grade: Union[None, str]=None):
-        questionnaires = {}  # key: test_id, value: Questionnaire inst
+    def _get_topic_id(self, test_id: str, title: str,
+                      topic_mapping: Union[TopicMapping, None]):
+        """
+        Topic id the question pool should be attached to.
+        None means the root topic.
+        """
+        if topic_mapping is not None:
+            topic_id = topic_mapping.get_topic_id(
+                test_id, self._parser.questionnaire_titles[test_id])
+            print("\nQP \"{}\" goes to topic: {}".format(
+                title, topic_id or "root"))
+
+        else:
+            topic_id = input(
+                "\nEnter the topic id you want the QP be attached to. "
+                "Leave blank for the root topic\n"
+                "The title of QP: {}\n".format(title)
+            ).strip()
+            topic_id = topic_id if topic_id != "" else None
 
+        return topic_id
+
+    def _get_test_ids(self, grade: Union[None, str]) -> Union[None, Set[str]]:
+        """
+        Test ids of question pools to import. None means all of them.
+        """
+        # items of other grades are skipped by the parser:
+        test_ids = None
         if grade:
             self._parser.grades.validate_grade(grade)
+            test_ids = self._parser.grades.get_test_ids(grade)
+
+        # question pools uploaded by previous run are skipped as well:
+        uploaded_test_ids = {
+            test_id for test_id in self._parser.questionnaire_titles
+            if self._journal.is_done(Journal.QUESTIONNAIRE, test_id)
+        }
+        if uploaded_test_ids:
+            if test_ids is None:
+                test_ids = set(self._parser.questionnaire_titles)
+            test_ids = test_ids - uploaded_test_ids
+
+        return test_ids
+
+    def check_media(self, test_ids: Union[None, Set[str]]=None
+                    ) -> MediaReport:
+        """
+        Make sure all media files of the questions are in the zip before
+        anything is sent to Trunity. Raise PreflightError otherwise.
 
-        def get_or_create_questionnaire(test_id: str) -> Union[Questionnaire, None]:
-            if test_id in questionnaires:
-                return questionnaires[test_id]
-
-            else:
-                if grade:
-                    if self._parser.grades.test_ids[test_id] == grade:
-                        questionnaire = Questionnaire(self.t3_json_session)
-                        questionnaires[test_id] = questionnaire
-                        return questionnaire
-
-                else:
-                    questionnaire = Questionnaire(self.t3_json_session)
-                    questionnaires[test_id] = questionnaire
-                    return questionnaire
-
-        for question in self._parser.get_questions():
-            # checking if question is correct:
-            is_valid = validate(question)
-
-            if is_valid:
-                # handle question (upload media files etc..):
-                question = self._question_handler.handle(question)
-
-                test_id = question.test_id
-
-                questionnaire = get_or_create_questionnaire(test_id)
-
-                if questionnaire:
-                    if question.type == QuestionType.MULTIPLE_CHOICE:
-                        questionnaire.add_multiple_choice(
-                            question.text,
-                            question.answers,
-                        )
-
-                    elif question.type == QuestionType.ESSAY:
-                        questionnaire.add_essay(
-                            text=question.text,
-                            correct_answer=question.correct_answer,
-                            score=1,
-                        )
-
-                    elif question.type == QuestionType.MULTIPLE_ANSWER:
-                        questionnaire.add_multiple_answer(
-                            text=question.text,
-                            answers=question.answers,
-                        )
+        Media are taken from the index of the export (see ExportIndex),
+        so the export isn't parsed once more. Items that fail validation
+        are checked as well.
+        """
+        index = self._parser.index
+        report = check_media(self._zip_file, index.get_media(test_ids),
+                             package_references=index.get_media())
+        report.print()
+        report.check()
+        return report
+
+    def _get_title(self, test_id: str) -> str:
+        title = self._parser.get_questionnaire_title(test_id)
+        return title if title != "" else "NO TITLE!"
+
+    @staticmethod
+    def _add_question(questionnaire: Questionnaire, question: Question):
+        if question.type == QuestionType.MULTIPLE_CHOICE:
+            questionnaire.add_multiple_choice(
+                question.text,
+                question.answers,
+            )
 
-        # uploading questionnaires:
-        for test_id, questionnaire in questionnaires.items():
+        elif question.type == QuestionType.ESSAY:
+            questionnaire.add_essay(
+                text=question.text,
+                correct_answer=question.correct_answer,
+                score=1,
+            )
 
-            title = self._parser.get_questionnaire_title(test_id)
+        elif question.type == QuestionType.MULTIPLE_ANSWER:
+            questionnaire.add_multiple_answer(
+                text=question.text,
+                answers=question.answers,
+            )
 
-            if title == "":
-                title = "NO TITLE!"
 
-            topic_id = input(
-                "\nEnter the topic id you want the QP be attached to. "
-                "Leave blank for the root topic\n"
-                "The title of QP: {}\n".format(title)
-            ).strip()
-            topic_id = topic_id if topic_id != "" else None
+class Importer(BaseImporter):
+    """
+    Import Science Dimensions Assessments to Trunity.
+    """
+
+    def __init__(self, username: str, password: str, book_id: int,
+                 path_to_zip: str, streaming: bool=False, workers: int=1,
+                 upload_cache_path: str=None, journal_path: str=None,
+                 resume: bool=False, pool_size: int=DEFAULT_POOL_SIZE,
+                 parse_processes: int=1, incremental: bool=False,
+                 prefetch_bytes: int=DEFAULT_PREFETCH_BYTES,
+                 preflight: bool=True, dry_run: bool=False):
+        """
+        :param pool_size: number of kept-alive connections to Trunity.
+            It's never less than `workers`.
+        :param prefetch_bytes: memory for media files read ahead of their
+            upload. 0 means media are read only when they are uploaded.
+        :param incremental: upload every question pool as soon as its
+            last item is parsed, instead of after the whole export.
+        :param dry_run: do everything but send requests to Trunity,
+            they are only counted (see `get_plan`).
+        """
+        super(Importer, self).__init__(
+            book_id, path_to_zip, streaming=streaming,
+            journal_path=journal_path, resume=resume,
+            parse_processes=parse_processes, preflight=preflight,
+            dry_run=dry_run,
+        )
+        if dry_run:
+            session_manager = RecordingSessionManager()
+        else:
+            session_manager = SessionManager.for_creds(
+                username, password, pool_size=max(pool_size, workers))
+        self._session_manager = session_manager
+        self.t3_session = session_manager.session()
+        self._incremental = incremental
+        self._workers = workers
 
-            questionnaire_id = create_qst_pool(
+        self._topic_client = TopicsClient(self.t3_session)
+
+        # we need json content type for uploading questionnaires:
+        self.t3_json_session = session_manager.session('application/json')
+
+        files_client = StreamingFilesClient(self.t3_session)
+        if dry_run:
+            # media are never read, the upload cache is left alone:
+            uploader = DryRunUploader(files_client, self._zip_file,
+                                      journal=self._journal)
+        else:
+            uploader = MediaUploader(
+                files_client, self._zip_file, workers=workers,
+                cache=UploadCache(upload_cache_path),
+                journal=self._journal,
+                prefetcher=MediaPrefetcher(
+                    self._zip_file, max_bytes=prefetch_bytes,
+                ) if prefetch_bytes else None,
+            )
+        self._question_handler = QuestionHandler(
+            files_client=files_client,
+            zip_file=self._zip_file,
+            uploader=uploader,
+        )
+
+    def get_plan(self) -> DryRunPlan:
+        """
+        Requests sent by `perform_import` in dry run.
+        """
+        return DryRunPlan(self._session_manager.recorder,
+                          media_workers=self._workers)
+
+    def _upload_questionnaire(self, test_id: str,
+                              questionnaire: Questionnaire,
+                              topic_id: Union[None, int]):
+        def create_pool():
+            return create_qst_pool(
                 session=self.t3_session,
                 site_id=self._book_id,
-                content_title=title,
+                content_title=self._get_title(test_id),
                 topic_id=topic_id,
             )
 
-            questionnaire.upload(questionnaire_id)
+        # question pool may be created by previous run:
+        questionnaire_id = self._journal.get_or_create(
+            Journal.POOL, test_id, create_pool)
+
+        questionnaire.upload(questionnaire_id)
+
+    def _get_pool_topic_id(self, test_id: str,
+                           topic_mapping: Union[TopicMapping, None]):
+        # nobody is asked about pools created by previous run:
+        if self._journal.is_done(Journal.POOL, test_id):
+            return None
+
+        return self._get_topic_id(
+            test_id, self._get_title(test_id), topic_mapping)
+
+    def _get_questionnaire(self, test_id: str, questions: List[Question]
+                           ) -> JournaledQuestionnaire:
+        questionnaire = JournaledQuestionnaire(
+            self.t3_json_session, self._journal, key=test_id)
+
+        # checking if question is correct:
+        valid_questions = [question for question in questions
+                           if validate(question)]
+
+        # handle questions (upload media files etc..):
+        for question in self._question_handler.handle_many(valid_questions):
+            self._add_question(questionnaire, question)
+
+        return questionnaire
+
+    def _perform_incremental_import(self, test_ids: Union[None, Set[str]],
+                                    topic_mapping: TopicMapping=None):
+        """
+        Every question pool is uploaded in background as soon as
+        its test is parsed, while the next tests are being parsed.
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            uploads = deque()
+
+            for test_id, questions in self._parser.get_tests(test_ids):
+                questionnaire = self._get_questionnaire(test_id, questions)
+                if not questionnaire:
+                    continue
+
+                # input() can't be called from the upload thread:
+                topic_id = self._get_pool_topic_id(test_id, topic_mapping)
+
+                uploads.append(executor.submit(
+                    self._upload_questionnaire,
+                    test_id, questionnaire, topic_id))
+
+                # only the pool being uploaded and the next one are kept:
+                while len(uploads) > 1:
+                    uploads.popleft().result()
+
+            while uploads:
+                uploads.popleft().result()
+
+    def perform_import(self, grade: Union[None, str]=None,
+                       topic_mapping: TopicMapping=None):
+        """
+        :param grade: import only questions of this grade. All if None.
+        :param topic_mapping: topics for question pools. When it's None,
+            the user is asked for topic id of every question pool.
+        """
+        test_ids = self._get_test_ids(grade)
+
+        if self._preflight:
+            self.check_media(test_ids)
+
+        if self._incremental:
+            self._perform_incremental_import(test_ids, topic_mapping)
+            warnings.print()
+            return
+
+        questionnaires = {}  # key: test_id, value: Questionnaire inst
+
+        # questions of every test come in item_position order:
+        for test_id, questions in self._parser.get_tests(test_ids):
+            questionnaire = self._get_questionnaire(test_id, questions)
+            if questionnaire:
+                questionnaires[test_id] = questionnaire
+
+        # uploading questionnaires:
+        for test_id, questionnaire in questionnaires.items():
+            self._upload_questionnaire(
+                test_id, questionnaire,
+                self._get_pool_topic_id(test_id, topic_mapping))
 
         warnings.print()
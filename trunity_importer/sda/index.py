@@ -0,0 +1,236 @@
+"""
+Index of tests (question pools) and their items in SDA XML export.
+
+It is built in one pass while the document is read, so titles, grades,
+ordering of items and media files they refer to never need another scan
+of the tree.
+"""
+import re
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Union
+
+from bs4 import BeautifulSoup, Tag
+from lxml import etree
+
+_GRADE_PATTERN = re.compile(r"^SCIDIM_NA18E_OLA_G0([A-Z,0-9]+)U.+")
+
+# test number of items that don't belong to any test:
+_NO_TEST = 0xFFFFFFFF
+
+
+def extract_grade(activity_reference: str) -> Union[str, None]:
+    """
+    Examples:
+    SCIDIM_NA18E_OLA_G0KU04L00_0019 -> K
+    SCIDIM_NA18E_OLA_G01U00L00_0033 -> 1
+    (should be the character between "SCIDIM_NA18E_OLA_G0" and "U")
+
+    :param activity_reference: activity_reference attribute value
+    :return: grade, for example, '1', '22', 'K' etc
+    """
+    match = re.match(_GRADE_PATTERN, activity_reference)
+
+    if match:
+        return match.groups()[0]
+
+
+def _to_int(value: Union[str, None]) -> int:
+    # broken items are reported by validators, not by the index:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+class IndexEntry(object):
+    """
+    One test of the export.
+    """
+    __slots__ = ('test_id', 'title', 'activity_reference', 'grade',
+                 'last_seq', 'media', '_items')
+
+    def __init__(self, test_id: str):
+        self.test_id = test_id
+        self.title = None
+        self.activity_reference = None
+        self.grade = None
+
+        # document order number of the last item of the test:
+        self.last_seq = None
+        # zip members items of the test refer to, with duplicates:
+        self.media = []
+        self._items = []  # (item_position, item_id)
+
+    @property
+    def item_count(self) -> int:
+        return len(self._items)
+
+    @property
+    def item_ids(self) -> List[int]:
+        """
+        Ids of items of the test in item_position order.
+        """
+        return [item_id for _, item_id in sorted(self._items)]
+
+
+class ExportIndex(object):
+    """
+    Table test_id -> IndexEntry of the export.
+
+    Every <item> gets sequence number in document order (the first one
+    is 0), the same order the parsers read items in.
+    """
+
+    def __init__(self):
+        self._entries = {}  # key: test_id, value: IndexEntry
+        self._test_ids = []  # test ids by test number
+        self._test_numbers = {}  # key: test_id, value: test number
+
+        # test number of every item, by sequence number:
+        self._item_tests = array('L')
+
+    def _get_or_create_entry(self, test_id: str) -> IndexEntry:
+        entry = self._entries.get(test_id)
+
+        if entry is None:
+            entry = self._entries[test_id] = IndexEntry(test_id)
+            self._test_numbers[test_id] = len(self._test_ids)
+            self._test_ids.append(test_id)
+
+        return entry
+
+    def add_test(self, test_id: str, title: str, activity_reference: str):
+        entry = self._get_or_create_entry(test_id)
+        entry.title = title
+        entry.activity_reference = activity_reference
+        entry.grade = extract_grade(activity_reference)
+
+    def add_item(self, test_id: Union[str, None], item_id: int,
+                 item_position: int, media: Iterable[str]=()):
+        """
+        Add next item of the document.
+
+        :param test_id: None for items that don't belong to any test.
+        :param media: zip members the item refers to.
+        """
+        seq = len(self._item_tests)
+
+        if test_id is None:
+            self._item_tests.append(_NO_TEST)
+            return
+
+        entry = self._get_or_create_entry(test_id)
+        entry._items.append((item_position, item_id))
+        entry.last_seq = seq
+        entry.media.extend(media)
+
+        self._item_tests.append(self._test_numbers[test_id])
+
+    @property
+    def items_count(self) -> int:
+        return len(self._item_tests)
+
+    def get_item_test_id(self, seq: int) -> Union[str, None]:
+        """
+        Test id of the item with `seq` sequence number.
+        """
+        test_number = self._item_tests[seq]
+        if test_number != _NO_TEST:
+            return self._test_ids[test_number]
+
+    def get_media(self, test_ids: Set[str]=None) -> Iterator[str]:
+        """
+        Zip members items of the tests refer to, with duplicates.
+
+        :param test_ids: all tests if None.
+        """
+        for entry in self:
+            if test_ids is None or entry.test_id in test_ids:
+                yield from entry.media
+
+    def __getitem__(self, test_id: str) -> IndexEntry:
+        return self._entries[test_id]
+
+    def __contains__(self, test_id: str) -> bool:
+        return test_id in self._entries
+
+    def __iter__(self) -> Iterator[IndexEntry]:
+        return iter(self._entries.values())
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def titles(self) -> Dict[str, str]:
+        """
+        Dict with test_id as keys, titles of <test> tags as values.
+        """
+        return {entry.test_id: entry.title for entry in self
+                if entry.title is not None}
+
+    @property
+    def activity_references(self) -> Dict[str, str]:
+        return {entry.test_id: entry.activity_reference for entry in self
+                if entry.activity_reference is not None}
+
+    @property
+    def grades(self) -> Dict[str, str]:
+        """
+        Dict with test_id as keys, grades as values.
+        Tests without grade are omitted.
+        """
+        return {entry.test_id: entry.grade for entry in self
+                if entry.grade is not None}
+
+    def add_test_tag(self, tag: Tag):
+        self.add_test(tag['test_id'], tag['test_name'].strip(),
+                      tag['activity_reference'].strip())
+
+    def add_item_tag(self, tag: Tag, media: Iterable[str]=()):
+        # only children are looked through, not the whole item:
+        test_info_tag = None
+        test_usage_tag = tag.find("test_usage", recursive=False)
+        if test_usage_tag is not None:
+            test_info_tag = test_usage_tag.find("test_info", recursive=False)
+
+        if test_info_tag is None:
+            self.add_item(None, _to_int(tag.get('id')), 0)
+        else:
+            self.add_item(test_info_tag.get('test_id'), _to_int(tag.get('id')),
+                          _to_int(test_info_tag.get('item_position')), media)
+
+    def add_test_element(self, element: etree._Element):
+        self.add_test(element.get('test_id'),
+                      element.get('test_name', '').strip(),
+                      element.get('activity_reference', '').strip())
+
+    def add_item_element(self, element: etree._Element,
+                         media: Iterable[str]=()):
+        test_info_element = element.find("test_usage/test_info")
+
+        if test_info_element is None:
+            self.add_item(None, _to_int(element.get('id')), 0)
+        else:
+            self.add_item(test_info_element.get('test_id'),
+                          _to_int(element.get('id')),
+                          _to_int(test_info_element.get('item_position')),
+                          media)
+
+    @classmethod
+    def from_soup(cls, soup: BeautifulSoup,
+                  get_media: Callable[[Tag], List[str]]=None
+                  ) -> 'ExportIndex':
+        """
+        :param get_media: returns zip members the <item> tag refers to.
+            Media are not indexed without it.
+        """
+        index = cls()
+
+        for tag in soup.find_all(["test", "item"]):
+            if tag.name == "test":
+                index.add_test_tag(tag)
+            else:
+                index.add_item_tag(
+                    tag, get_media(tag) if get_media is not None else ())
+
+        return index
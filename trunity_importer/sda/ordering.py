@@ -0,0 +1,128 @@
+"""
+Putting questions of every test in item_position order.
+"""
+import pickle
+import tempfile
+from typing import List, Tuple, Union
+
+from trunity_importer.sda.index import ExportIndex
+from trunity_importer.sda.question_containers import Question
+
+DEFAULT_MAX_BUFFERED = 10000
+
+
+class ReorderBuffer(object):
+    """
+    Collect questions of every test and give the test away, sorted by
+    item_position, as soon as its last item is read.
+
+    Index says which item (by document sequence number) is the last one
+    of every test, so only tests with items still to come are kept.
+    When more than `max_buffered` questions are waiting, questions of
+    the biggest tests are spilled to a temporary file, so exports with
+    tests spread all over the document don't have to fit in memory.
+    """
+
+    def __init__(self, index: ExportIndex,
+                 max_buffered: int=DEFAULT_MAX_BUFFERED, spill_dir: str=None):
+        self._index = index
+        self._max_buffered = max_buffered
+        self._spill_dir = spill_dir
+
+        self._buffers = {}  # key: test_id, value: list of questions
+        self._buffered = 0
+
+        self._spill_file = None
+        self._spilled = {}  # key: test_id, value: list of (offset, size)
+
+    @property
+    def buffered(self) -> int:
+        """
+        Number of questions kept in memory.
+        """
+        return self._buffered
+
+    @property
+    def spilled_tests(self) -> int:
+        return len(self._spilled)
+
+    def add(self, seq: int, question: Union[Question, None]
+            ) -> List[Tuple[str, List[Question]]]:
+        """
+        Add the item with `seq` sequence number. `question` is None for
+        items that weren't parsed (invalid, unsupported etc).
+
+        Return list of completed tests: (test_id, questions in order).
+        """
+        test_id = self._index.get_item_test_id(seq)
+
+        if test_id is None:
+            return []
+
+        if question is not None:
+            self._buffers.setdefault(test_id, []).append(question)
+            self._buffered += 1
+
+        if seq == self._index[test_id].last_seq:
+            return [(test_id, self._pop(test_id))]
+
+        if self._buffered > self._max_buffered:
+            self._spill()
+
+        return []
+
+    def flush(self) -> List[Tuple[str, List[Question]]]:
+        """
+        Give away all tests left (whose last items were never added).
+        """
+        test_ids = list(self._buffers) + [
+            test_id for test_id in self._spilled
+            if test_id not in self._buffers
+        ]
+        return [(test_id, self._pop(test_id)) for test_id in test_ids]
+
+    def close(self):
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def _pop(self, test_id: str) -> List[Question]:
+        questions = []
+
+        for offset, size in self._spilled.pop(test_id, []):
+            self._spill_file.seek(offset)
+            questions.extend(pickle.loads(self._spill_file.read(size)))
+
+        buffered = self._buffers.pop(test_id, [])
+        self._buffered -= len(buffered)
+        questions.extend(buffered)
+
+        # sort is stable: items with the same position keep document order
+        questions.sort(key=lambda question: question.item_position)
+        return questions
+
+    def _spill(self):
+        """
+        Move questions of the biggest tests to disk until the half
+        of `max_buffered` is left in memory.
+        """
+        if self._spill_file is None:
+            self._spill_file = tempfile.TemporaryFile(dir=self._spill_dir)
+
+        tests = sorted(self._buffers,
+                       key=lambda test_id: len(self._buffers[test_id]),
+                       reverse=True)
+
+        for test_id in tests:
+            if self._buffered <= self._max_buffered // 2:
+                break
+
+            questions = self._buffers.pop(test_id)
+            data = pickle.dumps(questions, pickle.HIGHEST_PROTOCOL)
+
+            self._spill_file.seek(0, 2)
+            self._spilled.setdefault(test_id, []).append(
+                (self._spill_file.tell(), len(data)))
+            self._spill_file.write(data)
+
+            self._buffered -= len(questions)
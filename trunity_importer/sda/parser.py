@@ -1,20 +1,47 @@
-import re
 import json
-from typing import Union, List
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Union, List, Callable, Iterator, IO, Set, Tuple
 
 from bs4 import BeautifulSoup, Tag
+from lxml import etree
 
-from trunity_3_client.builders import Answer
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
 
+from trunity_importer.html_rewriter import has_images, iter_images
+from trunity_importer.metrics import metrics
+from trunity_importer.sda.index import ExportIndex, extract_grade
+from trunity_importer.sda.ordering import ReorderBuffer, DEFAULT_MAX_BUFFERED
 from trunity_importer.sda.question_containers import (
+    Answer,
+    Question,
     MultipleChoice,
     MultipleAnswer,
     Essay,
 )
+from trunity_importer.sda.question_handler import (
+    ImageSrcFixer,
+    QuestionHandler,
+)
 from trunity_importer.sda.validators.pre_validators import validate
 from trunity_importer.sda.warnings import warnings
 
 
+def _json_loads(json_str: str):
+    # payloads of TechnologyEnhanced items are large, orjson is much faster:
+    if orjson is not None:
+        try:
+            return orjson.loads(json_str)
+        except orjson.JSONDecodeError:
+            # NaN, lone surrogates and so on, json module accepts them
+            pass
+
+    return json.loads(json_str)
+
+
 class GradeError(ValueError):
     """
     Raise when there is no such grade exist or with other grade issues.
@@ -24,11 +51,17 @@ class GradeError(ValueError):
 
 class _GradeParser(object):
     """
-    Parse XML export file for Grades.
+    Grades of tests of XML export file.
     """
 
-    def __init__(self, soup: BeautifulSoup):
-        self._soup = soup
+    def __init__(self, soup: BeautifulSoup=None, index: ExportIndex=None):
+        """
+        Grades are taken from the `index` or from <test> tags of the `soup`.
+        """
+        if index is None:
+            index = ExportIndex.from_soup(soup)
+
+        self._index = index
 
         self._test_ids = self._get_test_ids()
         self._grades_available = list(self.test_ids.values())
@@ -59,48 +92,29 @@ class _GradeParser(object):
 
     @staticmethod
     def _extract_grade_from_activity_reference(activity_reference: str) -> str:
-        """
-        Examples:
-        SCIDIM_NA18E_OLA_G0KU04L00_0019 -> K
-        SCIDIM_NA18E_OLA_G01U00L00_0033 -> 1
-        (should be the character between "SCIDIM_NA18E_OLA_G0" and "U")
-
-        :param activity_reference: activity_reference attribute value
-        :return: grade, for example, '1', '22', 'K' etc
-        """
-        pattern = re.compile(
-            r"^SCIDIM_NA18E_OLA_G0([A-Z,0-9]+)U.+"
-        )
-        match = re.match(pattern, activity_reference)
-
-        if match:
-            return match.groups()[0]
+        return extract_grade(activity_reference)
 
     def _get_all_activity_references(self) -> dict:
         """
         Return dict with test_id's as keys
         and activity_reference attributes as values.
         """
-        return {
-            tag['test_id']: tag['activity_reference'].strip()
-            for tag in self._soup.find_all("test")
-        }
+        return self._index.activity_references
 
     def _get_test_ids(self) -> dict:
         """
         Dict with test_id as keys, grades as values.
         """
-        activity_references = self._get_all_activity_references()
-        test_ids = {}
-
-        for test_id, activity_reference in activity_references.items():
-            grade = self._extract_grade_from_activity_reference(
-                activity_reference
-            )
-            if grade is not None:
-                test_ids[test_id] = grade
+        return self._index.grades
 
-        return test_ids
+    def get_test_ids(self, grade: str) -> Set[str]:
+        """
+        Set of test_ids (questionnaires) of the `grade`.
+        """
+        return {
+            test_id for test_id, test_grade in self.test_ids.items()
+            if test_grade == grade
+        }
 
     def grade_is_valid(self, grade: str) -> bool:
         """
@@ -131,10 +145,15 @@ class Parser(object):
     """
 
     def __init__(self, xml: str):
-        self._soup = BeautifulSoup(xml, "xml")
+        with metrics.timer('xml_read', size=len(xml)):
+            self._soup = BeautifulSoup(xml, "xml")
+
+            # titles, grades, items and media of every test:
+            self.index = ExportIndex.from_soup(self._soup,
+                                               self._get_tag_media)
 
         self._questionnaire_titles = self._get_questionnaire_titles()
-        self.grades = _GradeParser(self._soup)
+        self.grades = _GradeParser(index=self.index)
 
     @property
     def questionnaire_titles(self):
@@ -154,7 +173,6 @@ class Parser(object):
 
         test_id = item_tag.test_usage.test_info['test_id']
         item_position = item_tag.test_usage.test_info['item_position']
-        # TODO: it possible that some of questions are in wrong order. Use `item_position` for sorting them.
 
         return dict(
             text=text,
@@ -164,6 +182,89 @@ class Parser(object):
             item_position=int(item_position),
         )
 
+    @classmethod
+    def _get_item_media(cls, item_type: str, display_text: str,
+                        answer_texts: List[str], rubric_text: str,
+                        audio_file: Union[str, None]) -> List[str]:
+        """
+        Zip members the item refers to, the same QuestionHandler finds
+        in its question. Items are neither validated nor parsed here:
+        images are found in their raw html.
+        """
+        img_src_fixer = ImageSrcFixer.general_fixer
+
+        if item_type == 'MultipleChoice':
+            fragments = [display_text] + answer_texts
+
+        elif item_type == 'ConstructedResponse':
+            fragments = [display_text, rubric_text]
+
+        elif item_type == 'TechnologyEnhanced':
+            fragments = []
+            img_src_fixer = ImageSrcFixer.mult_answer_fixer
+
+            # large payloads without media are not decoded:
+            if has_images(display_text) or audio_file:
+                try:
+                    data = _json_loads(display_text)
+                    if not cls._is_multiple_answer(None, data):
+                        return []
+
+                    fragments = [data['stimulus']] + [
+                        option['label'] for option in data['options']]
+
+                except (ValueError, TypeError, KeyError):
+                    # broken payloads are reported by validators
+                    return []
+
+        else:
+            return []
+
+        names = []
+        for fragment in fragments:
+            for image in iter_images(fragment):
+                try:
+                    names.append(img_src_fixer(image.src))
+                except IndexError:
+                    # no ImageID in src, it fails at import of the question
+                    continue
+
+        if audio_file:
+            names.append(QuestionHandler._get_mp3_src(audio_file))
+
+        return list(dict.fromkeys(names))
+
+    @classmethod
+    def _get_tag_media(cls, item_tag: Tag) -> List[str]:
+        def get_string(tag: Union[Tag, None]) -> str:
+            return (tag.string or '') if tag is not None else ''
+
+        distractor_tags = item_tag.distractors.find_all("distractor") \
+            if item_tag.distractors else []
+        media_file_tag = item_tag.media_file
+
+        return cls._get_item_media(
+            item_tag.get('type'),
+            get_string(item_tag.display_text),
+            [get_string(tag.display_text) for tag in distractor_tags],
+            get_string(item_tag.rubric_text),
+            media_file_tag.get('id') if media_file_tag else None,
+        )
+
+    @classmethod
+    def _get_element_media(cls, element: etree._Element) -> List[str]:
+        media_file_element = element.find('.//media_file')
+
+        return cls._get_item_media(
+            element.get('type'),
+            element.findtext('.//display_text', ''),
+            [distractor.findtext('.//display_text', '')
+             for distractor in element.iterfind('.//distractors/distractor')],
+            element.findtext('.//rubric_text', ''),
+            media_file_element.get('id')
+            if media_file_element is not None else None,
+        )
+
     @staticmethod
     def _get_multiple_choice(item_tag: Tag) -> MultipleChoice:
 
@@ -193,30 +294,45 @@ class Parser(object):
         )
 
     @staticmethod
-    def _is_multiple_answer(item_tag: Tag):
+    def _get_technology_enhanced_data(item_tag: Tag) -> dict:
+        """
+        Decoded JSON payload of TechnologyEnhanced item.
+        """
+        return _json_loads(item_tag.display_text.string.strip())
+
+    @staticmethod
+    def _is_multiple_answer(item_tag: Tag, data: dict=None):
         """
         Check if item tag can be treated as MultipleAnswer.
 
         Some of TechnologyEnhanced can be treated as MultipleAnswer.
+        Pass decoded payload of the item as `data` to not decode it again.
         """
-        json_str = item_tag.display_text.string.strip()
-        data = json.loads(json_str)
+        if data is None:
+            data = Parser._get_technology_enhanced_data(item_tag)
+
         if "multiple_responses" in data and data["multiple_responses"] is True \
                 and "type" in data and data["type"] == "mcq":
             return True
         return False
 
     @staticmethod
-    def _get_multiple_answers_data(json_str: str):
-        data = json.loads(json_str)
+    def _get_multiple_answers_data(json_data: Union[str, dict]):
+        """
+        :param json_data: payload of the item, JSON string or decoded one.
+        """
+        data = _json_loads(json_data) if isinstance(json_data, str) \
+            else json_data
 
         text = data["stimulus"]
 
         def get_answers():
+            valid_values = set(data["validation"]["valid_response"]["value"])
+
             answers = []
             for num, option in enumerate(data["options"]):
                 text = option["label"]
-                correct = True if option["value"] in data["validation"]["valid_response"]["value"] else False
+                correct = True if option["value"] in valid_values else False
                 score = 1 if correct else 0
                 feedback = data["metadata"]["distractor_rationale_response_level"][num] \
                     if "metadata" in data and "distractor_rationale_response_level" in data["metadata"] else ""
@@ -229,10 +345,11 @@ class Parser(object):
         return text, get_answers()
 
     @staticmethod
-    def _get_multiple_answer(item_tag: Tag) -> MultipleAnswer:
+    def _get_multiple_answer(item_tag: Tag, data: dict=None) -> MultipleAnswer:
         meta_info = Parser._get_gen_meta_info(item_tag)
 
-        text, answers = Parser._get_multiple_answers_data(meta_info['text'])
+        text, answers = Parser._get_multiple_answers_data(
+            data if data is not None else meta_info['text'])
 
         return MultipleAnswer(
             text=text,
@@ -257,42 +374,102 @@ class Parser(object):
             item_id=meta_info['item_id'],
         )
 
-    def get_questions(self):
-        for item in self._soup.find_all("item"):
-            question = None
+    def _iter_item_tags(self, test_ids: Set[str]=None
+                        ) -> Iterator[Tuple[int, Tag]]:
+        """
+        Item tags with their sequence numbers (see ExportIndex).
+        """
+        for seq, item in enumerate(self._soup.find_all("item")):
+            if test_ids is None or \
+                    self.index.get_item_test_id(seq) in test_ids:
+                yield seq, item
+
+    @classmethod
+    def _get_question(cls, item: Tag) -> Union[Question, None]:
+        with metrics.timer('validate'):
             is_valid = validate(item)
 
-            if is_valid:
-                if item['type'] == 'MultipleChoice':
-                    question = self._get_multiple_choice(item)
+        if not is_valid:
+            return None
+
+        with metrics.timer('parse'):
+            return cls._parse_question(item)
 
-                elif item['type'] == 'ConstructedResponse':
-                    # we treat ConstructedResponse as Trunity Essay:
-                    question = self._get_essay(item)
+    @classmethod
+    def _parse_question(cls, item: Tag) -> Union[Question, None]:
+        question = None
 
-                elif item['type'] == 'TechnologyEnhanced':
-                    # we only can support MultipleAnswer for this type:
-                    if self._is_multiple_answer(item):
-                        question = self._get_multiple_answer(item)
+        if item['type'] == 'MultipleChoice':
+            question = cls._get_multiple_choice(item)
 
-                else:
-                    warnings.add(
-                        item_id=item['id'],
-                        message="Question type is unknown - {}".format(item['type'])
-                    )
+        elif item['type'] == 'ConstructedResponse':
+            # we treat ConstructedResponse as Trunity Essay:
+            question = cls._get_essay(item)
+
+        elif item['type'] == 'TechnologyEnhanced':
+            # we only can support MultipleAnswer for this type,
+            # payload is decoded once for the check and the answers:
+            data = cls._get_technology_enhanced_data(item)
+            if cls._is_multiple_answer(item, data):
+                question = cls._get_multiple_answer(item, data)
+
+        else:
+            warnings.add(
+                item_id=item['id'],
+                message="Question type is unknown - {}".format(item['type'])
+            )
 
+        return question
+
+    def _iter_parsed_items(self, test_ids: Set[str]=None
+                           ) -> Iterator[Tuple[int, Union[Question, None]]]:
+        """
+        Sequence numbers of items with their questions.
+        Question is None if the item can't be imported.
+        """
+        for seq, item in self._iter_item_tags(test_ids):
+            yield seq, self._get_question(item)
+
+    def get_questions(self, test_ids: Set[str]=None):
+        """
+        Parse questions.
+
+        :param test_ids: parse only items that belong to these tests.
+            Other items are skipped before validation and parsing.
+        """
+        for _, question in self._iter_parsed_items(test_ids):
             if question is not None:
                 yield question
 
+    def get_tests(self, test_ids: Set[str]=None,
+                  max_buffered: int=DEFAULT_MAX_BUFFERED
+                  ) -> Iterator[Tuple[str, List[Question]]]:
+        """
+        Parse questions and group them by tests. Every test goes out as
+        soon as its last item is read, with questions in item_position
+        order.
+
+        :param test_ids: parse only items that belong to these tests.
+        :param max_buffered: max number of questions of unfinished tests
+            kept in memory, the rest are spilled to disk.
+        """
+        buffer = ReorderBuffer(self.index, max_buffered=max_buffered)
+
+        try:
+            for seq, question in self._iter_parsed_items(test_ids):
+                yield from buffer.add(seq, question)
+
+            yield from buffer.flush()
+
+        finally:
+            buffer.close()
+
     def _get_questionnaire_titles(self) -> dict:
         """
         Return dict with test_id's as keys
         and questionnaire titles as values.
         """
-        return {
-            tag['test_id']: tag['test_name'].strip()
-            for tag in self._soup.find_all("test")
-        }
+        return self.index.titles
 
     def get_questionnaire_title(self, test_id: str) -> str:
         """
@@ -302,3 +479,143 @@ class Parser(object):
         """
         title = self._questionnaire_titles[test_id]
         return title + " - Question Pool"
+
+
+def _init_worker():
+    # workers forked with parent's warnings and metrics
+    # shouldn't send them back:
+    warnings.clear()
+    metrics.clear()
+
+
+def _parse_items(items: List[Tuple[int, bytes]]
+                 ) -> Tuple[List[Tuple[int, Union[Question, None]]],
+                            List[dict], dict]:
+    """
+    Parse chunk of serialized <item> elements (with their sequence numbers)
+    in a worker process. Warnings and metrics of the worker are sent back
+    together with the questions.
+    """
+    parsed_items = [
+        (seq, Parser._get_question(BeautifulSoup(item_xml, "xml").item))
+        for seq, item_xml in items
+    ]
+    return parsed_items, warnings.pop_all(), metrics.pop_all()
+
+
+class StreamingParser(Parser):
+    """
+    Parser for "XML export file" that never holds the whole document
+    in memory.
+
+    <item> elements are read one by one with lxml iterparse and cleared
+    as soon as they are handled, so memory usage doesn't depend
+    on the size of the export.
+    """
+
+    def __init__(self, open_xml: Callable[[], IO[bytes]], processes: int=1,
+                 chunk_size: int=100):
+        """
+        :param open_xml: callable that returns a new binary file object
+            with the xml every time it is called. The file is read twice:
+            first for <test> tags and then for <item> tags.
+        :param processes: number of worker processes that parse items.
+            Items are parsed in this process if it's 1.
+        :param chunk_size: number of items sent to a worker at once.
+        """
+        self._open_xml = open_xml
+        self._processes = processes
+        self._chunk_size = chunk_size
+
+        # the first read builds the index of tests and items:
+        self.index = self._get_index()
+
+        self._questionnaire_titles = self._get_questionnaire_titles()
+        self.grades = _GradeParser(index=self.index)
+
+    def _iter_elements(self, tag: Union[str, Tuple[str, ...]]
+                       ) -> Iterator[etree._Element]:
+        """
+        Iterate over elements with `tag` name(s). Every element is freed
+        (with all preceding siblings) after it was handled.
+        """
+        with self._open_xml() as file_obj:
+            context = etree.iterparse(
+                file_obj, events=("end",), tag=tag, huge_tree=True,
+            )
+            for _, element in context:
+                yield element
+
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+
+    def _get_index(self) -> ExportIndex:
+        index = ExportIndex()
+
+        for element in self._iter_elements(("test", "item")):
+            if element.tag == "test":
+                index.add_test_element(element)
+            else:
+                index.add_item_element(
+                    element, self._get_element_media(element))
+
+        return index
+
+    def _iter_items_xml(self, test_ids: Set[str]=None
+                        ) -> Iterator[Tuple[int, bytes]]:
+        for seq, element in enumerate(self._iter_elements("item")):
+            if test_ids is not None and \
+                    self.index.get_item_test_id(seq) not in test_ids:
+                continue
+
+            yield seq, etree.tostring(element, with_tail=False)
+
+    def _iter_item_tags(self, test_ids: Set[str]=None
+                        ) -> Iterator[Tuple[int, Tag]]:
+        for seq, item_xml in self._iter_items_xml(test_ids):
+            yield seq, BeautifulSoup(item_xml, "xml").item
+
+    def _iter_item_chunks(self, test_ids: Set[str]=None
+                          ) -> Iterator[List[Tuple[int, bytes]]]:
+        chunk = []
+
+        for item in self._iter_items_xml(test_ids):
+            chunk.append(item)
+
+            if len(chunk) >= self._chunk_size:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+    @staticmethod
+    def _get_chunk_items(future: Future
+                         ) -> List[Tuple[int, Union[Question, None]]]:
+        parsed_items, chunk_warnings, chunk_metrics = future.result()
+        warnings.extend(chunk_warnings)
+        metrics.merge(chunk_metrics)
+        return parsed_items
+
+    def _iter_parsed_items_in_processes(self, test_ids: Set[str]=None):
+        with ProcessPoolExecutor(self._processes,
+                                 initializer=_init_worker) as executor:
+            futures = deque()
+
+            for chunk in self._iter_item_chunks(test_ids):
+                futures.append(executor.submit(_parse_items, chunk))
+
+                # items go out in document order, while next chunks
+                # are being parsed by other workers:
+                if len(futures) >= 2 * self._processes:
+                    yield from self._get_chunk_items(futures.popleft())
+
+            while futures:
+                yield from self._get_chunk_items(futures.popleft())
+
+    def _iter_parsed_items(self, test_ids: Set[str]=None):
+        if self._processes > 1:
+            return self._iter_parsed_items_in_processes(test_ids)
+
+        return super(StreamingParser, self)._iter_parsed_items(test_ids)
@@ -1,6 +1,7 @@
-from typing import List
+from array import array
+from typing import Dict, Iterable, List
 
-from trunity_3_client.builders import Answer
+from trunity_3_client.builders.qst_pool import AbstractAnswer
 
 
 class QuestionType:
@@ -9,7 +10,46 @@ class QuestionType:
     ESSAY = 'essay'
 
 
+def count_correct(answers: Iterable['Answer']) -> int:
+    return sum(1 for answer in answers if answer.correct is True)
+
+
+class Answer(object):
+    """
+    Answer option of parsed question.
+
+    Works like trunity_3_client Answer in Questionnaire builder,
+    but has no __dict__: there are millions of them in big exports.
+    """
+    __slots__ = ('text', 'correct', 'score', 'feedback', 'ck_editor')
+
+    def __init__(self, text: str, correct: bool, score: int,
+                 feedback: str="", ck_editor: bool=False):
+        self.text = text
+        self.correct = correct
+        self.score = score
+        self.feedback = feedback
+        self.ck_editor = ck_editor
+
+    def to_dict(self) -> dict:
+        return {
+            'correct': self.correct,
+            'text': self.text,
+            'cke': self.ck_editor,
+            'score': self.score,
+            'feedback': self.feedback,
+        }
+
+    def __eq__(self, other):
+        return self.to_dict() == other.to_dict()
+
+
+AbstractAnswer.register(Answer)
+
+
 class Question:
+    __slots__ = ('type', 'text', 'audio_file', 'test_id', 'item_position',
+                 'item_id')
 
     def __init__(self, type_: str, text: str,  audio_file: str,
                  test_id: str, item_position: int, item_id: int):
@@ -26,6 +66,7 @@ class MultipleChoice(Question):
     """
     Container for parsed MultipleChoice question.
     """
+    __slots__ = ('answers',)
 
     def __init__(self, text: str, answers: List[Answer],
                  audio_file: str, test_id: str, item_position: int, item_id: int):
@@ -46,6 +87,7 @@ class MultipleAnswer(Question):
     """
     Container for parsed MultipleAnswer question.
     """
+    __slots__ = ('answers',)
 
     def __init__(self, text: str, answers: List[Answer],
                  audio_file: str, test_id: str, item_position: int, item_id: int):
@@ -66,6 +108,7 @@ class Essay(Question):
     """
     Container for parsed MultipleChoice question.
     """
+    __slots__ = ('correct_answer',)
 
     def __init__(self, text: str, correct_answer: str,
                  audio_file: str, test_id: str, item_position: int,
@@ -82,3 +125,86 @@ class Essay(Question):
 
         self.correct_answer = correct_answer
 
+
+class QuestionBatch(object):
+    """
+    Many questions in columnar form: item ids, positions, test ids and
+    texts are packed into arrays, one row per question.
+
+    It's meant for bulk validation and grouping of whole exports, so only
+    the number of correct answers is kept, not the answers themselves.
+    """
+
+    TYPES = (
+        QuestionType.MULTIPLE_CHOICE,
+        QuestionType.MULTIPLE_ANSWER,
+        QuestionType.ESSAY,
+    )
+
+    def __init__(self):
+        self.item_ids = array('q')
+        self.positions = array('l')
+        self.types = array('B')  # index in TYPES
+        self.correct_counts = array('H')
+
+        # test ids are kept once, rows refer to them by index:
+        self.test_indexes = array('L')
+        self._test_ids = []
+        self._test_id_indexes = {}
+
+        # texts are utf-8 encoded one after another:
+        self._texts = bytearray()
+        self._text_offsets = array('Q', [0])
+
+    @classmethod
+    def from_questions(cls, questions: Iterable[Question]) -> 'QuestionBatch':
+        batch = cls()
+        for question in questions:
+            batch.append(question)
+        return batch
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def append(self, question: Question):
+        test_index = self._test_id_indexes.get(question.test_id)
+        if test_index is None:
+            test_index = self._test_id_indexes[question.test_id] = \
+                len(self._test_ids)
+            self._test_ids.append(question.test_id)
+
+        answers = getattr(question, 'answers', ())
+
+        self.item_ids.append(question.item_id)
+        self.positions.append(question.item_position)
+        self.types.append(self.TYPES.index(question.type))
+        self.correct_counts.append(count_correct(answers))
+        self.test_indexes.append(test_index)
+
+        self._texts += question.text.encode()
+        self._text_offsets.append(len(self._texts))
+
+    def test_id(self, row: int) -> str:
+        return self._test_ids[self.test_indexes[row]]
+
+    def type(self, row: int) -> str:
+        return self.TYPES[self.types[row]]
+
+    def text(self, row: int) -> str:
+        start, end = self._text_offsets[row], self._text_offsets[row + 1]
+        return self._texts[start:end].decode()
+
+    def group_by_test(self) -> Dict[str, List[int]]:
+        """
+        Rows of every test, sorted by item position.
+        """
+        groups = {}
+
+        for row, test_index in enumerate(self.test_indexes):
+            groups.setdefault(self._test_ids[test_index], []).append(row)
+
+        positions = self.positions
+        for rows in groups.values():
+            rows.sort(key=positions.__getitem__)
+
+        return groups
@@ -1,15 +1,16 @@
+import html
 import os
 import re
 from zipfile import ZipFile
-from typing import Callable
+from typing import Callable, Dict, Iterator, List, Tuple
 
-from bs4 import BeautifulSoup
 from trunity_3_client import FilesClient
 
+from trunity_importer.html_rewriter import ImageRewriter
+from trunity_importer.media import MediaUploader
+from trunity_importer.metrics import metrics
+
 from trunity_importer.sda.question_containers import (
-    MultipleChoice,
-    MultipleAnswer,
-    Essay,
     Question,
     QuestionType,
 )
@@ -19,6 +20,9 @@ QUESTION_TEXT_TEMPLATE = os.path.join(
     'templates/question.html'
 )
 
+# some padding for nicer look:
+IMAGE_STYLE = "padding: 5px;"
+
 
 class ImageSrcFixer:
 
@@ -37,110 +41,171 @@ class ImageSrcFixer:
         return 'images/' + find[0] + '.gif'
 
 
+_TYPE_NAMES = {
+    QuestionType.MULTIPLE_CHOICE: "MultipleChoice",
+    QuestionType.MULTIPLE_ANSWER: "MultipleAnswer (TechnologyEnhanced)",
+    QuestionType.ESSAY: "Essay",
+}
+
+
+class MediaPlan(object):
+    """
+    Media files of the question and places they go to.
+    Made by QuestionHandler.plan_media, applied by
+    QuestionHandler.apply_media once the files are uploaded.
+    """
+
+    def __init__(self, question: Question, rewriter: ImageRewriter,
+                 image_srcs: List[str], mp3_src: str=None):
+        self.question = question
+        self.rewriter = rewriter
+        self.image_srcs = image_srcs
+        self.mp3_src = mp3_src
+
+    @property
+    def media(self) -> List[str]:
+        """
+        Zip members to upload, without duplicates.
+        """
+        names = list(dict.fromkeys(self.image_srcs))
+        if self.mp3_src is not None and self.mp3_src not in names:
+            names.append(self.mp3_src)
+        return names
+
+
 class QuestionHandler:
 
     def __init__(self, files_client: FilesClient,
-                 zip_file: ZipFile):
+                 zip_file: ZipFile, uploader: MediaUploader=None):
+        """
+        Uploader is needed by `handle` only. Without files client and
+        uploader the handler can still plan and apply media.
+        """
         self._files_client = files_client
         self._zip_file = zip_file
 
+        if uploader is None and files_client is not None:
+            uploader = MediaUploader(files_client, zip_file)
+        self._uploader = uploader
+
         with open(QUESTION_TEXT_TEMPLATE) as fo:
             self._question_text_templ = fo.read()
 
-    def _upload_images(self, html: str, img_src_fixer: Callable[[str], str]):
+    @staticmethod
+    def _get_html_fragments(question: Question
+                            ) -> Tuple[List[str], Callable[[str], str]]:
         """
-        Upload all images to Trunity and replace src attributes with new urls.
+        Html fragments of the question that may contain images and
+        the fixer of their src attributes.
         """
-        soup = BeautifulSoup(html, "lxml")
-        for img in soup.find_all("img"):
-            image_src = img_src_fixer(img['src'])
-            file_obj = self._zip_file.open(image_src)
-            cdn_file_url = self._files_client.list.post(file_obj=file_obj)
-            img['src'] = cdn_file_url
+        if question.type == QuestionType.MULTIPLE_CHOICE:
+            fragments = [question.text] + [a.text for a in question.answers]
+            return fragments, ImageSrcFixer.general_fixer
 
-            # add some padding for nicer look:
-            img["style"] = "padding: 5px;"
+        elif question.type == QuestionType.MULTIPLE_ANSWER:
+            fragments = [question.text] + [a.text for a in question.answers]
+            return fragments, ImageSrcFixer.mult_answer_fixer
 
-        return soup.decode()
+        elif question.type == QuestionType.ESSAY:
+            fragments = [question.text, question.correct_answer]
+            return fragments, ImageSrcFixer.general_fixer
 
-    def _upload_mp3_file(self, name: str) -> str:
-        src = 'media/' + name
-        file_obj = self._zip_file.open(src)
-        return self._files_client.list.post(file_obj=file_obj)
+        # for other types of questions images are not handled:
+        return [], ImageSrcFixer.general_fixer
 
-    def _upload_images_in_multiple_answer(self, question: MultipleAnswer):
-        img_src_fixer = ImageSrcFixer.mult_answer_fixer
-        print("Uploading images for MultipleAnswer "
-              "(TechnologyEnhanced) question...", end='')
-        question.text = self._upload_images(question.text, img_src_fixer)
+    @staticmethod
+    def _set_html_fragments(question: Question, fragments: List[str]):
+        if question.type in (QuestionType.MULTIPLE_CHOICE,
+                             QuestionType.MULTIPLE_ANSWER):
+            question.text, *answer_texts = fragments
 
-        for answer in question.answers:
-            answer.text = self._upload_images(answer.text, img_src_fixer)
+            for answer, answer_text in zip(question.answers, answer_texts):
+                answer.text = answer_text
 
-        print("\t\t Success!")
-        return question
+        elif question.type == QuestionType.ESSAY:
+            question.text, question.correct_answer = fragments
+
+    @staticmethod
+    def _get_mp3_src(name: str) -> str:
+        return 'media/' + name
 
-    def _upload_images_in_multiple_choice(self, question: MultipleChoice):
-        img_src_fixer = ImageSrcFixer.general_fixer
+    def plan_media(self, question: Question) -> MediaPlan:
+        """
+        Find media files the question refers to.
+        Nothing is uploaded here.
+        """
+        fragments, img_src_fixer = self._get_html_fragments(question)
 
-        print("Uploading images for MultipleChoice question...", end='')
-        question.text = self._upload_images(question.text, img_src_fixer)
+        with metrics.timer('html_parse',
+                           size=sum(len(html or '') for html in fragments)):
+            rewriter = ImageRewriter(fragments)
+        image_srcs = [img_src_fixer(src) for src in rewriter.srcs]
 
-        for answer in question.answers:
-            answer.text = self._upload_images(answer.text, img_src_fixer)
+        mp3_src = None
+        if question.audio_file:
+            mp3_src = self._get_mp3_src(question.audio_file)
 
-        print("\t\t Success!")
-        return question
+        return MediaPlan(question, rewriter, image_srcs, mp3_src)
 
-    def _upload_images_in_essay(self, question: Essay):
-        img_src_fixer = ImageSrcFixer.general_fixer
+    def apply_media(self, plan: MediaPlan,
+                    cdn_file_urls: Dict[str, str]) -> Question:
+        """
+        Replace media files of the question with their CDN urls.
 
-        print("Uploading images for Essay question...", end='')
+        :param cdn_file_urls: key: zip member name, value: CDN url.
+            Must contain every member of `plan.media`.
+        """
+        question = plan.question
 
-        question.text = self._upload_images(question.text, img_src_fixer)
-        question.correct_answer = self._upload_images(
-            question.correct_answer,
-            img_src_fixer,
-        )
+        # fragments without images are kept as they are:
+        if plan.rewriter:
+            with metrics.timer('html_rewrite'):
+                self._set_html_fragments(question, plan.rewriter.rewrite(
+                    [cdn_file_urls[src] for src in plan.image_srcs],
+                    style=IMAGE_STYLE,
+                ))
+
+        if plan.mp3_src is not None:
+            question = self._add_audio_file_to_question(
+                question, cdn_file_urls[plan.mp3_src])
 
-        print("\t\t Success!")
         return question
 
-    def _add_audio_file_to_question(self, question: Question):
-        if question.audio_file:
-            print("Uploading mp3 for question...", end='')
-            mp3_source = self._upload_mp3_file(question.audio_file)
-
-            question.text = self._question_text_templ.format(
-                mp3_source=mp3_source,
-                question_text=question.text
-            )
-            print("\t\t Success!")
+    def _add_audio_file_to_question(self, question: Question,
+                                    mp3_source: str):
+        question.text = self._question_text_templ.format(
+            # the same way html_rewriter writes image sources:
+            mp3_source=html.escape(mp3_source),
+            question_text=question.text
+        )
         return question
 
     def handle(self, question: Question):
-        # for other types of questions that are not listed below:
-        handlers = []
+        """
+        Upload media files of the question (images and mp3 in parallel)
+        and replace them with CDN urls.
+        """
+        return self._handle_plan(self.plan_media(question))
 
-        if question.type == QuestionType.MULTIPLE_CHOICE:
-            handlers = [
-                self._upload_images_in_multiple_choice,
-                self._add_audio_file_to_question,
-            ]
+    def handle_many(self, questions: List[Question]) -> Iterator[Question]:
+        """
+        Handle questions one by one, like `handle`. Media of the next
+        questions are read ahead while the current ones are uploaded.
+        """
+        plans = [self.plan_media(question) for question in questions]
+        self._uploader.prefetch(name for plan in plans for name in plan.media)
 
-        elif question.type == QuestionType.ESSAY:
-            handlers = [
-                self._upload_images_in_essay,
-                self._add_audio_file_to_question,
-            ]
+        for plan in plans:
+            yield self._handle_plan(plan)
 
-        elif question.type == QuestionType.MULTIPLE_ANSWER:
-            handlers = [
-                self._upload_images_in_multiple_answer,
-                self._add_audio_file_to_question,
-            ]
+    def _handle_plan(self, plan: MediaPlan) -> Question:
+        question = plan.question
 
-        for handler in handlers:
-            question = handler(question)
+        print("Uploading media for {} question...".format(
+            _TYPE_NAMES.get(question.type, question.type)), end='')
 
+        cdn_file_urls = self._uploader.upload_many(plan.media)
+        question = self.apply_media(plan, cdn_file_urls)
+
+        print("\t\t Success!")
         return question
@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+from unittest import TestCase, mock
+from zipfile import ZipFile
+
+from trunity_3_client.utils.url import API_ROOT
+
+from trunity_importer.fake_server import FakeTrunity, serve_in_thread
+from trunity_importer.journal import Journal
+from trunity_importer.preflight import PreflightError
+from trunity_importer.sda import Importer
+from trunity_importer.sda.tests.test_ordering import make_xml
+from trunity_importer.topic_mapping import TopicMapping
+from trunity_importer.utils import set_api_root
+
+
+class ImporterTestCase(TestCase):
+
+    def setUp(self):
+        self.app = FakeTrunity()
+        self.server, api_root = serve_in_thread(self.app)
+        set_api_root(api_root)
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.zip_path = os.path.join(self.tmp_dir, 'export.zip')
+
+        with ZipFile(self.zip_path, 'w') as zip_file:
+            zip_file.writestr('XML_Export_0001.xml', make_xml())
+
+    def tearDown(self):
+        set_api_root(API_ROOT)
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def perform_import(self, **kwargs) -> Importer:
+        # sessions are shared by creds, tokens of other servers are no good:
+        importer = Importer(
+            self.id(), 'password', book_id=1, path_to_zip=self.zip_path,
+            **kwargs
+        )
+        importer.perform_import(topic_mapping=TopicMapping())
+        return importer
+
+    def assert_imported(self, importer: Importer):
+        requests = self.app.stats.to_dict()['requests']
+        self.assertEqual(requests['contents'], 2)
+        self.assertEqual(requests['questions'], 6)
+
+        for test_id in ['1', '2']:
+            self.assertTrue(
+                importer._journal.is_done(Journal.QUESTIONNAIRE, test_id))
+
+    def test_perform_import(self):
+        self.assert_imported(self.perform_import())
+
+    def test_incremental_import(self):
+        importer = self.perform_import(incremental=True)
+        self.assert_imported(importer)
+
+        # test "2" is over first, so its pool is uploaded first:
+        self.assertLess(importer._journal.get(Journal.POOL, '2'),
+                        importer._journal.get(Journal.POOL, '1'))
+
+    def test_incremental_streaming_import(self):
+        self.assert_imported(
+            self.perform_import(incremental=True, streaming=True))
+
+    def test_missing_media(self):
+        xml = make_xml().replace(
+            b'<p>Text 1</p>', b'<p>Text 1 <img src="images\\Missing"/></p>')
+        with ZipFile(self.zip_path, 'w') as zip_file:
+            zip_file.writestr('XML_Export_0001.xml', xml)
+            zip_file.writestr('images/missing.gif', b'GIF89a')
+
+        with self.assertRaises(PreflightError) as context:
+            self.perform_import()
+
+        self.assertDictEqual(context.exception.report.missing,
+                             {'images/Missing.gif': ['images/missing.gif']})
+        # nothing is created in Trunity, the importer has only logged in:
+        self.assertListEqual(
+            list(self.app.stats.to_dict()['requests']), ['authorization'])
+
+    def test_preflight_of_some_tests(self):
+        xml = make_xml().replace(
+            b'<p>Text 1</p>', b'<p>Text 1 <img src="images\\1"/></p>'
+        ).replace(
+            b'<p>Text 2</p>', b'<p>Text 2 <img src="images\\2"/></p>')
+        with ZipFile(self.zip_path, 'w') as zip_file:
+            zip_file.writestr('XML_Export_0001.xml', xml)
+            for name in ['1', '2', 'unused']:
+                zip_file.writestr('images/{}.gif'.format(name), b'GIF89a')
+
+        for streaming in [False, True]:
+            importer = Importer(self.id(), 'password', book_id=1,
+                                path_to_zip=self.zip_path,
+                                streaming=streaming)
+
+            # media are taken from the index, questions aren't parsed:
+            with mock.patch.object(importer._parser, 'get_questions',
+                                   side_effect=AssertionError):
+                report = importer.check_media(test_ids={'1'})
+
+            self.assertDictEqual(dict(report.references),
+                                 {'images/1.gif': 1})
+            # the image of test "2" is used, though it's not imported now:
+            self.assertListEqual(report.unused, ['images/unused.gif'])
+
+    def test_dry_run(self):
+        journal_path = os.path.join(self.tmp_dir, 'journal.jsonl')
+        importer = self.perform_import(dry_run=True, journal_path=journal_path)
+
+        # nothing is sent to Trunity, nothing is written to the journal:
+        self.assertEqual(self.app.stats.to_dict()['total_requests'], 0)
+        self.assertFalse(os.path.exists(journal_path))
+
+        plan = importer.get_plan()
+        self.assertEqual(plan.pools, 2)
+        self.assertDictEqual(plan.questions, {'essay': 6})
+        self.assertEqual(plan.uploads, 0)
@@ -0,0 +1,76 @@
+import io
+import os
+import tempfile
+from collections import Counter
+from unittest import TestCase
+from zipfile import ZipFile
+
+from bs4 import BeautifulSoup
+
+from benchmarks.generators import make_sda_export
+from trunity_importer.sda.index import ExportIndex
+from trunity_importer.sda.parser import Parser, StreamingParser
+from trunity_importer.sda.question_handler import QuestionHandler
+
+XML = b"""<?xml version="1.0" encoding="utf-8"?>
+<object-bank>
+<items>
+<item id="3" type="Essay"><test_usage><test_info test_id="1" item_position="2"/></test_usage></item>
+<item id="4" type="Essay"><test_usage><test_info test_id="2" item_position="1"/></test_usage></item>
+<item id="5" type="Essay"></item>
+<item id="1" type="Essay"><test_usage><test_info test_id="1" item_position="1"/></test_usage></item>
+</items>
+<tests>
+<test test_id="1" test_name=" Test 1 " activity_reference="SCIDIM_NA18E_OLA_G0KU04L00_0019"/>
+<test test_id="2" test_name="Test 2" activity_reference="OTHER"/>
+</tests>
+</object-bank>
+"""
+
+
+class ExportIndexTestCase(TestCase):
+
+    def assert_index(self, index: ExportIndex):
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.items_count, 4)
+        self.assertDictEqual(index.titles, {'1': 'Test 1', '2': 'Test 2'})
+        self.assertDictEqual(index.grades, {'1': 'K'})
+
+        self.assertEqual(index['1'].item_count, 2)
+        self.assertListEqual(index['1'].item_ids, [1, 3])
+        self.assertEqual(index['1'].last_seq, 3)
+        self.assertEqual(index['2'].last_seq, 1)
+
+        self.assertListEqual(
+            [index.get_item_test_id(seq) for seq in range(4)],
+            ['1', '2', None, '1'],
+        )
+
+    def test_from_soup(self):
+        self.assert_index(ExportIndex.from_soup(BeautifulSoup(XML, "xml")))
+
+    def test_parsers(self):
+        self.assert_index(Parser(XML).index)
+        self.assert_index(StreamingParser(lambda: io.BytesIO(XML)).index)
+
+    def test_media(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = make_sda_export(os.path.join(tmp_dir, 'export.zip'),
+                                   items=30, images_per_item=2,
+                                   audio_ratio=0.5)
+            with ZipFile(path) as zip_file:
+                xml = zip_file.read('XML_Export_0001.xml')
+
+        parser = Parser(xml.decode())
+        handler = QuestionHandler(files_client=None, zip_file=None)
+        planned = Counter(name for question in parser.get_questions()
+                          for name in handler.plan_media(question).media)
+
+        # every item type refers to images, some of them to audio:
+        self.assertEqual(
+            len([name for name in planned if name.startswith('images/')]),
+            30 * 2)
+        self.assertTrue(any(name.startswith('media/') for name in planned))
+        self.assertEqual(Counter(parser.index.get_media()), planned)
+        self.assertEqual(Counter(StreamingParser(
+            lambda: io.BytesIO(xml)).index.get_media()), planned)
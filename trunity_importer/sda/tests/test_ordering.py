@@ -0,0 +1,148 @@
+import io
+from unittest import TestCase
+
+from trunity_importer.sda.index import ExportIndex
+from trunity_importer.sda.ordering import ReorderBuffer
+from trunity_importer.sda.parser import Parser, StreamingParser
+from trunity_importer.sda.question_containers import Essay
+
+ITEM = """<item id="{item_id}" type="ConstructedResponse">
+  <display_text><![CDATA[<p>Text {item_id}</p>]]></display_text>
+  <rubrics><rubric id="1"><rubric_text><![CDATA[<p>Answer</p>]]></rubric_text></rubric></rubrics>
+  <test_usage><test_info test_id="{test_id}" item_position="{position}" /></test_usage>
+</item>
+"""
+
+# items of two tests are mixed up, positions are shuffled:
+ITEMS = [
+    # (item_id, test_id, item_position)
+    (1, '1', 3),
+    (2, '2', 2),
+    (3, '1', 1),
+    (4, '2', 1),
+    (5, '1', 2),
+    (6, '1', 4),
+]
+
+
+def make_xml(items=ITEMS) -> bytes:
+    return """<?xml version="1.0" encoding="utf-8"?>
+<object-bank>
+<items>
+{}</items>
+<tests>
+<test test_id="1" test_name="Test 1" activity_reference="A"/>
+<test test_id="2" test_name="Test 2" activity_reference="B"/>
+</tests>
+</object-bank>
+""".format("".join(
+        ITEM.format(item_id=item_id, test_id=test_id, position=position)
+        for item_id, test_id, position in items
+    )).encode()
+
+
+def make_question(item_id: int, test_id: str, position: int) -> Essay:
+    return Essay(
+        text="Text {}".format(item_id),
+        correct_answer="Answer",
+        audio_file=None,
+        test_id=test_id,
+        item_position=position,
+        item_id=item_id,
+    )
+
+
+class ReorderBufferTestCase(TestCase):
+
+    def setUp(self):
+        self.index = ExportIndex()
+        for item_id, test_id, position in ITEMS:
+            self.index.add_item(test_id, item_id, position)
+
+    def add_all(self, buffer: ReorderBuffer) -> list:
+        tests = []
+
+        for seq, (item_id, test_id, position) in enumerate(ITEMS):
+            for test_id, questions in buffer.add(
+                    seq, make_question(item_id, test_id, position)):
+                tests.append(
+                    (test_id, [question.item_id for question in questions]))
+
+        return tests
+
+    def test_tests_in_order(self):
+        buffer = ReorderBuffer(self.index)
+
+        self.assertListEqual(
+            self.add_all(buffer),
+            [('2', [4, 2]), ('1', [3, 5, 1, 6])],
+            "Test must be given away on its last item, sorted by position!"
+        )
+        self.assertEqual(buffer.buffered, 0)
+        self.assertListEqual(buffer.flush(), [])
+
+    def test_spill(self):
+        buffer = ReorderBuffer(self.index, max_buffered=1)
+
+        self.assertListEqual(
+            self.add_all(buffer),
+            [('2', [4, 2]), ('1', [3, 5, 1, 6])],
+        )
+        self.assertEqual(buffer.buffered, 0)
+        self.assertEqual(buffer.spilled_tests, 0)
+        buffer.close()
+
+    def test_skipped_items(self):
+        buffer = ReorderBuffer(self.index)
+
+        # the last item of test "1" isn't parsed:
+        self.assertListEqual(buffer.add(0, make_question(1, '1', 3)), [])
+        self.assertListEqual(buffer.add(2, make_question(3, '1', 1)), [])
+
+        tests = buffer.add(5, None)
+        self.assertListEqual(
+            [(test_id, [question.item_id for question in questions])
+             for test_id, questions in tests],
+            [('1', [3, 1])],
+        )
+
+    def test_flush(self):
+        buffer = ReorderBuffer(self.index, max_buffered=1)
+
+        buffer.add(0, make_question(1, '1', 3))
+        buffer.add(1, make_question(2, '2', 2))
+        buffer.add(2, make_question(3, '1', 1))
+
+        self.assertListEqual(
+            [(test_id, [question.item_id for question in questions])
+             for test_id, questions in buffer.flush()],
+            [('1', [3, 1]), ('2', [2])],
+        )
+        buffer.close()
+
+
+class GetTestsTestCase(TestCase):
+
+    def assert_tests(self, parser: Parser, **kwargs):
+        self.assertListEqual(
+            [(test_id, [question.item_id for question in questions])
+             for test_id, questions in parser.get_tests(**kwargs)],
+            [('2', [4, 2]), ('1', [3, 5, 1, 6])],
+        )
+
+    def test_parser(self):
+        self.assert_tests(Parser(make_xml()))
+        self.assert_tests(Parser(make_xml()), max_buffered=1)
+
+    def test_streaming_parser(self):
+        xml = make_xml()
+        self.assert_tests(StreamingParser(lambda: io.BytesIO(xml)))
+        self.assert_tests(StreamingParser(lambda: io.BytesIO(xml),
+                                          processes=2, chunk_size=2))
+
+    def test_test_ids(self):
+        self.assertListEqual(
+            [test_id for test_id, _ in
+             Parser(make_xml()).get_tests(test_ids={'1'})],
+            ['1'],
+        )
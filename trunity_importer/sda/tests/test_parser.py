@@ -1,12 +1,20 @@
+import io
 import os
-from unittest import TestCase
+from unittest import TestCase, mock
 
 from bs4 import BeautifulSoup
 from trunity_3_client.builders import Answer
 
-from trunity_importer.sda.parser import Parser, _GradeParser, GradeError
-from trunity_importer.sda.question_containers import MultipleChoice
+from trunity_importer.sda import parser
+from trunity_importer.sda.parser import (
+    Parser,
+    StreamingParser,
+    _GradeParser,
+    GradeError,
+)
+from trunity_importer.sda.question_containers import MultipleChoice, Essay
 from trunity_importer.sda import QuestionType
+from trunity_importer.sda.warnings import warnings
 
 DATA_DIR = os.path.join(
     os.path.dirname(os.path.realpath(__file__)),  # current file dir
@@ -90,6 +98,10 @@ class GradeParserTestCase(TestCase):
         with self.assertRaises(GradeError):
             self.parser.validate_grade("KK")
 
+    def test_get_test_ids(self):
+        self.assertSetEqual(self.parser.get_test_ids("K"), {"222"})
+        self.assertSetEqual(self.parser.get_test_ids("KK"), set())
+
 
 class ParserTestCase(TestCase):
 
@@ -318,4 +330,137 @@ class ParserTestCase(TestCase):
             question.item_id,
             831087,
             "Wrong item_id for MultipleAnswer question!"
-        )
\ No newline at end of file
+        )
+
+    def test_technology_enhanced_payload_is_decoded_once(self):
+        tag = BeautifulSoup(self.tech_enhance_mult_answer_xml, "xml").find('item')
+
+        with mock.patch('trunity_importer.sda.parser._json_loads',
+                        side_effect=parser._json_loads) as json_loads:
+            question = Parser._parse_question(tag)
+
+        self.assertEqual(question.type, QuestionType.MULTIPLE_ANSWER)
+        self.assertEqual(json_loads.call_count, 1)
+
+    def test_decoded_payload_gives_the_same_question(self):
+        tag = BeautifulSoup(self.tech_enhance_mult_answer_xml, "xml").find('item')
+        data = Parser._get_technology_enhanced_data(tag)
+
+        self.assertTrue(Parser._is_multiple_answer(tag, data))
+        self.assertTupleEqual(
+            Parser._get_multiple_answers_data(data),
+            Parser._get_multiple_answers_data(
+                self.tech_enhance_mult_answer_json),
+        )
+        self.assertListEqual(
+            Parser._get_multiple_answer(tag, data).answers,
+            Parser._get_multiple_answer(tag).answers,
+        )
+
+        # "NaN" isn't JSON, but the stdlib decoder (and so the parser)
+        # always accepted it:
+        tag.display_text.string = '{"type": "mcq", "score": NaN}'
+        self.assertFalse(Parser._is_multiple_answer(tag))
+
+
+class StreamingParserTestCase(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        assert os.path.isdir(DATA_DIR), "Data directory isn't exist!"
+
+        with open(
+                os.path.join(DATA_DIR, 'XML_Export_sample.xml')
+        ) as fo:
+            xml_export_sample = fo.read()
+
+        with open(
+                os.path.join(DATA_DIR, 'multiple_choice.xml')
+        ) as fo:
+            multiple_choice_xml = fo.read()
+
+        with open(
+                os.path.join(DATA_DIR, 'essay.xml')
+        ) as fo:
+            essay_xml = fo.read()
+
+        cls.xml = xml_export_sample.replace(
+            "<!--items (questions) go here...-->",
+            multiple_choice_xml + essay_xml,
+        ).encode()
+
+        cls.parser = StreamingParser(lambda: io.BytesIO(cls.xml))
+
+    def test_get_questions(self):
+        questions = list(self.parser.get_questions())
+
+        self.assertListEqual(
+            [type(question) for question in questions],
+            [MultipleChoice, Essay],
+            "Wrong questions!"
+        )
+
+    def test_get_questions_of_tests(self):
+        self.assertListEqual(
+            list(self.parser.get_questions(test_ids={'111'})),
+            [],
+            "Items of other tests must be skipped!"
+        )
+        self.assertEqual(
+            len(list(self.parser.get_questions(test_ids={'12345'}))),
+            2,
+        )
+        self.assertEqual(
+            len(list(Parser(self.xml).get_questions(test_ids={'111'}))),
+            0,
+        )
+
+    def test_same_questions_as_parser(self):
+        parser = Parser(self.xml)
+
+        for streamed, parsed in zip(self.parser.get_questions(),
+                                    parser.get_questions()):
+            self.assertEqual(streamed.text, parsed.text)
+            self.assertEqual(streamed.test_id, parsed.test_id)
+            self.assertEqual(streamed.item_id, parsed.item_id)
+
+    def test_get_questions_in_processes(self):
+        unknown_item = (
+            '<item id="9" type="Unknown"><display_text>Text</display_text>'
+            '</item>'
+        )
+        xml = self.xml.replace(b'</items>', unknown_item.encode() + b'</items>')
+        parser = StreamingParser(lambda: io.BytesIO(xml), processes=2,
+                                 chunk_size=1)
+
+        warnings.clear()
+        questions = list(parser.get_questions())
+
+        self.assertListEqual(
+            [question.item_id for question in questions],
+            [question.item_id for question in self.parser.get_questions()],
+        )
+        self.assertListEqual(
+            [warning['item_id'] for warning in warnings.pop_all()], ['9'])
+
+    def test_questionnaire_titles(self):
+        self.assertDictEqual(
+            self.parser.questionnaire_titles,
+            {
+                '111': 'Questionnaire 1',
+                '222': 'Questionnaire 2',
+                '333': 'Questionnaire 3',
+                '444': 'Questionnaire 4',
+            },
+            "Wrong questionnaire titles!"
+        )
+
+    def test_grades(self):
+        self.assertDictEqual(
+            self.parser.grades.test_ids,
+            {
+                "111": "1",
+                "222": "K",
+            },
+            "Wrong test_ids!"
+        )
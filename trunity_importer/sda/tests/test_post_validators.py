@@ -1,11 +1,14 @@
 from unittest import TestCase
 
 from trunity_importer.sda.question_containers import (
+    Essay,
     MultipleChoice,
     MultipleAnswer,
     Answer,
+    QuestionBatch,
 )
 from trunity_importer.sda.validators import post_validators
+from trunity_importer.sda.warnings import warnings
 
 
 class QuestionCheckersTestCase(TestCase):
@@ -106,3 +109,29 @@ class QuestionCheckersTestCase(TestCase):
                 )
             ),
         )
+
+    def test_batch_is_validated_like_questions(self):
+        warnings.clear()
+        questions = [
+            MultipleChoice('a', [self.true_anwer, self.true_anwer], None,
+                           '1', 1, 1),
+            MultipleAnswer('b', [self.true_anwer, self.false_answer], None,
+                           '1', 2, 2),
+            Essay('c', 'answer', None, '1', 3, 3),
+            MultipleAnswer('d', [self.false_answer], None, '1', 4, 4),
+        ]
+
+        self.assertListEqual(
+            [post_validators.validate(question) for question in questions],
+            [False, True, True, False],
+        )
+        question_warnings = warnings.pop_all()
+
+        batch = QuestionBatch.from_questions(questions)
+        self.assertListEqual(post_validators.validate_batch(batch),
+                             [False, True, True, False])
+        self.assertListEqual(warnings.pop_all(), question_warnings)
+        self.assertListEqual(question_warnings, [
+            {'item_id': 1, 'message': post_validators.NOT_ONE_TRUE_ANSWER},
+            {'item_id': 4, 'message': post_validators.ALL_FALSE_ANSWERS},
+        ])
@@ -0,0 +1,58 @@
+import pickle
+from unittest import TestCase
+
+from trunity_3_client.builders import Answer as BuilderAnswer
+
+from trunity_importer.sda.question_containers import (
+    Answer,
+    Essay,
+    MultipleChoice,
+    QuestionBatch,
+    QuestionType,
+)
+from trunity_importer.sda.validators.post_validators import validate_batch
+from trunity_importer.sda.warnings import warnings
+
+
+class QuestionContainersTestCase(TestCase):
+
+    def setUp(self):
+        self.questions = [
+            MultipleChoice('Ünïcode', [Answer('a', True, 1),
+                                       Answer('b', False, 0)],
+                           None, test_id='2', item_position=2, item_id=10),
+            Essay('Essay', 'Answer', None,
+                  test_id='1', item_position=1, item_id=11),
+            MultipleChoice('No correct', [Answer('a', False, 0)],
+                           None, test_id='2', item_position=1, item_id=12),
+        ]
+
+    def test_containers_have_no_dict(self):
+        for obj in [self.questions[0], self.questions[0].answers[0]]:
+            self.assertFalse(hasattr(obj, '__dict__'))
+
+        restored = pickle.loads(pickle.dumps(self.questions[0]))
+        self.assertEqual(restored.answers, self.questions[0].answers)
+
+    def test_answer_is_builder_answer(self):
+        self.assertEqual(Answer('a', True, 1, 'f'),
+                         BuilderAnswer('a', True, 1, 'f'))
+        self.assertEqual(BuilderAnswer('a', True, 1, 'f'),
+                         Answer('a', True, 1, 'f'))
+
+    def test_batch(self):
+        batch = QuestionBatch.from_questions(self.questions)
+
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(batch.text(0), 'Ünïcode')
+        self.assertEqual(batch.type(1), QuestionType.ESSAY)
+        self.assertEqual(batch.test_id(2), '2')
+        self.assertDictEqual(batch.group_by_test(), {'2': [2, 0], '1': [1]})
+
+    def test_validate_batch(self):
+        warnings.clear()
+        batch = QuestionBatch.from_questions(self.questions)
+
+        self.assertListEqual(validate_batch(batch), [True, True, False])
+        self.assertListEqual(
+            [warning['item_id'] for warning in warnings.pop_all()], [12])
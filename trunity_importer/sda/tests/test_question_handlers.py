@@ -1,6 +1,16 @@
+import io
 from unittest import TestCase
+from zipfile import ZipFile
 
-from trunity_importer.sda.question_handler import ImageSrcFixer
+from trunity_3_client.builders import Answer
+
+from trunity_importer.media import MediaUploader
+from trunity_importer.sda.question_containers import MultipleChoice
+from trunity_importer.sda.question_handler import (
+    ImageSrcFixer,
+    QuestionHandler,
+)
+from trunity_importer.tests.fakes import FakeFilesClient
 
 
 class ImageSrcFixerTestCase(TestCase):
@@ -12,3 +22,64 @@ class ImageSrcFixerTestCase(TestCase):
             "images/580404.gif",
             "Wrong image path for MultipleAnswer!"
         )
+
+
+class QuestionHandlerTestCase(TestCase):
+
+    def setUp(self):
+        zip_buffer = io.BytesIO()
+        with ZipFile(zip_buffer, 'w') as zip_file:
+            zip_file.writestr('images/1.gif', b'GIF89a 1')
+            zip_file.writestr('images/2.gif', b'GIF89a 2')
+            zip_file.writestr('media/12345.mp3', b'ID3')
+
+        self.files_client = FakeFilesClient()
+        zip_file = ZipFile(zip_buffer)
+        self.handler = QuestionHandler(
+            files_client=self.files_client,
+            zip_file=zip_file,
+            uploader=MediaUploader(self.files_client, zip_file, workers=4),
+        )
+
+    def test_handle_multiple_choice(self):
+        question = self.handler.handle(MultipleChoice(
+            text='<p><img src="images\\1"/></p>',
+            answers=[
+                Answer('<img src="images\\2"/>', True, 1),
+                Answer('<img src="images\\1"/>', False, 0),
+            ],
+            audio_file='12345.mp3',
+            test_id='123',
+            item_position=1,
+            item_id=12345,
+        ))
+
+        self.assertIn('https://cdn/12345.mp3', question.text)
+        self.assertIn('src="https://cdn/1.gif"', question.text)
+        self.assertIn('src="https://cdn/2.gif"', question.answers[0].text)
+        self.assertIn('src="https://cdn/1.gif"', question.answers[1].text)
+
+        # every file is uploaded once per question:
+        self.assertListEqual(
+            sorted(self.files_client.list.uploaded),
+            ['1.gif', '12345.mp3', '2.gif'],
+        )
+
+    def test_markup_is_kept(self):
+        question = self.handler.handle(MultipleChoice(
+            text='<p>Text <img src="images\\1" /></p>',
+            answers=[
+                Answer('<p>No image</p>', True, 1),
+            ],
+            audio_file=None,
+            test_id='123',
+            item_position=1,
+            item_id=12345,
+        ))
+
+        self.assertEqual(
+            question.text,
+            '<p>Text <img src="https://cdn/1.gif" style="padding: 5px;" /></p>',
+        )
+        # no <html><body> around fragments:
+        self.assertEqual(question.answers[0].text, '<p>No image</p>')
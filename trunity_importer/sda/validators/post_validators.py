@@ -3,68 +3,76 @@ Some items in XMl are "dirty". So we need to check questions for correctness.
 Thise validators check questions after parsing xml and before uploading
 them to Trunity.
 """
-from warnings import warn
+from typing import List
 from trunity_importer.sda.question_containers import (
     Question,
+    QuestionBatch,
     MultipleChoice,
     MultipleAnswer,
     QuestionType,
+    count_correct,
 )
 from trunity_importer.sda.warnings import warnings
 
+NOT_ONE_TRUE_ANSWER = "Question has not exactly one True answer!"
+ALL_FALSE_ANSWERS = "Question has all False answers!"
+
+# key: question type, value: check of the number of correct answers
+# and warning if it fails. Other questions are assumed to be correct.
+_RULES = {
+    QuestionType.MULTIPLE_CHOICE: (lambda count: count == 1,
+                                   NOT_ONE_TRUE_ANSWER),
+    QuestionType.MULTIPLE_ANSWER: (lambda count: count >= 1,
+                                   ALL_FALSE_ANSWERS),
+}
 
-def _all_answers_has_one_true(question: MultipleChoice) -> bool:
-    """
-    Return True if there are only one answer with True. False otherwise.
-    """
-    count_true = 0
 
-    for answer in question.answers:
-        if answer.correct is True:
-            count_true += 1
+def _check(question_type: str, correct_count: int, item_id: int) -> bool:
+    rule = _RULES.get(question_type)
+    if rule is None:
+        return True
 
-    if count_true == 1:
+    is_valid, message = rule
+    if is_valid(correct_count):
         return True
-    else:
-        warnings.add(
-            item_id=question.item_id,
-            message="Question has not exactly one True answer!",
-        )
 
-        return False
+    warnings.add(item_id=item_id, message=message)
+    return False
 
 
-def _all_answers_are_not_false(question: MultipleAnswer) -> bool:
+def _all_answers_has_one_true(question: MultipleChoice) -> bool:
     """
-    Return False if there all answers with True. False otherwise.
+    Return True if there are only one answer with True. False otherwise.
     """
-    count_true = 0
+    return _check(QuestionType.MULTIPLE_CHOICE,
+                  count_correct(question.answers), question.item_id)
 
-    for answer in question.answers:
-        if answer.correct is True:
-            count_true += 1
 
-    if count_true >= 1:
-        return True
-    else:
-        warnings.add(
-            item_id=question.item_id,
-            message="Question has all False answers!"
-        )
-
-        return False
+def _all_answers_are_not_false(question: MultipleAnswer) -> bool:
+    """
+    Return False if there all answers with True. False otherwise.
+    """
+    return _check(QuestionType.MULTIPLE_ANSWER,
+                  count_correct(question.answers), question.item_id)
 
 
 def validate(question: Question) -> bool:
     """
     Check question is correct or not.
     """
-    if question.type == QuestionType.MULTIPLE_CHOICE:
-        return _all_answers_has_one_true(question)
+    return _check(question.type,
+                  count_correct(getattr(question, 'answers', ())),
+                  question.item_id)
 
-    elif question.type == QuestionType.MULTIPLE_ANSWER:
-        return _all_answers_are_not_false(question)
 
-    else:
-        # for all other questions we assume they are correct:
-        return True
+def validate_batch(batch: QuestionBatch) -> List[bool]:
+    """
+    Check all questions of the batch at once, the same way as `validate`.
+    Return list of results, one per row.
+    """
+    return [
+        _check(QuestionBatch.TYPES[type_index], correct_count, item_id)
+        for type_index, correct_count, item_id in zip(
+            batch.types, batch.correct_counts, batch.item_ids)
+    ]
+
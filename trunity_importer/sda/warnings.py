@@ -1,3 +1,6 @@
+from typing import List
+
+
 class Warnings:
 
     def __init__(self):
@@ -9,6 +12,19 @@ class Warnings:
             "message": message,
         })
 
+    def pop_all(self) -> List[dict]:
+        """
+        Take all warnings away (to send them from worker process).
+        """
+        warnings, self._warnings = self._warnings, []
+        return warnings
+
+    def extend(self, warnings: List[dict]):
+        self._warnings.extend(warnings)
+
+    def clear(self):
+        self._warnings = []
+
     def print(self):
         print('\n')
         print("\033[1;33m" + "=" * 50)
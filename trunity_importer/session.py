@@ -0,0 +1,191 @@
+"""
+Authenticated requests sessions shared by all Trunity clients.
+"""
+import threading
+
+import requests
+from requests import Session
+from requests.adapters import HTTPAdapter
+from trunity_3_client.clients import auth
+from trunity_3_client.utils.url import Url
+
+DEFAULT_POOL_SIZE = 10
+
+
+def _is_replayable(body) -> bool:
+    """
+    False for iterable bodies: they can be read only once.
+    """
+    return body is None or isinstance(body, (bytes, str))
+
+
+class SessionManager(object):
+    """
+    Keep one auth token and one pool of keep-alive connections
+    for all Trunity clients (FilesClient, TopicsClient, ContentsClient,
+    Questionnaire...) of the process.
+
+    Expired token is renewed when Trunity answers 401 and the request
+    is sent again, so long imports are not interrupted. Streamed bodies
+    (see MultipartFile) are read already by then: such requests are not
+    sent again, their callers have to make a new body and retry
+    (see MediaUploader).
+
+    Use `SessionManager.for_creds` to get the manager of the user.
+    """
+
+    _managers = {}  # key: (username, password), value: SessionManager
+    _managers_lock = threading.Lock()
+
+    def __init__(self, username: str, password: str,
+                 pool_size: int=DEFAULT_POOL_SIZE):
+        """
+        :param pool_size: max number of kept-alive connections per host.
+            Use at least the number of threads sending requests.
+        """
+        self._username = username
+        self._password = password
+        self._pool_size = pool_size
+
+        self._lock = threading.Lock()
+        self._auth_token = None
+        self._adapter = self._make_adapter(pool_size)
+
+        # authentication and requests sent again go through it:
+        self._auth_session = self._make_session(renew_token=False)
+
+        # key: content type, value: Session
+        self._sessions = {}
+
+    @classmethod
+    def for_creds(cls, username: str, password: str,
+                  pool_size: int=DEFAULT_POOL_SIZE) -> 'SessionManager':
+        """
+        Manager shared by everybody in the process who uses these creds.
+        """
+        with cls._managers_lock:
+            manager = cls._managers.get((username, password))
+
+            if manager is None:
+                manager = cls._managers[(username, password)] = cls(
+                    username, password, pool_size=pool_size)
+
+        manager.ensure_pool_size(pool_size)
+        return manager
+
+    @staticmethod
+    def _make_adapter(pool_size: int) -> HTTPAdapter:
+        return HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+
+    def _make_session(self, content_type: str=None,
+                      renew_token: bool=True) -> Session:
+        session = requests.session()
+        session.mount('http://', self._adapter)
+        session.mount('https://', self._adapter)
+        session.headers['Accept'] = 'application/json'
+        if content_type:
+            session.headers['Content-Type'] = content_type
+
+        if renew_token:
+            session.hooks['response'].append(self._renew_token_on_401)
+        return session
+
+    def ensure_pool_size(self, pool_size: int):
+        """
+        Grow connection pool to `pool_size` connections.
+        """
+        with self._lock:
+            if pool_size <= self._pool_size:
+                return
+
+            self._pool_size = pool_size
+            self._adapter = self._make_adapter(pool_size)
+
+            for session in [self._auth_session, *self._sessions.values()]:
+                session.mount('http://', self._adapter)
+                session.mount('https://', self._adapter)
+
+    def _get_auth_url(self) -> str:
+        # read at call time, API root may be changed by set_api_root:
+        url = Url(auth.API_ROOT)
+        url.tail = 'authorization'
+        return url.list
+
+    def _authenticate(self) -> str:
+        response = self._auth_session.post(self._get_auth_url(), data={
+            'login': self._username,
+            'password': self._password,
+        })
+        response.raise_for_status()
+        return response.json()['auth_token']
+
+    @property
+    def auth_token(self) -> str:
+        with self._lock:
+            if self._auth_token is None:
+                self._set_auth_token(self._authenticate())
+
+            return self._auth_token
+
+    def _set_auth_token(self, auth_token: str):
+        self._auth_token = auth_token
+
+        for session in self._sessions.values():
+            session.headers['Authorization'] = auth_token
+
+    def authenticate(self) -> str:
+        """
+        Check the creds. Raise HTTPError if Trunity doesn't accept them.
+        """
+        return self.auth_token
+
+    def renew_token(self, expired_token: str) -> str:
+        """
+        Get new token unless another thread has done it already.
+        """
+        with self._lock:
+            if self._auth_token in (None, expired_token):
+                self._set_auth_token(self._authenticate())
+
+            return self._auth_token
+
+    def session(self, content_type: str=None) -> Session:
+        """
+        Authenticated session. Sessions with the same content type are
+        the same object.
+        """
+        self.authenticate()
+
+        with self._lock:
+            session = self._sessions.get(content_type)
+
+            if session is None:
+                session = self._sessions[content_type] = \
+                    self._make_session(content_type)
+                session.headers['Authorization'] = self._auth_token
+
+            return session
+
+    def _renew_token_on_401(self, response, **kwargs):
+        expired_token = response.request.headers.get('Authorization')
+
+        if response.status_code != 401 or expired_token is None:
+            return response
+
+        auth_token = self.renew_token(expired_token)
+
+        # release the connection back to the pool:
+        response.content
+        response.close()
+
+        if not _is_replayable(response.request.body):
+            return response
+
+        request = response.request.copy()
+        request.headers['Authorization'] = auth_token
+        # the request is sent again only once:
+        request.hooks = {'response': []}
+
+        new_response = self._auth_session.send(request, **kwargs)
+        new_response.history.insert(0, response)
+        return new_response
@@ -0,0 +1,25 @@
+"""
+Fake Trunity clients shared by tests.
+"""
+
+
+class FakeFilesListClient(object):
+
+    def __init__(self, base_url: str='https://cdn/'):
+        """
+        :param base_url: CDN url of a file is base url + its name.
+        """
+        self.base_url = base_url
+        self.uploaded = []  # names of uploaded files, with duplicates
+        self.contents = {}  # key: file name, value: uploaded bytes
+
+    def post(self, file_obj) -> str:
+        self.contents[file_obj.name] = file_obj.read()
+        self.uploaded.append(file_obj.name)
+        return self.base_url + file_obj.name
+
+
+class FakeFilesClient(object):
+
+    def __init__(self, base_url: str='https://cdn/'):
+        self.list = FakeFilesListClient(base_url)
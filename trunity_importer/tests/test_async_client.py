@@ -0,0 +1,149 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from zipfile import ZipFile
+
+import aiohttp
+from trunity_3_client.utils.url import API_ROOT
+
+from trunity_importer.async_client import (
+    AsyncClient,
+    AsyncMediaUploader,
+    AsyncQuestionnaire,
+)
+from trunity_importer.fake_server import FakeTrunity, serve_in_thread
+from trunity_importer.journal import Journal
+from trunity_importer.sda import AsyncImporter
+from trunity_importer.topic_mapping import TopicMapping
+from trunity_importer.utils import set_api_root
+
+SDA_EXPORT = """<?xml version="1.0" encoding="utf-8"?>
+<object-bank>
+<items>
+<item id="1" type="MultipleChoice">
+<display_text><![CDATA[<p>Question <img src="images\\1"/></p>]]></display_text>
+<distractors>
+<distractor is_correct="True"><rationale><![CDATA[<p>Yes</p>]]></rationale>
+<display_text><![CDATA[<p>Answer 1</p>]]></display_text></distractor>
+<distractor is_correct="False"><rationale><![CDATA[<p>No</p>]]></rationale>
+<display_text><![CDATA[<p>Answer 2</p>]]></display_text></distractor>
+</distractors>
+<test_usage><test_info test_id="10" item_position="1"/></test_usage>
+<media_files><media_file id="1.mp3" mime_type="audio/mpeg"/></media_files>
+</item>
+</items>
+<tests>
+<test test_id="10" test_name="Test" activity_reference="SCIDIM_NA18E_OLA_G05U01L00_0001"/>
+</tests>
+</object-bank>
+"""
+
+
+class AsyncClientTestCase(TestCase):
+
+    def setUp(self):
+        self.app = FakeTrunity()
+        self.server, api_root = serve_in_thread(self.app)
+        set_api_root(api_root)
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.zip_path = os.path.join(self.tmp_dir, 'export.zip')
+
+        with ZipFile(self.zip_path, 'w') as zip_file:
+            zip_file.writestr('XML_Export_0001.xml', SDA_EXPORT)
+            zip_file.writestr('images/1.gif', b'image')
+            zip_file.writestr('images/copy.gif', b'image')
+            zip_file.writestr('media/1.mp3', b'audio')
+
+    def tearDown(self):
+        set_api_root(API_ROOT)
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_requests(self):
+        journal = Journal()
+
+        async def run():
+            async with AsyncClient('user', 'password', limit=4) as client:
+                topic_id = await client.create_topic(1, 'Topic')
+                pool_id = await client.create_qst_pool(1, 'Pool', topic_id)
+
+                with ZipFile(self.zip_path) as zip_file:
+                    uploader = AsyncMediaUploader(
+                        client, zip_file, journal=journal)
+                    urls = await uploader.upload_many(
+                        ['images/1.gif', 'images/copy.gif', 'images/1.gif'])
+
+                questionnaire = AsyncQuestionnaire(journal, key='pool')
+                questionnaire.add_essay('Text', correct_answer='Answer', score=1)
+                await questionnaire.upload_async(client, pool_id)
+
+            return urls
+
+        urls = asyncio.run(run())
+
+        # files with the same content are uploaded once:
+        self.assertEqual(urls['images/1.gif'], urls['images/copy.gif'])
+        self.assertTrue(journal.is_done(Journal.QUESTIONNAIRE, 'pool'))
+        self.assertDictEqual(
+            self.app.stats.to_dict()['requests'],
+            {
+                'authorization': 1,
+                'topics': 1,
+                'contents': 1,
+                'remote_files': 1,
+                'questions': 1,
+            },
+        )
+
+    def test_expired_token(self):
+        self.app.token_ttl = 0
+
+        async def run():
+            async with AsyncClient('user', 'password') as client:
+                await client.create_topic(1, 'Topic')
+
+        with self.assertRaises(aiohttp.ClientResponseError) as context:
+            asyncio.run(run())
+
+        self.assertEqual(context.exception.status, 401)
+        # token is renewed once:
+        self.assertEqual(
+            self.app.stats.to_dict()['requests']['authorization'], 2)
+
+    def test_token_is_renewed_once(self):
+        self.app.token_ttl = 0.5
+
+        async def run():
+            # the fake server's listen queue is short:
+            async with AsyncClient('user', 'password', limit=4) as client:
+                await asyncio.sleep(0.6)
+                await asyncio.gather(
+                    *(client.create_topic(1, 'Topic') for _ in range(20)))
+
+        asyncio.run(run())
+
+        requests = self.app.stats.to_dict()['requests']
+        # every request is sent again once, with the new token:
+        self.assertEqual(requests['topics'], 2 * 20)
+        # requests sent with the expired token wait for one renewal:
+        self.assertEqual(requests['authorization'], 2)
+
+    def test_sda_import(self):
+        AsyncImporter(
+            'user', 'password', book_id=1, path_to_zip=self.zip_path,
+        ).perform_import(topic_mapping=TopicMapping())
+
+        self.assertDictEqual(
+            self.app.stats.to_dict()['requests'],
+            {
+                'authorization': 1,
+                'remote_files': 2,
+                'contents': 1,
+                'questions': 1,
+            },
+        )
+
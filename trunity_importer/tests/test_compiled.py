@@ -0,0 +1,258 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from typing import List
+from unittest import TestCase
+from zipfile import ZipFile
+
+from trunity_3_client.utils.url import API_ROOT
+
+from trunity_importer.compiled import (
+    ArtifactError,
+    ArtifactReader,
+    ArtifactWriter,
+    Pusher,
+    find_placeholders,
+    media_placeholder,
+    resolve_placeholders,
+)
+from trunity_importer.fake_server import FakeTrunity, serve_in_thread
+from trunity_importer.journal import Journal
+from trunity_importer.qti.importer import BaseImporter as QtiImporter
+from trunity_importer.qti.parsers import Question as QtiQuestion
+from trunity_importer.qti.tests.test_parser import DATA_DIR as QTI_DATA_DIR
+from trunity_importer.sda.compiler import Compiler
+from trunity_importer.sda.question_containers import Answer, MultipleChoice
+from trunity_importer.sda.question_handler import QuestionHandler
+from trunity_importer.sda.tests.test_ordering import make_xml
+from trunity_importer.tests.fakes import FakeFilesClient
+from trunity_importer.topic_mapping import TopicMapping
+from trunity_importer.upload_cache import chunks_content_hash
+from trunity_importer.utils import set_api_root
+
+IMAGE = b'GIF89a' + b'1' * 100
+
+
+class ArtifactTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.zip_path = os.path.join(self.tmp_dir, 'export.zip')
+
+        with ZipFile(self.zip_path, 'w') as zip_file:
+            zip_file.writestr('images/1.gif', IMAGE)
+            zip_file.writestr('images/copy.gif', IMAGE)
+
+        self.zip_file = ZipFile(self.zip_path)
+
+    def tearDown(self):
+        self.zip_file.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def write(self, path: str):
+        with ArtifactWriter(path, 'sda', self.zip_file) as writer:
+            placeholder = writer.add_media('images/1.gif')
+            # the same content is written once:
+            self.assertEqual(writer.add_media('images/copy.gif'), placeholder)
+
+            text = '<img src="{}">'.format(placeholder)
+            writer.write_pool('1', 'Pool', [{'type': 'essay', 'text': text}],
+                              test_id='1', test_title='Pool')
+
+        return placeholder
+
+    def test_roundtrip(self):
+        for name in ['artifact.jsonl', 'artifact.jsonl.gz']:
+            path = os.path.join(self.tmp_dir, name)
+            placeholder = self.write(path)
+
+            reader = ArtifactReader(path)
+            self.assertEqual(reader.source, 'sda')
+            self.assertEqual(reader.summary['pools'], 1)
+            self.assertEqual(reader.summary['questions'], 1)
+
+            media, pool = [json.loads(line) for line in reader]
+            self.assertEqual(media['record'], 'media')
+            self.assertEqual(media['hash'], chunks_content_hash([IMAGE]))
+            self.assertEqual(pool['test_title'], 'Pool')
+            self.assertIn(placeholder, pool['questions'][0]['text'])
+
+    def test_incomplete(self):
+        path = os.path.join(self.tmp_dir, 'artifact.jsonl')
+
+        with self.assertRaises(RuntimeError):
+            with ArtifactWriter(path, 'sda', self.zip_file):
+                raise RuntimeError("compilation has failed")
+
+        with self.assertRaises(ArtifactError):
+            ArtifactReader(path)
+
+    def test_not_an_artifact(self):
+        path = os.path.join(self.tmp_dir, 'journal.jsonl')
+        with open(path, 'w') as file_obj:
+            file_obj.write('{"kind": "media", "key": "a", "value": "b"}\n')
+
+        with self.assertRaises(ArtifactError):
+            ArtifactReader(path)
+
+    def test_resolve_placeholders(self):
+        digest = 'a' * 64
+        line = json.dumps({'text': '<img src="{0}"><img src="{0}">'.format(
+            media_placeholder(digest))})
+
+        self.assertListEqual(find_placeholders(line), [digest])
+
+        resolved = json.loads(resolve_placeholders(
+            line, {digest: 'https://cdn/"1".gif?a=1&b=2'}))
+        self.assertEqual(
+            resolved['text'],
+            '<img src="https://cdn/&quot;1&quot;.gif?a=1&amp;b=2">' * 2,
+        )
+
+
+class PlaceholderHtmlTestCase(TestCase):
+    """
+    Compile and push give the same html as direct import.
+    """
+    BASE_URL = 'https://cdn/get?a=1&name='
+
+    def setUp(self):
+        zip_buffer = io.BytesIO()
+        with ZipFile(zip_buffer, 'w') as zip_file:
+            zip_file.writestr('images/1.gif', IMAGE)
+            zip_file.writestr('media/12345.mp3', b'ID3')
+            zip_file.writestr('testitems/SFNAT_OA_G1_CT_A_Q20.mp3', b'ID3')
+            zip_file.writestr(
+                'testitems/SCI_NM12_OAR_G01U00L00_A_EN1_Q07_S7.jpg', IMAGE)
+
+        self.zip_file = ZipFile(zip_buffer)
+
+    def get_url(self, name: str) -> str:
+        return self.BASE_URL + os.path.basename(name)
+
+    @staticmethod
+    def get_digest(name: str) -> str:
+        return hashlib.sha256(name.encode()).hexdigest()
+
+    def resolve(self, html: str, names: List[str]) -> str:
+        line = json.dumps({'text': html})
+        return json.loads(resolve_placeholders(line, {
+            self.get_digest(name): self.get_url(name) for name in names
+        }))['text']
+
+    @staticmethod
+    def make_sda_question() -> MultipleChoice:
+        return MultipleChoice(
+            text='<p><img src="images\\1"/></p>',
+            answers=[Answer('<p>a</p>', True, 1)],
+            audio_file='12345.mp3',
+            test_id='1', item_position=1, item_id=1,
+        )
+
+    def test_sda(self):
+        handler = QuestionHandler(files_client=FakeFilesClient(self.BASE_URL),
+                                  zip_file=self.zip_file)
+        direct = handler.handle(self.make_sda_question()).text
+
+        handler = QuestionHandler(files_client=None, zip_file=self.zip_file)
+        plan = handler.plan_media(self.make_sda_question())
+        compiled = handler.apply_media(plan, {
+            name: media_placeholder(self.get_digest(name))
+            for name in plan.media
+        }).text
+
+        self.assertIn('get?a=1&amp;name=1.gif', direct)
+        self.assertIn('get?a=1&amp;name=12345.mp3', direct)
+        self.assertEqual(self.resolve(compiled, plan.media), direct)
+
+    def test_qti(self):
+        with open(os.path.join(QTI_DATA_DIR,
+                               'question_with_flash_object.xml')) as fo:
+            xml = fo.read()
+
+        question = QtiQuestion.from_xml(xml)
+        names = QtiImporter._get_media(question._soup)
+        direct = str(QtiImporter._apply_media(
+            question._soup, {name: self.get_url(name) for name in names}))
+
+        question = QtiQuestion.from_xml(xml)
+        compiled = str(QtiImporter._apply_media(question._soup, {
+            name: media_placeholder(self.get_digest(name)) for name in names
+        }))
+
+        self.assertIn('get?a=1&amp;name=SFNAT_OA_G1_CT_A_Q20.mp3', direct)
+        self.assertEqual(self.resolve(compiled, names), direct)
+
+
+class PusherTestCase(TestCase):
+
+    def setUp(self):
+        self.app = FakeTrunity()
+        self.server, api_root = serve_in_thread(self.app)
+        set_api_root(api_root)
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.zip_path = os.path.join(self.tmp_dir, 'export.zip')
+        self.artifact_path = os.path.join(self.tmp_dir, 'artifact.jsonl')
+        self.journal_path = os.path.join(self.tmp_dir, 'journal.jsonl')
+
+        xml = make_xml().replace(
+            b'<p>Text 1</p>', b'<p>Text 1 <img src="images\\1"/></p>')
+        with ZipFile(self.zip_path, 'w') as zip_file:
+            zip_file.writestr('XML_Export_0001.xml', xml)
+            zip_file.writestr('images/1.gif', IMAGE)
+
+        writer = Compiler(self.zip_path).compile(self.artifact_path)
+        self.assertEqual(writer.pools, 2)
+        self.assertEqual(writer.questions, 6)
+
+    def tearDown(self):
+        set_api_root(API_ROOT)
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def push(self, **kwargs) -> Pusher:
+        # sessions are shared by creds, tokens of other servers are no good:
+        pusher = Pusher(
+            self.id(), 'password', book_id=1,
+            artifact_path=self.artifact_path, path_to_zip=self.zip_path,
+            journal_path=self.journal_path, **kwargs
+        )
+        pusher.perform_push(topic_mapping=TopicMapping())
+        return pusher
+
+    def test_push(self):
+        pusher = self.push()
+
+        requests = self.app.stats.to_dict()['requests']
+        self.assertEqual(requests['contents'], 2)
+        self.assertEqual(requests['questions'], 6)
+        self.assertEqual(requests['remote_files'], 1)
+
+        self.assertTrue(pusher._journal.get(
+            Journal.MEDIA, 'images/1.gif').startswith('http'))
+        for test_id in ['1', '2']:
+            self.assertTrue(
+                pusher._journal.is_done(Journal.QUESTIONNAIRE, test_id))
+
+    def test_resume(self):
+        self.push()
+        self.app.stats.reset()
+
+        self.push(resume=True)
+
+        # everything is pushed already (and the session is logged in):
+        self.assertEqual(self.app.stats.to_dict()['total_requests'], 0)
+
+    def test_dry_run(self):
+        plan = self.push(dry_run=True).get_plan()
+
+        self.assertEqual(self.app.stats.to_dict()['total_requests'], 0)
+        self.assertFalse(os.path.exists(self.journal_path))
+        self.assertEqual(plan.pools, 2)
+        self.assertDictEqual(plan.questions, {'essay': 6})
+        self.assertEqual(plan.uploads, 1)
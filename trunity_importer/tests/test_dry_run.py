@@ -0,0 +1,56 @@
+import io
+from unittest import TestCase
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from trunity_3_client.clients.endpoints.questions import QuestionsClient
+
+from trunity_importer.dry_run import (
+    DryRunPlan,
+    DryRunUploader,
+    RecordingSession,
+)
+from trunity_importer.multipart import StreamingFilesClient
+from trunity_importer.utils import create_qst_pool
+
+
+class DryRunTestCase(TestCase):
+
+    def setUp(self):
+        zip_buffer = io.BytesIO()
+        with ZipFile(zip_buffer, 'w', ZIP_DEFLATED) as zip_file:
+            zip_file.writestr('images/1.gif', b'1' * 1000)
+            zip_file.writestr('images/copy.gif', b'1' * 1000)
+            zip_file.writestr('images/2.gif', b'2' * 500)
+
+        self.zip_file = ZipFile(zip_buffer)
+        self.session = RecordingSession()
+
+    def test_uploads_are_deduplicated(self):
+        uploader = DryRunUploader(StreamingFilesClient(self.session),
+                                  self.zip_file)
+        cdn_file_urls = uploader.upload_many(
+            ['images/1.gif', 'images/copy.gif', 'images/2.gif'])
+        uploader.close()
+
+        self.assertEqual(cdn_file_urls['images/1.gif'],
+                         cdn_file_urls['images/copy.gif'])
+        self.assertEqual(self.session.requests['remote_files'], 2)
+        # multipart bodies with the files in them:
+        self.assertGreater(self.session.bytes_sent['remote_files'], 1500)
+
+    def test_plan(self):
+        pool_id = create_qst_pool(self.session, site_id=1,
+                                  content_title='Pool')
+        questions_client = QuestionsClient(self.session)
+        questions_client.create_essay(pool_id, 'Text', 'Answer', score=1)
+        questions_client.create_essay(pool_id, 'Text', 'Answer', score=1)
+
+        plan = DryRunPlan(self.session, parallel=2)
+        self.assertEqual(plan.pools, 1)
+        self.assertDictEqual(plan.questions, {'essay': 2})
+        self.assertEqual(plan.uploads, 0)
+        self.assertGreater(plan.total_bytes, 0)
+
+        # 3 requests by 1 second in 2 threads, bytes take no time:
+        self.assertAlmostEqual(
+            plan.estimate_seconds(latency=1.0, bandwidth=float('inf')), 1.5)
@@ -0,0 +1,83 @@
+import io
+from unittest import TestCase
+
+from requests import HTTPError
+from trunity_3_client import (
+    initialize_session_from_creds,
+    ContentsClient,
+    ContentType,
+    FilesClient,
+    ResourceType,
+    TopicsClient,
+)
+from trunity_3_client.builders import Answer, Questionnaire
+from trunity_3_client.utils.url import API_ROOT
+
+from trunity_importer.fake_server import FakeTrunity, serve_in_thread
+from trunity_importer.utils import set_api_root
+
+
+class FakeServerTestCase(TestCase):
+
+    def setUp(self):
+        self.app = FakeTrunity()
+        self.server, api_root = serve_in_thread(self.app)
+        set_api_root(api_root)
+
+        self.session = initialize_session_from_creds('user', 'password')
+
+    def tearDown(self):
+        set_api_root(API_ROOT)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_endpoints(self):
+        topic_id = TopicsClient(self.session).list.post(1, 'Topic')
+        content_id = ContentsClient(self.session).list.post(
+            site_id=1,
+            content_title='Question Pool',
+            content_type=ContentType.QUESTIONNAIRE,
+            topic_id=topic_id,
+            resource_type=ResourceType.QUESTION_POOL,
+        )
+
+        file_obj = io.BytesIO(b'x' * 1000)
+        file_obj.name = 'image.gif'
+        file_url = FilesClient(self.session).list.post(file_obj=file_obj)
+        self.assertTrue(file_url.startswith('http://'))
+
+        json_session = initialize_session_from_creds(
+            'user', 'password', content_type='application/json')
+        questionnaire = Questionnaire(json_session)
+        questionnaire.add_multiple_choice(
+            'Text', [Answer('Answer', True, 1)])
+        questionnaire.upload(content_id)
+
+        stats = self.app.stats.to_dict()
+        self.assertDictEqual(
+            stats['requests'],
+            {
+                'authorization': 2,
+                'topics': 1,
+                'contents': 1,
+                'remote_files': 1,
+                'questions': 1,
+            },
+        )
+        self.assertGreater(stats['bytes_received'], 1000)
+
+    def test_error_injection(self):
+        self.app.error_rate = 1.0
+
+        with self.assertRaises(HTTPError) as context:
+            TopicsClient(self.session).list.post(1, 'Topic')
+
+        self.assertEqual(context.exception.response.status_code, 503)
+
+    def test_expired_token(self):
+        self.app.token_ttl = 0
+
+        with self.assertRaises(HTTPError) as context:
+            TopicsClient(self.session).list.post(1, 'Topic')
+
+        self.assertEqual(context.exception.response.status_code, 401)
@@ -0,0 +1,74 @@
+from unittest import TestCase
+
+from bs4 import BeautifulSoup
+
+from trunity_importer.html_rewriter import (
+    ImageRewriter,
+    has_images,
+    iter_images,
+)
+
+FRAGMENTS = [
+    '<p>Look at <IMG SRC="images\\1" alt="a > b"/> and '
+    "<img class='x' src='images\\2' style=\"width: 10px\">.</p>",
+    '<p>No images, <b>bold</b> &amp; <i>unclosed',
+    '<!-- <img src="commented"> --><img\n  src=images\\3 >'
+    '<img alt="no src">',
+    '<p><img src="https://cdn.example.com/a.gif?b=1&amp;c=2"></p>',
+]
+
+
+class HtmlRewriterTestCase(TestCase):
+
+    def test_has_images(self):
+        self.assertTrue(has_images(FRAGMENTS[0]))
+        self.assertFalse(has_images(FRAGMENTS[1]))
+        self.assertFalse(has_images(''))
+        self.assertFalse(has_images(None))
+
+    def test_srcs_are_the_same_as_with_beautiful_soup(self):
+        for fragment in FRAGMENTS:
+            soup = BeautifulSoup(fragment, 'lxml')
+            self.assertListEqual(
+                [image.src for image in iter_images(fragment)],
+                [img['src'] for img in soup.find_all('img') if img.get('src')],
+            )
+
+    def test_rewrite(self):
+        rewriter = ImageRewriter(FRAGMENTS)
+        self.assertListEqual(rewriter.srcs, [
+            'images\\1', 'images\\2', 'images\\3',
+            'https://cdn.example.com/a.gif?b=1&c=2',
+        ])
+
+        fragments = rewriter.rewrite(
+            ['https://cdn/1.gif', 'https://cdn/2.gif', 'https://cdn/3.gif',
+             'https://cdn/a.gif?b=1&c=2'],
+            style='padding: 5px;',
+        )
+
+        self.assertEqual(
+            fragments[0],
+            '<p>Look at <IMG src="https://cdn/1.gif" alt="a > b" '
+            'style="padding: 5px;"/> and <img class=\'x\' '
+            'src="https://cdn/2.gif" style="padding: 5px;">.</p>',
+        )
+        # the rest of the markup is untouched:
+        self.assertIs(fragments[1], FRAGMENTS[1])
+        self.assertEqual(
+            fragments[2],
+            '<!-- <img src="commented"> --><img\n  src="https://cdn/3.gif" '
+            'style="padding: 5px;" ><img alt="no src">',
+        )
+        self.assertEqual(
+            fragments[3],
+            '<p><img src="https://cdn/a.gif?b=1&amp;c=2" '
+            'style="padding: 5px;"></p>',
+        )
+
+    def test_no_images(self):
+        rewriter = ImageRewriter(['<p>text</p>', ''])
+
+        self.assertFalse(rewriter)
+        self.assertListEqual(rewriter.srcs, [])
+        self.assertListEqual(rewriter.rewrite([]), ['<p>text</p>', ''])
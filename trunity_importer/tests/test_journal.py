@@ -0,0 +1,80 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from trunity_importer.journal import Journal
+
+
+class JournalTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'journal.jsonl')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_resume(self):
+        journal = Journal(self.path)
+        journal.add(Journal.MEDIA, 'images/1.gif', 'https://cdn/1.gif')
+        journal.add(Journal.QUESTIONNAIRE, '111')
+        journal.close()
+
+        # the last line is cut, as if the process was killed:
+        with open(self.path, 'a') as fo:
+            fo.write('{"kind": "pool", "ke')
+
+        journal = Journal(self.path, resume=True)
+        self.assertEqual(
+            journal.get(Journal.MEDIA, 'images/1.gif'), 'https://cdn/1.gif')
+        self.assertTrue(journal.is_done(Journal.QUESTIONNAIRE, '111'))
+        self.assertFalse(journal.is_done(Journal.QUESTIONNAIRE, '222'))
+
+        journal.add(Journal.QUESTIONNAIRE, '222')
+        journal.close()
+
+        journal = Journal(self.path, resume=True)
+        self.assertTrue(journal.is_done(Journal.QUESTIONNAIRE, '222'))
+        journal.close()
+
+    def test_journal_is_truncated_without_resume(self):
+        journal = Journal(self.path)
+        journal.add(Journal.QUESTIONNAIRE, '111')
+        journal.close()
+
+        journal = Journal(self.path)
+        self.assertFalse(journal.is_done(Journal.QUESTIONNAIRE, '111'))
+        journal.close()
+
+    def test_read_only(self):
+        journal = Journal(self.path)
+        journal.add(Journal.QUESTIONNAIRE, '111')
+        journal.close()
+
+        journal = Journal(self.path, resume=True, read_only=True)
+        self.assertTrue(journal.is_done(Journal.QUESTIONNAIRE, '111'))
+        journal.add(Journal.QUESTIONNAIRE, '222')
+        self.assertTrue(journal.is_done(Journal.QUESTIONNAIRE, '222'))
+        journal.close()
+
+        # nothing is written, the file isn't truncated either:
+        journal = Journal(self.path, read_only=True)
+        journal.close()
+        journal = Journal(self.path, resume=True)
+        self.assertTrue(journal.is_done(Journal.QUESTIONNAIRE, '111'))
+        self.assertFalse(journal.is_done(Journal.QUESTIONNAIRE, '222'))
+        journal.close()
+
+    def test_get_or_create(self):
+        journal = Journal()
+        calls = []
+
+        def create():
+            calls.append(1)
+            return 'pool-id'
+
+        self.assertEqual(
+            journal.get_or_create(Journal.POOL, '111', create), 'pool-id')
+        self.assertEqual(
+            journal.get_or_create(Journal.POOL, '111', create), 'pool-id')
+        self.assertEqual(len(calls), 1)
@@ -0,0 +1,112 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from trunity_importer.metrics import BUCKETS, Metrics, metrics
+from trunity_importer.sda.parser import StreamingParser
+from trunity_importer.sda.tests.test_ordering import ITEMS, make_xml
+
+
+class MetricsTestCase(TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics()
+
+    def test_observe(self):
+        self.metrics.observe('upload', 0.002, size=100)
+        self.metrics.observe('upload', 20.0, size=50, error=True)
+
+        upload = self.metrics.to_dict()['upload']
+        self.assertEqual(upload['count'], 2)
+        self.assertEqual(upload['errors'], 1)
+        self.assertEqual(upload['bytes'], 150)
+        self.assertEqual(upload['max_seconds'], 20.0)
+        # 0.002 is in the second bucket, 20 is above all of them:
+        self.assertEqual(upload['buckets'][1], 1)
+        self.assertEqual(upload['buckets'][-1], 1)
+        self.assertEqual(len(upload['buckets']), len(BUCKETS) + 1)
+
+    def test_timer(self):
+        with self.metrics.timer('parse', size=10):
+            pass
+
+        with self.assertRaises(KeyError):
+            with self.metrics.timer('parse'):
+                raise KeyError('item')
+
+        parse = self.metrics.to_dict()['parse']
+        self.assertEqual(parse['count'], 2)
+        self.assertEqual(parse['errors'], 1)
+        self.assertEqual(parse['bytes'], 10)
+
+    def test_pop_all_and_merge(self):
+        self.metrics.observe('parse', 0.1)
+        popped = self.metrics.pop_all()
+        self.assertDictEqual(self.metrics.to_dict(), {})
+
+        self.metrics.observe('parse', 0.2)
+        self.metrics.merge(popped)
+        self.metrics.merge(popped)
+
+        parse = self.metrics.to_dict()['parse']
+        self.assertEqual(parse['count'], 3)
+        self.assertAlmostEqual(parse['seconds'], 0.4)
+        self.assertEqual(sum(parse['buckets']), 3)
+
+    def test_prometheus(self):
+        self.metrics.observe('upload', 0.002, size=100)
+        self.metrics.observe('upload', 0.3)
+
+        lines = self.metrics.to_prometheus().splitlines()
+
+        self.assertIn('# TYPE trunity_importer_stage_seconds histogram', lines)
+        # buckets are cumulative:
+        self.assertIn('trunity_importer_stage_seconds_bucket'
+                      '{stage="upload",le="0.001"} 0', lines)
+        self.assertIn('trunity_importer_stage_seconds_bucket'
+                      '{stage="upload",le="0.005"} 1', lines)
+        self.assertIn('trunity_importer_stage_seconds_bucket'
+                      '{stage="upload",le="+Inf"} 2', lines)
+        self.assertIn('trunity_importer_stage_seconds_count'
+                      '{stage="upload"} 2', lines)
+        self.assertIn('trunity_importer_stage_bytes_total'
+                      '{stage="upload"} 100', lines)
+        self.assertIn('trunity_importer_stage_errors_total'
+                      '{stage="upload"} 0', lines)
+
+    def test_write(self):
+        self.metrics.observe('pool_create', 0.05)
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+
+        json_path = os.path.join(tmp_dir, 'metrics.json')
+        self.metrics.write(json_path)
+        with open(json_path) as file_obj:
+            data = json.load(file_obj)
+        self.assertEqual(data['stages']['pool_create']['count'], 1)
+        self.assertListEqual(data['buckets'], list(BUCKETS))
+
+        prom_path = os.path.join(tmp_dir, 'metrics.prom')
+        self.metrics.write(prom_path)
+        with open(prom_path) as file_obj:
+            self.assertIn('stage="pool_create"', file_obj.read())
+
+
+class ParserMetricsTestCase(TestCase):
+
+    def setUp(self):
+        metrics.clear()
+        self.addCleanup(metrics.clear)
+
+    def test_worker_metrics_are_merged(self):
+        xml = make_xml()
+        parser = StreamingParser(lambda: io.BytesIO(xml), processes=2,
+                                 chunk_size=2)
+        list(parser.get_questions())
+
+        stages = metrics.to_dict()
+        self.assertEqual(stages['validate']['count'], len(ITEMS))
+        self.assertEqual(stages['parse']['count'], len(ITEMS))
@@ -0,0 +1,196 @@
+import asyncio
+import email.parser
+import io
+import os
+import shutil
+import tempfile
+from unittest import TestCase, mock
+from zipfile import BadZipFile, ZipFile, ZIP_DEFLATED, ZIP_STORED
+
+from trunity_3_client.utils.url import API_ROOT
+
+from trunity_importer.async_client import AsyncClient, AsyncMediaUploader
+from trunity_importer.fake_server import FakeTrunity, serve_in_thread
+from trunity_importer.multipart import (
+    MappedMember,
+    MultipartFile,
+    StreamingFilesClient,
+    hash_member,
+    iter_member,
+    open_member,
+)
+from trunity_importer.session import SessionManager
+from trunity_importer.upload_cache import content_hash
+from trunity_importer.utils import set_api_root
+
+CONTENT = bytes(range(256)) * 1000
+
+
+class OpenMemberTestCase(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.zip_path = os.path.join(self.tmp_dir, 'media.zip')
+
+        with ZipFile(self.zip_path, 'w') as zip_file:
+            zip_file.writestr('media/stored.mp3', CONTENT,
+                              compress_type=ZIP_STORED)
+            zip_file.writestr('media/deflated.mp3', CONTENT,
+                              compress_type=ZIP_DEFLATED)
+            zip_file.writestr('media/empty.mp3', b'')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_stored_member_is_mapped(self):
+        with ZipFile(self.zip_path) as zip_file:
+            with open_member(zip_file, 'media/stored.mp3') as file_obj:
+                self.assertIsInstance(file_obj, MappedMember)
+                self.assertEqual(file_obj.size, len(CONTENT))
+                self.assertEqual(file_obj.read(10), CONTENT[:10])
+                self.assertEqual(file_obj.read(), CONTENT[10:])
+                self.assertEqual(file_obj.read(), b'')
+
+            with open_member(zip_file, 'media/empty.mp3') as file_obj:
+                self.assertEqual(file_obj.read(), b'')
+
+    def test_deflated_member(self):
+        with ZipFile(self.zip_path) as zip_file:
+            with open_member(zip_file, 'media/deflated.mp3') as file_obj:
+                self.assertNotIsInstance(file_obj, MappedMember)
+                self.assertEqual(file_obj.size, len(CONTENT))
+
+            self.assertEqual(
+                b''.join(iter_member(zip_file, 'media/deflated.mp3', 1000)),
+                CONTENT,
+            )
+
+    def test_hash_member(self):
+        with ZipFile(self.zip_path) as zip_file:
+            with open_member(zip_file, 'media/stored.mp3') as file_obj:
+                digest, spooled = hash_member(file_obj)
+
+            # the mapped member is cheap to read again:
+            self.assertEqual(digest, content_hash(CONTENT))
+            self.assertIsNone(spooled)
+
+            # the deflated one is copied, in a temporary file if it's big:
+            for max_size in [len(CONTENT), 1000]:
+                with open_member(zip_file, 'media/deflated.mp3') as file_obj:
+                    digest, spooled = hash_member(file_obj, max_size)
+
+                with spooled:
+                    self.assertEqual(digest, content_hash(CONTENT))
+                    self.assertEqual(spooled.size, len(CONTENT))
+                    for _ in range(2):
+                        spooled.seek(0)
+                        self.assertEqual(spooled.read(), CONTENT)
+
+    def test_zip_in_memory(self):
+        with open(self.zip_path, 'rb') as file_obj:
+            zip_file = ZipFile(io.BytesIO(file_obj.read()))
+
+        with open_member(zip_file, 'media/stored.mp3') as file_obj:
+            self.assertNotIsInstance(file_obj, MappedMember)
+            self.assertEqual(file_obj.read(), CONTENT)
+
+    def test_bad_crc(self):
+        with ZipFile(self.zip_path) as zip_file:
+            zip_file.getinfo('media/stored.mp3').CRC ^= 1
+
+            with self.assertRaises(BadZipFile):
+                b''.join(iter_member(zip_file, 'media/stored.mp3'))
+
+
+class MultipartFileTestCase(TestCase):
+
+    def test_body(self):
+        file_obj = io.BytesIO(CONTENT)
+        body = MultipartFile(file_obj, len(CONTENT), file_name='media/1.mp3',
+                             chunk_size=1000)
+        data = b''.join(body)
+
+        self.assertEqual(len(data), len(body))
+        self.assertEqual(body.headers['Content-Length'], str(len(data)))
+
+        message = email.parser.BytesParser().parsebytes(
+            'Content-Type: {}\r\n\r\n'.format(body.content_type).encode()
+            + data)
+        part, = message.get_payload()
+        self.assertEqual(part.get_param('name', header='content-disposition'),
+                         'remote_file[file]')
+        self.assertEqual(part.get_filename(), '1.mp3')
+        self.assertEqual(part.get_payload(decode=True), CONTENT)
+
+    def test_size_changed(self):
+        body = MultipartFile(io.BytesIO(CONTENT), len(CONTENT) + 1)
+
+        with self.assertRaises(IOError):
+            b''.join(body)
+
+
+class StreamingUploadTestCase(TestCase):
+
+    def setUp(self):
+        self.app = FakeTrunity()
+        self.server, api_root = serve_in_thread(self.app)
+        set_api_root(api_root)
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.zip_path = os.path.join(self.tmp_dir, 'media.zip')
+
+        with ZipFile(self.zip_path, 'w') as zip_file:
+            zip_file.writestr('media/1.mp3', CONTENT)
+            zip_file.writestr('media/deflated.mp3', CONTENT,
+                              compress_type=ZIP_DEFLATED)
+
+    def tearDown(self):
+        set_api_root(API_ROOT)
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def assert_uploaded(self, file_url: str):
+        self.assertTrue(file_url.startswith('http://'))
+
+        stats = self.app.stats.to_dict()
+        self.assertEqual(stats['requests']['remote_files'], 1)
+        # body is sent with Content-Length, the whole file is in it:
+        self.assertGreater(stats['bytes_received'], len(CONTENT))
+
+    def test_streaming_files_client(self):
+        # sessions are shared by creds, tokens of other servers are no good:
+        session = SessionManager(self.id(), 'password').session()
+
+        with ZipFile(self.zip_path) as zip_file:
+            with open_member(zip_file, 'media/1.mp3') as file_obj:
+                file_url = StreamingFilesClient(session).list.post(
+                    file_obj=file_obj)
+
+        self.assert_uploaded(file_url)
+
+    def test_async_upload_member(self):
+
+        async def run():
+            async with AsyncClient('user', 'password') as client:
+                with ZipFile(self.zip_path) as zip_file:
+                    return await client.upload_member(zip_file, 'media/1.mp3')
+
+        self.assert_uploaded(asyncio.run(run()))
+
+    def test_async_member_is_decompressed_once(self):
+
+        async def run():
+            async with AsyncClient('user', 'password') as client:
+                with ZipFile(self.zip_path) as zip_file:
+                    uploader = AsyncMediaUploader(
+                        client, zip_file, spool_max_size=1000)
+                    return await uploader.upload('media/deflated.mp3')
+
+        with mock.patch('trunity_importer.async_client.open_member',
+                        wraps=open_member) as opened:
+            file_url = asyncio.run(run())
+
+        # the copy made while hashing is sent:
+        self.assertEqual(opened.call_count, 1)
+        self.assert_uploaded(file_url)
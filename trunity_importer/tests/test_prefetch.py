@@ -0,0 +1,67 @@
+import io
+from unittest import TestCase
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from trunity_importer.media import MediaUploader
+from trunity_importer.prefetch import MediaPrefetcher, PrefetchedMember
+from trunity_importer.tests.fakes import FakeFilesClient
+
+
+class MediaPrefetcherTestCase(TestCase):
+
+    def setUp(self):
+        zip_buffer = io.BytesIO()
+        with ZipFile(zip_buffer, 'w', ZIP_DEFLATED) as zip_file:
+            for num in range(1, 4):
+                zip_file.writestr('images/{}.gif'.format(num),
+                                  str(num).encode() * 100)
+            zip_file.writestr('media/large.mp3', b'y' * 1000)
+
+        self.zip_file = ZipFile(zip_buffer)
+        self.prefetcher = MediaPrefetcher(self.zip_file, max_bytes=250,
+                                          max_member_size=100)
+
+    def tearDown(self):
+        self.prefetcher.close()
+
+    def test_memory_is_bounded(self):
+        self.prefetcher.prefetch(
+            ['images/1.gif', 'images/2.gif', 'images/3.gif', 'images/1.gif'])
+        self.assertEqual(self.prefetcher.reserved, 200)
+
+        with self.prefetcher.open('images/1.gif') as file_obj:
+            self.assertIsInstance(file_obj, PrefetchedMember)
+            self.assertEqual(file_obj.read(), b'1' * 100)
+
+        # memory of uploaded member goes to the next one:
+        self.prefetcher.release('images/1.gif')
+        self.assertEqual(self.prefetcher.reserved, 200)
+
+        with self.prefetcher.open('images/3.gif') as file_obj:
+            self.assertIsInstance(file_obj, PrefetchedMember)
+
+    def test_not_prefetched(self):
+        self.prefetcher.prefetch(['media/large.mp3', 'images/missing.gif'])
+        self.assertEqual(self.prefetcher.reserved, 0)
+
+        with self.prefetcher.open('media/large.mp3') as file_obj:
+            self.assertNotIsInstance(file_obj, PrefetchedMember)
+            self.assertEqual(file_obj.read(), b'y' * 1000)
+
+        with self.assertRaises(KeyError):
+            self.prefetcher.open('images/missing.gif')
+
+    def test_uploader(self):
+        files_client = FakeFilesClient()
+        uploader = MediaUploader(files_client, self.zip_file, workers=2,
+                                 prefetcher=self.prefetcher)
+
+        names = ['images/1.gif', 'images/2.gif', 'images/3.gif',
+                 'media/large.mp3']
+        uploader.prefetch(names)
+        cdn_file_urls = uploader.upload_many(names)
+        uploader.close()
+
+        self.assertEqual(cdn_file_urls['images/3.gif'], 'https://cdn/3.gif')
+        self.assertEqual(files_client.list.contents['large.mp3'], b'y' * 1000)
+        self.assertEqual(self.prefetcher.reserved, 0)
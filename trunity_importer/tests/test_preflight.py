@@ -0,0 +1,58 @@
+import io
+from unittest import TestCase
+from zipfile import ZipFile
+
+from trunity_importer.preflight import PreflightError, ZipIndex, check_media
+
+
+class CheckMediaTestCase(TestCase):
+
+    def setUp(self):
+        zip_buffer = io.BytesIO()
+        with ZipFile(zip_buffer, 'w') as zip_file:
+            zip_file.writestr('XML_Export_0001.xml', b'<object-bank/>')
+            zip_file.writestr('images/', b'')
+            zip_file.writestr('images/1.gif', b'1' * 10)
+            zip_file.writestr('images/2.GIF', b'2' * 20)
+            zip_file.writestr('images/unused.gif', b'3' * 30)
+            zip_file.writestr('media/1.mp3', b'4' * 40)
+
+        self.zip_file = ZipFile(zip_buffer)
+
+    def test_zip_index(self):
+        index = ZipIndex(self.zip_file)
+
+        self.assertIn('images/1.gif', index)
+        self.assertNotIn('images/', index)
+        self.assertEqual(index.get_size('media/1.mp3'), 40)
+        self.assertListEqual(index.find_ignoring_case('IMAGES/2.gif'),
+                             ['images/2.GIF'])
+        self.assertListEqual(index.find_ignoring_case('images/1.gif'), [])
+
+    def test_check_media(self):
+        report = check_media(self.zip_file, [
+            'images/1.gif', 'media/1.mp3', 'images/1.gif',
+            'images/2.gif', 'images/3.gif',
+        ])
+
+        self.assertFalse(report.ok)
+        self.assertEqual(report.references['images/1.gif'], 2)
+        self.assertDictEqual(report.missing, {
+            'images/2.gif': ['images/2.GIF'],
+            'images/3.gif': [],
+        })
+        # xml files are not media:
+        self.assertListEqual(report.unused, ['images/2.GIF',
+                                             'images/unused.gif'])
+        # every file is uploaded once:
+        self.assertEqual(report.total_bytes, 50)
+
+        with self.assertRaises(PreflightError) as context:
+            report.check()
+        self.assertIn('images/3.gif', str(context.exception))
+
+    def test_nothing_is_missing(self):
+        report = check_media(self.zip_file, ['images/1.gif'])
+
+        self.assertTrue(report.ok)
+        report.check()
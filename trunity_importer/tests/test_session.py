@@ -0,0 +1,83 @@
+import io
+import time
+from unittest import TestCase
+from zipfile import ZipFile
+
+from trunity_3_client import FilesClient, TopicsClient
+from trunity_3_client.utils.url import API_ROOT
+
+from trunity_importer.fake_server import FakeTrunity, serve_in_thread
+from trunity_importer.media import MediaUploader
+from trunity_importer.multipart import StreamingFilesClient
+from trunity_importer.session import SessionManager
+from trunity_importer.utils import set_api_root
+
+
+class SessionManagerTestCase(TestCase):
+
+    def setUp(self):
+        self.app = FakeTrunity()
+        self.server, api_root = serve_in_thread(self.app)
+        set_api_root(api_root)
+
+        self.manager = SessionManager('user', 'password', pool_size=4)
+
+    def tearDown(self):
+        set_api_root(API_ROOT)
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _auth_requests(self) -> int:
+        return self.app.stats.to_dict()['requests'].get('authorization', 0)
+
+    def test_authenticates_once(self):
+        session = self.manager.session()
+        json_session = self.manager.session('application/json')
+
+        self.assertIs(self.manager.session(), session)
+        self.assertEqual(json_session.headers['Content-Type'],
+                         'application/json')
+        self.assertIs(session.get_adapter('http://'),
+                      json_session.get_adapter('http://'))
+        self.assertEqual(self._auth_requests(), 1)
+
+    def test_renews_expired_token(self):
+        self.app.token_ttl = 0.1
+        session = self.manager.session()
+        time.sleep(0.2)
+
+        TopicsClient(session).list.post(1, 'Topic')
+
+        file_obj = io.BytesIO(b'x' * 100)
+        file_obj.name = 'image.gif'
+        FilesClient(session).list.post(file_obj=file_obj)
+
+        self.assertEqual(self._auth_requests(), 2)
+        self.assertEqual(self.app.stats.to_dict()['statuses']['401'], 1)
+
+    def test_renews_expired_token_of_streamed_upload(self):
+        zip_buffer = io.BytesIO()
+        with ZipFile(zip_buffer, 'w') as zip_file:
+            zip_file.writestr('images/1.gif', b'x' * 100)
+
+        self.app.token_ttl = 0.1
+        session = self.manager.session()
+        time.sleep(0.2)
+
+        # not the retries of transient errors, they would sleep:
+        uploader = MediaUploader(StreamingFilesClient(session),
+                                 ZipFile(zip_buffer), retries=0)
+        self.assertTrue(uploader.upload('images/1.gif'))
+        uploader.close()
+
+        stats = self.app.stats.to_dict()
+        self.assertEqual(self._auth_requests(), 2)
+        self.assertEqual(stats['statuses']['401'], 1)
+        # sent again by the uploader with a new body:
+        self.assertEqual(stats['requests']['remote_files'], 2)
+
+    def test_for_creds(self):
+        manager = SessionManager.for_creds('user', 'password')
+        self.assertIs(SessionManager.for_creds('user', 'password'), manager)
+        self.assertIsNot(SessionManager.for_creds('other', 'password'),
+                         manager)
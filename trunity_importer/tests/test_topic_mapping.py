@@ -0,0 +1,64 @@
+import io
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from trunity_importer.topic_mapping import TopicMapping, TopicMappingError
+
+
+class TopicMappingTestCase(TestCase):
+
+    def test_get_topic_id(self):
+        mapping = TopicMapping(
+            test_ids={'111': 1001},
+            titles=[('Unit 1 *', 1002), ('Unit *', '')],
+            default=1000,
+        )
+
+        self.assertListEqual(
+            [
+                mapping.get_topic_id('111', 'Unit 1 Test'),
+                mapping.get_topic_id('222', 'Unit 1 Test'),
+                mapping.get_topic_id('222', 'Unit 2 Test'),
+                mapping.get_topic_id('222', 'Final Test'),
+            ],
+            ['1001', '1002', None, '1000'],
+            "Wrong topic ids!"
+        )
+
+    def test_from_csv(self):
+        mapping = TopicMapping.from_csv(io.StringIO(
+            "test_id,title,topic_id\n"
+            "111,,1001\n"
+            ",Unit 1 *,1002\n"
+        ))
+
+        self.assertEqual(mapping.get_topic_id('111', ''), '1001')
+        self.assertEqual(mapping.get_topic_id('222', 'Unit 1 Test'), '1002')
+        self.assertIsNone(mapping.get_topic_id('222', 'Final Test'))
+
+    def test_from_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'mapping.json')
+            with open(path, 'w') as fo:
+                json.dump({'test_ids': {'111': 1001}}, fo)
+
+            self.assertEqual(
+                TopicMapping.from_file(path).get_topic_id('111', ''),
+                '1001',
+            )
+
+    def test_unknown_format(self):
+        with tempfile.NamedTemporaryFile(suffix='.txt') as fo:
+            with self.assertRaises(TopicMappingError):
+                TopicMapping.from_file(fo.name)
+
+    def test_malformed_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'mapping.json')
+            with open(path, 'w') as fo:
+                fo.write('{"test_ids": ')
+
+            with self.assertRaises(TopicMappingError):
+                TopicMapping.from_file(path)
@@ -0,0 +1,68 @@
+import io
+import os
+import tempfile
+from unittest import TestCase
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from trunity_importer.media import MediaUploader
+from trunity_importer.tests.fakes import FakeFilesClient
+from trunity_importer.upload_cache import UploadCache, content_hash
+
+
+class UploadCacheTestCase(TestCase):
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'cache.sqlite3')
+
+            cache = UploadCache(path)
+            cache.set(content_hash(b'data'), 'https://cdn/file.gif')
+            cache.close()
+
+            cache = UploadCache(path)
+            self.assertEqual(
+                cache.get(content_hash(b'data')),
+                'https://cdn/file.gif',
+            )
+            self.assertIsNone(cache.get(content_hash(b'other data')))
+            cache.close()
+
+    def test_same_content_is_uploaded_once(self):
+        zip_buffer = io.BytesIO()
+        with ZipFile(zip_buffer, 'w') as zip_file:
+            zip_file.writestr('images/logo.gif', b'GIF89a logo')
+            zip_file.writestr('images/logo_copy.gif', b'GIF89a logo')
+            zip_file.writestr('images/other.gif', b'GIF89a other')
+
+        files_client = FakeFilesClient()
+        uploader = MediaUploader(
+            files_client, ZipFile(zip_buffer), workers=4)
+
+        urls = uploader.upload_many(
+            ['images/logo.gif', 'images/logo_copy.gif', 'images/other.gif'])
+
+        self.assertEqual(urls['images/logo.gif'], urls['images/logo_copy.gif'])
+        self.assertEqual(len(files_client.list.uploaded), 2)
+
+    def test_member_is_decompressed_once(self):
+        zip_buffer = io.BytesIO()
+        with ZipFile(zip_buffer, 'w', ZIP_DEFLATED) as zip_file:
+            zip_file.writestr('media/1.mp3', b'ID3' * 1000)
+
+        files_client = FakeFilesClient()
+        uploader = MediaUploader(files_client, ZipFile(zip_buffer),
+                                 spool_max_size=1000)
+
+        opened = []
+        open_member = uploader._open
+
+        def counting_open(name):
+            opened.append(name)
+            return open_member(name)
+
+        uploader._open = counting_open
+        uploader.upload('media/1.mp3')
+
+        # the copy made while hashing is sent:
+        self.assertListEqual(opened, ['media/1.mp3'])
+        self.assertEqual(files_client.list.contents['1.mp3'], b'ID3' * 1000)
@@ -0,0 +1,67 @@
+import os
+from unittest import TestCase, mock
+
+from requests import HTTPError, Response
+
+from trunity_importer.session import SessionManager
+from trunity_importer.utils import (
+    call_with_retries,
+    check_and_get_creds,
+    is_transient_error,
+    ENVIRON_USERNAME,
+    ENVIRON_PASSWORD,
+)
+
+
+def _http_error(status_code: int) -> HTTPError:
+    response = Response()
+    response.status_code = status_code
+    return HTTPError(response=response)
+
+
+class CallWithRetriesTestCase(TestCase):
+
+    def test_is_transient_error(self):
+        self.assertListEqual(
+            [is_transient_error(_http_error(status))
+             for status in (503, 429, 404, 401)],
+            [True, True, False, False],
+        )
+
+    def test_retries_transient_errors(self):
+        attempts = []
+
+        def func():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise _http_error(503)
+            return 'ok'
+
+        self.assertEqual(call_with_retries(func, retries=3, backoff=0), 'ok')
+        self.assertEqual(len(attempts), 3)
+
+    def test_not_transient_errors_are_raised(self):
+        attempts = []
+
+        def func():
+            attempts.append(1)
+            raise _http_error(404)
+
+        with self.assertRaises(HTTPError):
+            call_with_retries(func, retries=3, backoff=0)
+
+        self.assertEqual(len(attempts), 1)
+
+
+class CheckAndGetCredsTestCase(TestCase):
+
+    @mock.patch.dict(os.environ, clear=True)
+    @mock.patch.object(SessionManager, 'for_creds')
+    @mock.patch('builtins.input', side_effect=['user', 'secret'])
+    @mock.patch('builtins.print')
+    def test_prompted_creds_are_kept(self, *mocks):
+        creds = check_and_get_creds()
+
+        self.assertEqual(creds, ('user', 'secret'))
+        self.assertEqual(os.environ[ENVIRON_USERNAME], 'user')
+        self.assertEqual(os.environ[ENVIRON_PASSWORD], 'secret')
@@ -0,0 +1,144 @@
+"""
+Mapping of question pools to Trunity topics for non-interactive imports.
+
+Mapping file can be JSON, YAML or CSV.
+
+JSON / YAML:
+
+    default: 1000            # optional, root of the book if omitted
+    test_ids:
+      "111": 1001
+    titles:                  # shell-style patterns, first match wins
+      "Unit 1 *": 1002
+
+CSV (header is required, fill either test_id or title in every row):
+
+    test_id,title,topic_id
+    111,,1001
+    ,Unit 1 *,1002
+"""
+import csv
+import json
+import os
+from fnmatch import fnmatchcase
+from typing import Union, List, Tuple
+
+try:
+    import yaml
+except ImportError:  # PyYAML is optional
+    yaml = None
+
+
+class TopicMappingError(ValueError):
+    """
+    Raise when mapping file is malformed or can't be read.
+    """
+    pass
+
+
+def _topic_id_or_none(value) -> Union[str, None]:
+    """
+    Blank values mean the root of the book.
+    """
+    if value is None:
+        return None
+
+    value = str(value).strip()
+    return value if value else None
+
+
+class TopicMapping(object):
+    """
+    Map question pools to topic ids.
+
+    Rules are applied in the following order:
+        1. test_id match;
+        2. first title pattern that matches questionnaire title;
+        3. default topic id (None means the root of the book).
+    """
+
+    def __init__(self, test_ids: dict=None,
+                 titles: List[Tuple[str, str]]=None, default=None):
+        self._test_ids = {
+            str(test_id): _topic_id_or_none(topic_id)
+            for test_id, topic_id in (test_ids or {}).items()
+        }
+        self._titles = [
+            (pattern, _topic_id_or_none(topic_id))
+            for pattern, topic_id in (titles or [])
+        ]
+        self._default = _topic_id_or_none(default)
+
+    def get_topic_id(self, test_id: str, title: str) -> Union[str, None]:
+        if test_id in self._test_ids:
+            return self._test_ids[test_id]
+
+        for pattern, topic_id in self._titles:
+            if fnmatchcase(title, pattern):
+                return topic_id
+
+        return self._default
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'TopicMapping':
+        if not isinstance(data, dict):
+            raise TopicMappingError("Topic mapping must be a dictionary!")
+
+        return cls(
+            test_ids=data.get('test_ids'),
+            titles=list((data.get('titles') or {}).items()),
+            default=data.get('default'),
+        )
+
+    @classmethod
+    def from_csv(cls, file_obj) -> 'TopicMapping':
+        test_ids = {}
+        titles = []
+
+        for row in csv.DictReader(file_obj):
+            test_id = (row.get('test_id') or '').strip()
+            title = (row.get('title') or '').strip()
+
+            if test_id:
+                test_ids[test_id] = row.get('topic_id')
+            elif title:
+                titles.append((title, row.get('topic_id')))
+            else:
+                raise TopicMappingError(
+                    "Row without test_id and title: {}".format(row))
+
+        return cls(test_ids=test_ids, titles=titles)
+
+    @classmethod
+    def from_file(cls, path: str) -> 'TopicMapping':
+        extension = os.path.splitext(path)[1].lower()
+
+        with open(path, newline='') as fo:
+            if extension == '.csv':
+                return cls.from_csv(fo)
+
+            elif extension == '.json':
+                try:
+                    data = json.load(fo)
+                except ValueError as error:
+                    raise TopicMappingError(
+                        "Malformed JSON in {}: {}".format(path, error))
+                return cls.from_dict(data)
+
+            elif extension in ('.yaml', '.yml'):
+                if yaml is None:
+                    raise TopicMappingError(
+                        "PyYAML is required for YAML mapping files. "
+                        "Install it with: pip install PyYAML"
+                    )
+                try:
+                    data = yaml.safe_load(fo)
+                except yaml.YAMLError as error:
+                    raise TopicMappingError(
+                        "Malformed YAML in {}: {}".format(path, error))
+                return cls.from_dict(data)
+
+        raise TopicMappingError(
+            "Unknown mapping file format: {}. "
+            "Use .json, .yaml, .yml or .csv".format(path)
+        )
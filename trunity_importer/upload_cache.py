@@ -0,0 +1,77 @@
+"""
+Content-addressed cache of files uploaded to Trunity.
+"""
+import hashlib
+import sqlite3
+import threading
+from typing import Iterable, Union
+
+
+def content_hash(data: bytes) -> str:
+    """
+    Hash of file content we use as a cache key.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def chunks_content_hash(chunks: Iterable[bytes]) -> str:
+    """
+    content_hash of file read in chunks.
+    """
+    hash_obj = hashlib.sha256()
+    for chunk in chunks:
+        hash_obj.update(chunk)
+    return hash_obj.hexdigest()
+
+
+class UploadCache(object):
+    """
+    Map content hash of a file to its CDN url.
+
+    The cache always lives in memory for the current run. When `path`
+    is given, it's persisted to sqlite database as well, so next runs
+    (and imports of other books) reuse files uploaded before.
+    """
+
+    def __init__(self, path: str=None):
+        self._urls = {}  # key: content hash, value: CDN url
+        self._lock = threading.Lock()
+
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS uploads "
+                "(digest TEXT PRIMARY KEY, url TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, digest: str) -> Union[str, None]:
+        with self._lock:
+            url = self._urls.get(digest)
+
+            if url is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT url FROM uploads WHERE digest = ?", (digest,)
+                ).fetchone()
+
+                if row:
+                    url = self._urls[digest] = row[0]
+
+            return url
+
+    def set(self, digest: str, url: str):
+        with self._lock:
+            self._urls[digest] = url
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO uploads (digest, url) "
+                    "VALUES (?, ?)", (digest, url)
+                )
+                self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
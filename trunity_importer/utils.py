@@ -1,23 +1,47 @@
 import os
+import time
 from collections import namedtuple
+from typing import Callable
 
-from requests import HTTPError
+from requests import HTTPError, ConnectionError, Timeout
 from trunity_3_client import (
-    get_auth_token,
     ContentsClient,
     ContentType,
     ResourceType
 )
+from trunity_3_client.clients import auth
+from trunity_3_client.clients.endpoints import (
+    contents,
+    questions,
+    remote_files,
+    topics,
+)
+from trunity_3_client.utils.url import Url
+
+from trunity_importer.metrics import metrics
+from trunity_importer.session import SessionManager
 
 ENVIRON_USERNAME = 'T3_USERNAME'
 ENVIRON_PASSWORD = 'T3_PWD'
+ENVIRON_API_ROOT = 'T3_API_ROOT'
 CREDS = namedtuple('CREDS', ['username', 'password'])
 
+# HTTP statuses that are worth retrying:
+TRANSIENT_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class CredentialsError(ValueError):
+    """
+    Raise when credentials can't be obtained.
+    """
+    pass
 
-def check_and_get_creds():
+
+def check_and_get_creds(interactive: bool=True):
     """
     Get username and password from environmental variables.
-    If fail, prompt the user.
+    If fail, prompt the user (or raise CredentialsError
+    when `interactive` is False).
     """
     username = os.environ.get(ENVIRON_USERNAME, None)
     password = os.environ.get(ENVIRON_PASSWORD, None)
@@ -25,6 +49,12 @@ def check_and_get_creds():
     if username is not None and password is not None:
         return CREDS(username, password)
 
+    if not interactive:
+        raise CredentialsError(
+            "Set {} and {} environment variables to run "
+            "non-interactively.".format(ENVIRON_USERNAME, ENVIRON_PASSWORD)
+        )
+
     auth_token = None
 
     while auth_token is None:
@@ -32,22 +62,82 @@ def check_and_get_creds():
         password = input("Your password? ")
         try:
             print('Checking your credentials...', end='')
-            auth_token = get_auth_token(username, password)
+            # the token is kept for importers:
+            auth_token = SessionManager.for_creds(
+                username, password).authenticate()
         except HTTPError:
             print('\t\t FAIL!', end='\n\n')
         else:
             print('\t\tOK!')
             os.environ[ENVIRON_USERNAME] = username
-            os.environ[ENVIRON_PASSWORD] = username
+            os.environ[ENVIRON_PASSWORD] = password
             return CREDS(username, password)
 
 
+def set_api_root(api_root: str):
+    """
+    Send all Trunity API requests to `api_root`
+    (a local fake server, for instance).
+
+    trunity_3_client builds endpoint urls when it's imported,
+    so we have to replace them.
+    """
+
+    def url(tail: str) -> Url:
+        endpoint_url = Url(api_root)
+        endpoint_url.tail = tail
+        return endpoint_url
+
+    auth.API_ROOT = api_root
+
+    topics.TopicsListClient._url = url('topics').list
+    topics.TopicsDetailClient._url = url('topics').detail
+    contents.ContentsListClient._url = url('contents').list
+    contents.ContentsDetailClient._url = url('contents').detail
+    remote_files.FilesListClient._url = url('remote_files').list
+    questions.QuestionsClient._base_url = url('questions').list
+
+
 def create_qst_pool(session, site_id, content_title, topic_id=None):
     cnt_client = ContentsClient(session)
-    return cnt_client.list.post(
-        site_id=site_id,
-        content_title=content_title,
-        content_type=ContentType.QUESTIONNAIRE,
-        topic_id=topic_id,
-        resource_type=ResourceType.QUESTION_POOL,
-    )
+
+    with metrics.timer('pool_create'):
+        return cnt_client.list.post(
+            site_id=site_id,
+            content_title=content_title,
+            content_type=ContentType.QUESTIONNAIRE,
+            topic_id=topic_id,
+            resource_type=ResourceType.QUESTION_POOL,
+        )
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Return True if request that failed with `error` can be retried.
+    """
+    if isinstance(error, (ConnectionError, Timeout)):
+        return True
+
+    if isinstance(error, HTTPError) and error.response is not None:
+        return error.response.status_code in TRANSIENT_STATUS_CODES
+
+    return False
+
+
+def call_with_retries(func: Callable, retries: int=3, backoff: float=0.5):
+    """
+    Call `func` and retry it on transient HTTP errors.
+    Delay between attempts grows exponentially: backoff, 2*backoff, 4*backoff...
+    """
+    attempt = 0
+
+    while True:
+        try:
+            return func()
+
+        except Exception as error:
+            if attempt >= retries or not is_transient_error(error):
+                raise
+
+            time.sleep(backoff * 2 ** attempt)
+            attempt += 1